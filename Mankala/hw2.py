@@ -1,4 +1,5 @@
-from random import choice
+from concurrent.futures import ProcessPoolExecutor
+from random import Random, choice
 
 
 INVALID_POSITION = 0
@@ -6,6 +7,16 @@ EMPTY_POSITION = 1
 ROUND_OVER = 2
 PLAY_AGAIN = 3
 
+# A state packs a whole position into one int: the side to move (0 or 1)
+# in bit 0, the size in bits 1 to 7 and from bit 8 on the cells of side
+# 0 and then side 1, both in the order of init(), CELL_BITS bits each.
+CELL_BITS = 16
+CELL_MASK = (1 << CELL_BITS) - 1
+STATE_HEADER = 8
+SIZE_MASK = 127
+
+layouts = {}
+
 
 def init(size, start):
     return(([start]*size) + [0], ([start]*size) + [0])
@@ -59,7 +70,74 @@ def play(our, their, position):
         return(INVALID_POSITION)
 
 
-def random_choice(our):
+def layout(size):
+    # for each side to move: shifts of our cells, shifts of their cells,
+    # what a whole lap of sowing adds and spread[pit][seeds] that less
+    # than a lap from pit adds
+    if size not in layouts:
+        sides = []
+        for mover in 0, 1:
+            ours = [STATE_HEADER + CELL_BITS * (mover * (size + 1) + i)
+                    for i in range(size + 1)]
+            theirs = [STATE_HEADER + CELL_BITS * ((1 - mover) * (size + 1) + i)
+                      for i in range(size + 1)]
+            # their bank is skipped
+            lap = ours + theirs[:size]
+            spread = []
+            for pit in range(size):
+                row = [0]
+                for step in range(1, len(lap)):
+                    row.append(row[-1] + (1 << lap[(pit + step) % len(lap)]))
+                spread.append(row)
+            sides.append((ours, theirs, sum(1 << i for i in lap), spread))
+        layouts[size] = sides
+    return(layouts[size])
+
+
+def encode(our, their, mover=0):
+    # our and their as from init(), mover is 1 if their side moves next
+    state = mover | (len(our) - 1) << 1
+    for i, count in enumerate(our + their):
+        state |= count << (STATE_HEADER + CELL_BITS * i)
+    return(state)
+
+
+def decode(state):
+    size = state >> 1 & SIZE_MASK
+    cells = [state >> (STATE_HEADER + CELL_BITS * i) & CELL_MASK
+             for i in range(2 * size + 2)]
+    return(cells[:size + 1], cells[size + 1:], state & 1)
+
+
+def apply_move(state, pit):
+    # the same move as play() by the side to move, but on a state; the
+    # side to move changes when the round is over
+    size = state >> 1 & SIZE_MASK
+    if not 0 <= pit < size:
+        return(state, INVALID_POSITION)
+    ours, theirs, whole_lap, spread = layout(size)[state & 1]
+    seeds = state >> ours[pit] & CELL_MASK
+    if seeds == 0:
+        return(state, EMPTY_POSITION)
+
+    # all seeds are sown at once, no cell can overflow into the next one
+    laps, rest = divmod(seeds, 2 * size + 1)
+    state += laps * whole_lap + spread[pit][rest] - (seeds << ours[pit])
+    last = (pit + seeds) % (2 * size + 1)
+    if last == size:
+        return(state, PLAY_AGAIN)
+
+    if last < size and state >> ours[last] & CELL_MASK == 1:
+        opposite = theirs[size - 1 - last]
+        captured = state >> opposite & CELL_MASK
+        if captured != 0:
+            state += ((captured + 1) << ours[size]) - (1 << ours[last]) \
+                - (captured << opposite)
+
+    return(state ^ 1, ROUND_OVER)
+
+
+def random_choice(our, rng=None):
     random = []
 
     for i, value in enumerate(our[:len(our)-1]):
@@ -70,10 +148,13 @@ def random_choice(our):
     if random == []:
         return(None)
 
-    return(choice(random))
+    if rng is None:
+        return(choice(random))
+
+    return(rng.choice(random))
 
 
-def run_random_game(size, start):
+def run_random_game(size, start, rng=None):
     our_score = 0
     their_score = 0
     our, their = init(size, start)
@@ -81,7 +162,7 @@ def run_random_game(size, start):
     other_player = their
 
     while True:
-        choice = random_choice(active_player)
+        choice = random_choice(active_player, rng)
         # there is no more move if choice is None
         if choice is None:
             # ends the game
@@ -103,6 +184,60 @@ def run_random_game(size, start):
     return(our_score, their_score)
 
 
+def simulate(size, start, games, seed):
+    # plays games with its own generator, so the counts depend only on seed
+    rng = Random(seed)
+    wins, draws, losses = 0, 0, 0
+    # how many games ended with each score of the first player
+    histogram = [0] * (2 * size * start + 1)
+
+    for _ in range(games):
+        our_score, their_score = run_random_game(size, start, rng)
+        histogram[our_score] += 1
+        if our_score > their_score:
+            wins += 1
+        elif our_score == their_score:
+            draws += 1
+        else:
+            losses += 1
+
+    return(wins, draws, losses, histogram)
+
+
+def run_games(size, start, games, seed=0, workers=None, chunk=1000):
+    # splits the games into chunks with seeds drawn from seed, so the
+    # totals do not depend on the number of workers
+    rng = Random(seed)
+    counts = [min(chunk, games - i) for i in range(0, games, chunk)]
+    seeds = [rng.getrandbits(64) for _ in counts]
+    played = 0
+    wins, draws, losses = 0, 0, 0
+    histogram = [0] * (2 * size * start + 1)
+
+    if workers == 1:
+        results = map(simulate, [size] * len(counts), [start] * len(counts),
+                      counts, seeds)
+        pool = None
+    else:
+        pool = ProcessPoolExecutor(workers)
+        results = pool.map(simulate, [size] * len(counts),
+                           [start] * len(counts), counts, seeds)
+
+    try:
+        # yields running totals of the first player after every chunk
+        for count, (won, drawn, lost, scores) in zip(counts, results):
+            played += count
+            wins += won
+            draws += drawn
+            losses += lost
+            for score, times in enumerate(scores):
+                histogram[score] += times
+            yield(played, wins, draws, losses, histogram[:])
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+
 def main():
     # --- init ---
 
@@ -144,6 +279,47 @@ def main():
     assert our == [3, 0, 6, 0]
     assert their == [3, 3, 3, 0]
 
+    # --- encode, decode, apply_move ---
+
+    assert decode(encode([3, 0, 6, 0], [3, 3, 3, 0], 1)) \
+        == ([3, 0, 6, 0], [3, 3, 3, 0], 1)
+
+    state = encode([3, 0, 6, 0], [3, 3, 3, 0])
+    assert apply_move(state, 3) == (state, INVALID_POSITION)
+    assert apply_move(state, 1) == (state, EMPTY_POSITION)
+    assert decode(apply_move(state, 0)[0]) \
+        == ([0, 1, 7, 1], [3, 3, 3, 0], 0)
+    assert decode(apply_move(state, 2)[0]) \
+        == ([4, 0, 0, 6], [4, 0, 4, 0], 1)
+
+    # the side to move as in play(), on random boards and whole games
+    rng = Random(1)
+    for _ in range(3000):
+        size = rng.randrange(1, 10)
+        rows = [[rng.randrange(30) if rng.random() < 0.7 else 0
+                 for _ in range(size + 1)] for _ in range(2)]
+        mover = rng.randrange(2)
+        position = rng.randrange(-1, size + 1)
+        state, result = apply_move(encode(*rows, mover), position)
+        assert play(rows[mover], rows[1 - mover], position) == result
+        if result == ROUND_OVER:
+            mover = 1 - mover
+        assert decode(state) == (rows[0], rows[1], mover)
+
+    for size, start in (1, 1), (4, 2), (6, 3), (9, 7):
+        rows = init(size, start)
+        state = encode(*rows)
+        mover = 0
+        while True:
+            position = random_choice(rows[mover], rng)
+            if position is None:
+                break
+            state, result = apply_move(state, position)
+            assert play(rows[mover], rows[1 - mover], position) == result
+            if result == ROUND_OVER:
+                mover = 1 - mover
+            assert decode(state) == (rows[0], rows[1], mover)
+
     # --- random_choice ---
 
     assert random_choice([1, 2, 3, 4, 0]) in [0, 1, 2, 3]
@@ -152,6 +328,17 @@ def main():
 
     assert random_choice([0, 0, 0, 1]) is None
 
+    assert run_random_game(6, 3, Random(1)) == run_random_game(6, 3, Random(1))
+
+    # --- run_games ---
+
+    played, wins, draws, losses, histogram = \
+        list(run_games(4, 2, 500, seed=1, workers=1, chunk=100))[-1]
+    assert played == wins + draws + losses == sum(histogram) == 500
+    assert histogram[8] == draws
+    assert list(run_games(4, 2, 500, seed=1, workers=2, chunk=100))[-1] \
+        == (played, wins, draws, losses, histogram)
+
     print(run_random_game(6, 3))
 
 
@@ -0,0 +1,206 @@
+from random import Random
+from time import perf_counter
+from typing import Dict, List, Optional, Tuple
+
+# change hw2 below if your file name is different
+import hw2 as student
+
+INFINITY = 1 << 30
+# depth stored with values that did not depend on the depth limit
+EXACT = 1 << 30
+# what the value in a table entry is
+LOWER, UPPER, VALUE = 0, 1, 2
+# how many positions the transposition table holds before it is cleared
+TABLE_SIZE = 1 << 21
+
+# depth, flag, value and best move of a position
+Entry = Tuple[int, int, int, int]
+
+
+class TimeUp(Exception):
+    pass
+
+
+class Searcher:
+    # Iterative deepening negamax with alpha-beta pruning over states
+    # from student.encode(), which also key the transposition table.
+    # Positions are always seen from the side to move, whose score minus
+    # the other side's score is the value. A PLAY_AGAIN move keeps the
+    # side, so its value is not negated. The game ends when the side to
+    # move has no seeds in its pits, as in student.run_random_game().
+    def __init__(self) -> None:
+        self.table: Dict[int, Entry] = {}
+        self.size = 0
+        # bits of the pits of each side in a state of this size
+        self.pits = (0, 0)
+        self.deadline = 0.0
+        # counts leaves cut off by the depth limit
+        self.horizon = 0
+        # statistics of the last best_move()
+        self.nodes = 0
+        self.depth = 0
+        self.value = 0
+        self.solved = False
+        self.elapsed = 0.0
+
+    def best_move(self, our: List[int], their: List[int],
+                  budget: float = 1.0, max_depth: int = 100) -> Optional[int]:
+        # the best move found within budget seconds, None if there is none
+        start = perf_counter()
+        self.deadline = start + budget
+        self.nodes = 0
+        self.depth = 0
+        self.solved = False
+        if len(our) - 1 != self.size or len(self.table) > TABLE_SIZE:
+            self.size = len(our) - 1
+            self.table.clear()
+            self.pits = tuple(sum(student.CELL_MASK << shift
+                                  for shift in ours[:self.size])
+                              for ours, _, _, _ in student.layout(self.size))
+
+        # any legal move, should the first depth run out of time
+        best = next((pit for pit, seeds in enumerate(our[:-1]) if seeds),
+                    None)
+        if best is None:
+            self.value = sum(our) - sum(their)
+            self.solved = True
+            self.elapsed = perf_counter() - start
+            return None
+        state = student.encode(our, their)
+        try:
+            for depth in range(1, max_depth + 1):
+                horizon = self.horizon
+                value = self.negamax(state, depth, -INFINITY, INFINITY)
+                self.value, self.depth = value, depth
+                best = self.table[state][3]
+                # nothing was cut off, so deeper searches find the same
+                if self.horizon == horizon:
+                    self.solved = True
+                    break
+        except TimeUp:
+            pass
+        self.elapsed = perf_counter() - start
+        return best
+
+    def negamax(self, state: int, depth: int, alpha: int, beta: int) -> int:
+        self.nodes += 1
+        if self.nodes & 1023 == 0 and perf_counter() > self.deadline:
+            raise TimeUp
+        size = self.size
+        ours, theirs, _, _ = student.layout(size)[state & 1]
+        if state & self.pits[state & 1] == 0:
+            return sum(state >> shift & student.CELL_MASK for shift in ours) \
+                - sum(state >> shift & student.CELL_MASK for shift in theirs)
+        if depth == 0:
+            self.horizon += 1
+            return (state >> ours[size] & student.CELL_MASK) \
+                - (state >> theirs[size] & student.CELL_MASK)
+        our = [state >> shift & student.CELL_MASK for shift in ours]
+        moves = [pit for pit in range(size) if our[pit] != 0]
+
+        entry = self.table.get(state)
+        if entry is not None:
+            stored, flag, value, first = entry
+            if stored >= depth and (flag == VALUE
+                                    or flag == LOWER and value >= beta
+                                    or flag == UPPER and value <= alpha):
+                if stored != EXACT:
+                    self.horizon += 1
+                return value
+            # tries the best move of the last search first
+            moves.remove(first)
+            moves.insert(0, first)
+            ordered = moves[1:]
+        else:
+            ordered = moves
+        # then moves ending in our bank, then the ones nearer to it
+        lap = 2 * size + 1
+        ordered.sort(key=lambda pit: ((pit + our[pit]) % lap != size, -pit))
+        if entry is not None:
+            moves[1:] = ordered
+
+        start_alpha = alpha
+        horizon = self.horizon
+        best, best_move = -INFINITY, moves[0]
+        for pit in moves:
+            after, result = student.apply_move(state, pit)
+            if result == student.PLAY_AGAIN:
+                value = self.negamax(after, depth - 1, alpha, beta)
+            else:
+                value = -self.negamax(after, depth - 1, -beta, -alpha)
+            if value > best:
+                best, best_move = value, pit
+                alpha = max(alpha, value)
+                if alpha >= beta:
+                    break
+
+        if best <= start_alpha:
+            flag = UPPER
+        elif best >= beta:
+            flag = LOWER
+        else:
+            flag = VALUE
+        stored = EXACT if self.horizon == horizon else depth
+        self.table[state] = (stored, flag, best, best_move)
+        return best
+
+
+def solve(our: List[int], their: List[int]) -> int:
+    # plain minimax over the whole game tree, for testing small boards
+    values = []
+    for pit in range(len(our) - 1):
+        our_after, their_after = our[:], their[:]
+        result = student.play(our_after, their_after, pit)
+        if result == student.PLAY_AGAIN:
+            values.append(solve(our_after, their_after))
+        elif result == student.ROUND_OVER:
+            values.append(-solve(their_after, our_after))
+    if not values:
+        return sum(our) - sum(their)
+    return max(values)
+
+
+def main() -> None:
+    rng = Random(1)
+    searcher = Searcher()
+
+    # --- solved values match plain minimax ---
+
+    for _ in range(300):
+        size = rng.randrange(1, 4)
+        our = [rng.randrange(3) for _ in range(size)] + [rng.randrange(3)]
+        their = [rng.randrange(3) for _ in range(size)] + [rng.randrange(3)]
+        move = searcher.best_move(our, their, budget=10)
+        assert searcher.solved
+        assert searcher.value == solve(our, their)
+        if move is None:
+            assert not any(our[:-1])
+            continue
+        our_after, their_after = our[:], their[:]
+        if student.play(our_after, their_after, move) == student.PLAY_AGAIN:
+            assert solve(our_after, their_after) == searcher.value
+        else:
+            assert -solve(their_after, our_after) == searcher.value
+
+    our, their = student.init(3, 2)
+    searcher.best_move(our, their, budget=10)
+    assert searcher.solved and searcher.value == solve(our, their)
+
+    # --- PLAY_AGAIN: the seed from pit 2 ends in the bank and the one
+    # from pit 1 then follows it, pit 1 first gives the turn away ---
+
+    assert searcher.best_move([0, 1, 1, 0], [1, 0, 0, 0], budget=10) == 2
+    assert searcher.value == 3
+
+    # --- time budget ---
+
+    our, their = student.init(6, 3)
+    move = searcher.best_move(our, their, budget=0.2)
+    assert move in range(6) and our == [3, 3, 3, 3, 3, 3, 0]
+    assert searcher.elapsed < 0.5
+    print(f"depth {searcher.depth}, value {searcher.value}, "
+          f"{searcher.nodes / searcher.elapsed:.0f} nodes/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+from functools import lru_cache
+from typing import Tuple
+
+import numpy as np
+
+# change hw2 below if your file name is different
+import hw2 as student
+
+# Boards are held as an int32 array of shape (games, 2, size + 1).
+# boards[:, 0] is the side to move and boards[:, 1] the other one, both
+# laid out like the lists from student.init(). The moves in one call
+# are sown in closed form: from pit p, the seeds go round a lap of
+# 2 * size + 1 spots (own pits, own bank, their pits), so each spot
+# gets seeds // lap of them plus one more when it lies within
+# seeds % lap spots after p.
+
+
+@lru_cache()
+def spread(size: int) -> np.ndarray:
+    # spread(size)[p, r] is what r seeds sown from pit p add to each spot
+    lap = 2 * size + 1
+    offsets = (np.arange(lap) - np.arange(size)[:, None] - 1) % lap
+    return (offsets[:, None, :] < np.arange(lap)[:, None]).astype(np.int32)
+
+
+def init(games: int, size: int, start: int) -> np.ndarray:
+    boards = np.full((games, 2, size + 1), start, dtype=np.int32)
+    boards[:, :, size] = 0
+    return boards
+
+
+def from_lists(our: list, their: list) -> np.ndarray:
+    return np.array([[our, their]], dtype=np.int32)
+
+
+def play(boards: np.ndarray, positions: np.ndarray) -> np.ndarray:
+    # moves positions[i] on boards[i] in place and returns the results
+    # student.play() would
+    if not boards.flags.c_contiguous:
+        raise ValueError("boards must be C-contiguous")
+    games, _, width = boards.shape
+    size = width - 1
+    lap = 2 * size + 1
+    flat = boards.reshape(games, 2 * width)
+
+    results = np.full(games, student.INVALID_POSITION, dtype=np.int8)
+    valid = (positions >= 0) & (positions < size)
+    seeds = flat[np.arange(games), np.where(valid, positions, 0)]
+    results[valid & (seeds == 0)] = student.EMPTY_POSITION
+    moving = np.flatnonzero(valid & (seeds != 0))
+    if moving.size == 0:
+        return results
+
+    everyone = moving.size == games
+    pits = positions if everyone else positions[moving]
+    seeds = seeds if everyone else seeds[moving]
+    rows = np.arange(moving.size)
+    sown = flat if everyone else flat[moving]
+    sown[rows, pits] = 0
+    laps, rest = np.divmod(seeds, lap)
+    sown[:, :lap] += spread(size)[pits, rest]
+    if laps.any():
+        sown[:, :lap] += laps[:, None]
+
+    last = (pits + seeds) % lap
+    results[moving] = student.ROUND_OVER
+    results[moving[last == size]] = student.PLAY_AGAIN
+
+    # the last seed dropped into an empty pit of our own
+    rows = np.flatnonzero(last < size)
+    last = last[rows]
+    opposite = width + size - 1 - last
+    capture = (sown[rows, last] == 1) & (sown[rows, opposite] != 0)
+    rows, last, opposite = rows[capture], last[capture], opposite[capture]
+    sown[rows, size] += sown[rows, last] + sown[rows, opposite]
+    sown[rows, last] = 0
+    sown[rows, opposite] = 0
+
+    if not everyone:
+        flat[moving] = sown
+    return results
+
+
+def swap(boards: np.ndarray, mask: np.ndarray) -> None:
+    boards[mask] = boards[mask][:, ::-1]
+
+
+def random_choice(boards: np.ndarray,
+                  rng: np.random.Generator) -> np.ndarray:
+    # a uniformly random non-empty pit of the side to move, -1 if none
+    pits = boards[:, 0, :-1]
+    weights = rng.random(pits.shape)
+    weights[pits == 0] = -1
+    moves = weights.argmax(axis=1)
+    moves[pits.max(axis=1, initial=0) == 0] = -1
+    return moves
+
+
+def run_random_games(games: int, size: int, start: int,
+                     rng: np.random.Generator) \
+        -> Tuple[np.ndarray, np.ndarray]:
+    # the batch counterpart of student.run_random_game(); returns the
+    # scores of the first and the second player of every game
+    boards = init(games, size, start)
+    first_to_move = np.ones(games, dtype=bool)
+    playing = np.arange(games)
+    first = np.empty(games, dtype=np.int32)
+
+    while playing.size != 0:
+        moves = random_choice(boards, rng)
+        # there is no more move for games where the choice is -1, they
+        # are scored and dropped from the batch
+        over = moves < 0
+        if over.any():
+            scores = boards[over].sum(axis=2)
+            first[playing[over]] = np.where(first_to_move[over],
+                                            scores[:, 0], scores[:, 1])
+            keep = ~over
+            boards, moves = boards[keep], moves[keep]
+            first_to_move, playing = first_to_move[keep], playing[keep]
+        over = play(boards, moves) == student.ROUND_OVER
+        swap(boards, over)
+        first_to_move ^= over
+
+    return first, 2 * size * start - first
+
+
+def main() -> None:
+    rng = np.random.default_rng(1)
+
+    # --- play against student.play on random boards ---
+
+    for size in 1, 2, 3, 6, 9:
+        boards = rng.integers(0, 4 * size, (2000, 2, size + 1),
+                              dtype=np.int32)
+        boards[rng.random(boards.shape) < 0.3] = 0
+        positions = rng.integers(-1, size + 1, 2000)
+        expected = [[row.tolist() for row in board] for board in boards]
+        results = play(boards, positions)
+        for board, (our, their), position, result in \
+                zip(boards, expected, positions, results):
+            assert student.play(our, their, int(position)) == result
+            assert board.tolist() == [our, their]
+
+    assert from_lists([3, 0, 6, 0], [3, 3, 3, 0]).tolist() \
+        == [[[3, 0, 6, 0], [3, 3, 3, 0]]]
+    boards = from_lists([3, 0, 6, 0], [3, 3, 3, 0])
+    assert play(boards, np.array([2])).tolist() == [student.ROUND_OVER]
+    assert boards.tolist() == [[[4, 0, 0, 6], [4, 0, 4, 0]]]
+
+    # --- whole games move by move ---
+
+    for size, start in (1, 1), (3, 4), (6, 3), (8, 11):
+        boards = init(500, size, start)
+        expected = [student.init(size, start) for _ in range(500)]
+        playing = np.ones(500, dtype=bool)
+        while playing.any():
+            moves = random_choice(boards, rng)
+            playing &= moves >= 0
+            moves[~playing] = -1
+            results = play(boards, moves)
+            swap(boards, results == student.ROUND_OVER)
+            for i in np.flatnonzero(playing):
+                our, their = expected[i]
+                assert student.play(our, their, int(moves[i])) \
+                    == results[i]
+                if results[i] == student.ROUND_OVER:
+                    expected[i] = their, our
+            assert boards.tolist() == [[our, their]
+                                       for our, their in expected]
+
+    # --- run_random_games ---
+
+    first, second = run_random_games(1000, 6, 3, rng)
+    assert (first + second == 36).all() and (first >= 0).all()
+    print(first.mean(), second.mean())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+import os
+from random import Random
+from time import perf_counter
+
+# change hw2 below if your file name is different
+import hw2 as student
+import hw2_ai as ai
+import hw2_endgame as endgame
+import hw2_record as record
+
+try:
+    import numpy as np
+    import hw2_batch as batch
+except ImportError:
+    batch = None
+
+SIZE = 6
+START = 3
+GAMES = 20_000
+
+
+def bench_run_games() -> None:
+    print(f"run_games on init({SIZE}, {START}), {GAMES} games")
+    print("  workers   games/s   first player won/drew/lost")
+    cores = os.cpu_count() or 1
+    workers = 1
+    while True:
+        start = perf_counter()
+        for played, wins, draws, losses, _ in \
+                student.run_games(SIZE, START, GAMES, workers=workers):
+            pass
+        elapsed = perf_counter() - start
+        print(f"  {workers:7d}   {played / elapsed:7.0f}"
+              f"   {wins}/{draws}/{losses}")
+        if workers >= cores:
+            break
+        workers = min(2 * workers, cores)
+
+
+def bench_batch() -> None:
+    if batch is None:
+        print("hw2_batch needs numpy, skipping")
+        return
+    print(f"random games on init({SIZE}, {START})")
+    print("  engine      games    games/s")
+    rng = Random(1)
+    start = perf_counter()
+    for _ in range(GAMES):
+        student.run_random_game(SIZE, START, rng)
+    print(f"  hw2      {GAMES:8d}   {GAMES / (perf_counter() - start):8.0f}")
+    generator = np.random.default_rng(1)
+    for games in 1_000, 10_000, 100_000, 1_000_000:
+        start = perf_counter()
+        batch.run_random_games(games, SIZE, START, generator)
+        print(f"  batch    {games:8d}   "
+              f"{games / (perf_counter() - start):8.0f}")
+
+
+def bench_search() -> None:
+    print(f"Searcher.best_move on init({SIZE}, {START})")
+    print("  budget [s]   depth   value        nodes    nodes/s")
+    for budget in 0.1, 1.0, 5.0:
+        searcher = ai.Searcher()
+        searcher.best_move(*student.init(SIZE, START), budget=budget)
+        print(f"  {budget:10.1f}   {searcher.depth:5d}   {searcher.value:5d}"
+              f"   {searcher.nodes:10d}   "
+              f"{searcher.nodes / searcher.elapsed:8.0f}")
+
+
+def bench_endgame() -> None:
+    path = "_hw2_bench_endgame_"
+    print("endgame tables")
+    print("  size   bound   positions   build [s]   lookup [us]")
+    rng = Random(1)
+    for size, bound in (4, 12), (6, 8):
+        start = perf_counter()
+        endgame.build(size, bound, path)
+        built = perf_counter() - start
+        table = endgame.EndgameTable(path)
+        positions = []
+        for _ in range(10_000):
+            pits = [0] * (2 * size)
+            for _ in range(bound):
+                pits[rng.randrange(2 * size)] += 1
+            positions.append((pits[:size] + [0], pits[size:] + [0]))
+        start = perf_counter()
+        for our, their in positions:
+            table.value(our, their)
+        lookup = (perf_counter() - start) / len(positions)
+        print(f"  {size:4d}   {bound:5d}   {len(table.values):9d}"
+              f"   {built:9.1f}   {lookup * 1e6:11.1f}")
+        table.close()
+        os.remove(path)
+
+
+def bench_records() -> None:
+    path = "_hw2_bench_records_"
+    rng = Random(1)
+    start = perf_counter()
+    record.write_records(path, ((SIZE, START,
+                                 record.random_game(SIZE, START, rng))
+                                for _ in range(GAMES)))
+    written = perf_counter() - start
+    print(f"{GAMES} recorded games on init({SIZE}, {START}), "
+          f"{os.path.getsize(path) / GAMES:.1f} bytes/game, "
+          f"written in {written:.1f} s")
+    print("  workers   verified games/s")
+    for workers in sorted({1, os.cpu_count() or 1}):
+        start = perf_counter()
+        broken = list(record.verify(path, workers))
+        assert broken == []
+        print(f"  {workers:7d}   {GAMES / (perf_counter() - start):16.0f}")
+    replay = record.Replay(*next(record.read_records(path)))
+    start = perf_counter()
+    for ply in range(len(replay)):
+        replay.position(ply)
+    print(f"  seek to a ply: "
+          f"{(perf_counter() - start) / len(replay) * 1e6:.1f} us")
+    os.remove(path)
+
+
+def main() -> None:
+    bench_run_games()
+    bench_batch()
+    bench_search()
+    bench_endgame()
+    bench_records()
+
+
+if __name__ == '__main__':
+    main()
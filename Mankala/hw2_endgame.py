@@ -0,0 +1,210 @@
+import mmap
+import os
+import struct
+from array import array
+from itertools import combinations
+from math import comb
+from random import Random
+from time import perf_counter
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+# change hw2 below if your file name is different
+import hw2 as student
+import hw2_ai as ai
+
+# Exact values of all positions of one size with at most bound seeds
+# left in the pits. Seeds never leave a bank, so what the side to move
+# can still gain over the other side depends only on the pits:
+#     value = our bank - their bank + table[pits]
+# where pits are our pits followed by theirs. Every move either puts a
+# seed into a bank or, staying on our side, moves seeds to higher pits,
+# so the positions are solved by increasing seed count and, within it,
+# by decreasing sum of seeds times pit index; children always come first.
+#
+# The file is a header and one signed byte per position, in the order of
+# rank(), so it can be memory-mapped and looked up without loading it.
+MAGIC = b'MKEG'
+HEADER = struct.Struct('<4sHH')
+# bigger values would not fit the signed bytes
+MAX_BOUND = 127
+
+
+def table_size(size: int, bound: int) -> int:
+    return comb(bound + 2 * size, 2 * size)
+
+
+def binomials(cells: int, bound: int) -> List[List[int]]:
+    return [[comb(top, i + 1) for top in range(bound + cells)]
+            for i in range(cells)]
+
+
+def rank(pits: Sequence[int], binomials: List[List[int]]) -> int:
+    # the running sums of pits shifted by the pit index are a strictly
+    # increasing combination, numbered by the combinatorial number system
+    index = 0
+    seeds = 0
+    for i, count in enumerate(pits):
+        seeds += count
+        index += binomials[i][seeds + i]
+    return index
+
+
+def compositions(total: int, cells: int) -> Iterator[Tuple[int, ...]]:
+    # all ways to put total seeds into cells pits
+    for bars in combinations(range(total + cells - 1), cells - 1):
+        previous = -1
+        pits = []
+        for bar in bars:
+            pits.append(bar - previous - 1)
+            previous = bar
+        pits.append(total + cells - 2 - previous)
+        yield tuple(pits)
+
+
+def progress(pits: Tuple[int, ...]) -> int:
+    size = len(pits) // 2
+    return sum(count * (i % size) for i, count in enumerate(pits))
+
+
+def build(size: int, bound: int, path: str) -> None:
+    if bound > MAX_BOUND:
+        raise ValueError(f"bound can be at most {MAX_BOUND}")
+    cells = 2 * size
+    ranks = binomials(cells, bound)
+    values = array('b', bytes(table_size(size, bound)))
+
+    for total in range(bound + 1):
+        for pits in sorted(compositions(total, cells), key=progress,
+                           reverse=True):
+            if not any(pits[:size]):
+                # the game is over, their seeds are theirs
+                values[rank(pits, ranks)] = -sum(pits[size:])
+                continue
+            state = student.encode(list(pits[:size]) + [0],
+                                   list(pits[size:]) + [0])
+            best = -MAX_BOUND
+            for pit in range(size):
+                after, result = student.apply_move(state, pit)
+                if result == student.EMPTY_POSITION:
+                    continue
+                our, their, _ = student.decode(after)
+                if result == student.PLAY_AGAIN:
+                    value = our[size] \
+                        + values[rank(our[:size] + their[:size], ranks)]
+                else:
+                    value = our[size] \
+                        - values[rank(their[:size] + our[:size], ranks)]
+                best = max(best, value)
+            values[rank(pits, ranks)] = best
+
+    with open(path, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, size, bound))
+        values.tofile(file)
+
+
+class EndgameTable:
+    def __init__(self, path: str) -> None:
+        with open(path, 'rb') as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.size, self.bound = HEADER.unpack_from(self.map)
+        if magic != MAGIC \
+                or len(self.map) != HEADER.size \
+                + table_size(self.size, self.bound):
+            self.map.close()
+            raise ValueError(f"{path} is not an endgame table")
+        self.values = memoryview(self.map)[HEADER.size:].cast('b')
+        self.ranks = binomials(2 * self.size, self.bound)
+
+    def close(self) -> None:
+        self.values.release()
+        self.map.close()
+
+    def value(self, our: List[int], their: List[int]) -> Optional[int]:
+        # our final score minus theirs with best play from both sides,
+        # None if the position is not in the table
+        pits = our[:-1] + their[:-1]
+        if len(our) != self.size + 1 or sum(pits) > self.bound:
+            return None
+        return our[-1] - their[-1] + self.values[rank(pits, self.ranks)]
+
+    def best_move(self, our: List[int], their: List[int]) -> Optional[int]:
+        # like student.random_choice(), but the move is the best one
+        best, best_value = None, 0
+        for pit in range(len(our) - 1):
+            our_after, their_after = our[:], their[:]
+            result = student.play(our_after, their_after, pit)
+            if result == student.PLAY_AGAIN:
+                value = self.value(our_after, their_after)
+            elif result == student.ROUND_OVER:
+                value = self.value(their_after, our_after)
+                value = None if value is None else -value
+            else:
+                continue
+            if value is None:
+                return None
+            if best is None or value > best_value:
+                best, best_value = pit, value
+        return best
+
+
+def main() -> None:
+    path = "_hw2_endgame_test_"
+    rng = Random(1)
+
+    assert sorted(rank(pits, binomials(4, 3)) for total in range(4)
+                  for pits in compositions(total, 4)) \
+        == list(range(table_size(2, 3)))
+
+    # --- values match plain minimax ---
+
+    for size, bound in (1, 6), (2, 6), (3, 6):
+        build(size, bound, path)
+        table = EndgameTable(path)
+        assert (table.size, table.bound) == (size, bound)
+        for _ in range(300):
+            pits = [0] * (2 * size)
+            for _ in range(rng.randrange(bound + 1)):
+                pits[rng.randrange(2 * size)] += 1
+            our = pits[:size] + [rng.randrange(5)]
+            their = pits[size:] + [rng.randrange(5)]
+            assert table.value(our, their) == ai.solve(our, their)
+            move = table.best_move(our, their)
+            if move is None:
+                assert not any(our[:-1])
+                continue
+            our_after, their_after = our[:], their[:]
+            if student.play(our_after, their_after, move) \
+                    == student.PLAY_AGAIN:
+                assert ai.solve(our_after, their_after) == ai.solve(our, their)
+            else:
+                assert -ai.solve(their_after, our_after) \
+                    == ai.solve(our, their)
+        assert table.value([1] * size + [0], [bound] + [0] * size) is None
+        table.close()
+
+    our, their = student.init(3, 2)
+    build(3, 12, path)
+    table = EndgameTable(path)
+    assert table.value(our, their) == ai.solve(our, their)
+    table.close()
+    os.remove(path)
+
+    # --- build time, size and lookup latency ---
+
+    start = perf_counter()
+    build(6, 6, path)
+    built = perf_counter() - start
+    table = EndgameTable(path)
+    our, their = [0, 1, 0, 2, 0, 0, 20], [1, 0, 0, 1, 0, 1, 14]
+    start = perf_counter()
+    for _ in range(10_000):
+        table.value(our, their)
+    lookup = (perf_counter() - start) / 10_000
+    print(f"size 6, bound 6: built in {built:.1f} s, "
+          f"{os.path.getsize(path)} bytes, lookup {lookup * 1e6:.1f} us")
+    table.close()
+    os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,5 @@
 import tkinter as tk
+from typing import Dict, List, Optional, Tuple
 
 # change hw2 below if your file name is different
 import hw2 as student
@@ -6,6 +7,10 @@ import hw2 as student
 # game parameters; feel free to change them
 SIZE = 6
 START = 3
+ANIMATE = False  # show seeds being sown one by one; toggled by a
+
+FRAME = 16  # milliseconds between animation frames
+ANIMATION = 1000  # the longest a move may be animated; in milliseconds
 
 BORDER = 32
 CELL_SIZE = 64
@@ -19,47 +24,136 @@ LEFT = BORDER
 RIGHT = BORDER + (SIZE + 4) * CELL_SIZE
 
 
+# a pit or a bank: whether it is in the top row and its index there
+Cell = Tuple[bool, int]
+
+
 class Game:
     def __init__(self) -> None:
+        self.animate = ANIMATE
         self.reset()
 
     def reset(self) -> None:
         self.top, self.bottom = student.init(SIZE, START)
 
-
-def draw_cell(canvas: tk.Canvas, x: int, y: int,
-              num: int, fill: str = "") -> None:
-    canvas.create_rectangle(x, y, x + CELL_SIZE, y + CELL_SIZE, fill=fill)
-    canvas.create_text(x + CELL_SIZE // 2, y + CELL_SIZE // 2,
-                       text=str(num), font=FONT)
-
-
-def draw(canvas: tk.Canvas, game: Game, msg: str = "") -> None:
-    canvas.delete('all')
-
-    canvas.create_rectangle(LEFT, TOP, RIGHT, BOTTOM)
-
-    for i in range(SIZE):
-        x = LEFT + (2 + i) * CELL_SIZE
-        for y, row, index in ((TOP, game.top, SIZE - 1 - i),
-                              (TOP + CELL_SIZE, game.bottom, i)):
-            draw_cell(canvas, x, y, row[index])
-
-    for x, row in ((LEFT + CELL_SIZE, game.top),
-                   (RIGHT - CELL_SIZE, game.bottom)):
-        canvas.create_text(x, TOP + CELL_SIZE,
-                           text=str(row[-1]), font=BANK_FONT)
-
-    canvas.create_text((LEFT + RIGHT) // 2, BOTTOM + 2 * BORDER,
-                       text=msg, font=MSG_FONT)
+    def row(self, top: bool) -> List[int]:
+        return self.top if top else self.bottom
+
+
+class Board:
+    # The canvas items are created once, draw() then only changes the
+    # texts of cells whose counts differ from what is shown.
+    def __init__(self, canvas: tk.Canvas) -> None:
+        self.canvas = canvas
+        self.rects: Dict[Cell, int] = {}
+        self.texts: Dict[Cell, int] = {}
+        self.shown: Dict[Cell, int] = {}
+        self.highlighted: Optional[Cell] = None
+        # the pending after() of an animation and the message it ends with
+        self.animation: Optional[str] = None
+        self.msg = ""
+
+        canvas.create_rectangle(LEFT, TOP, RIGHT, BOTTOM)
+        for i in range(SIZE):
+            x = LEFT + (2 + i) * CELL_SIZE
+            for y, cell in ((TOP, (True, SIZE - 1 - i)),
+                            (TOP + CELL_SIZE, (False, i))):
+                self.rects[cell] = canvas.create_rectangle(
+                    x, y, x + CELL_SIZE, y + CELL_SIZE)
+                self.texts[cell] = canvas.create_text(
+                    x + CELL_SIZE // 2, y + CELL_SIZE // 2, font=FONT)
+
+        for x, top in ((LEFT + CELL_SIZE, True),
+                       (RIGHT - CELL_SIZE, False)):
+            self.texts[top, SIZE] = canvas.create_text(
+                x, TOP + CELL_SIZE, font=BANK_FONT)
+
+        self.message = canvas.create_text(
+            (LEFT + RIGHT) // 2, BOTTOM + 2 * BORDER, font=MSG_FONT)
+
+    def show(self, cell: Cell, num: int) -> None:
+        if self.shown.get(cell) != num:
+            self.canvas.itemconfigure(self.texts[cell], text=str(num))
+            self.shown[cell] = num
+
+    def highlight(self, cell: Optional[Cell]) -> None:
+        if self.highlighted is not None:
+            self.canvas.itemconfigure(self.rects[self.highlighted], fill="")
+        if cell is not None:
+            self.canvas.itemconfigure(self.rects[cell], fill="red")
+        self.highlighted = cell
+
+
+def draw(board: Board, game: Game, msg: str = "") -> None:
+    if board.animation is not None:
+        board.canvas.after_cancel(board.animation)
+        board.animation = None
+
+    for top in True, False:
+        for index, num in enumerate(game.row(top)):
+            board.show((top, index), num)
+
+    board.highlight(None)
+    board.canvas.itemconfigure(board.message, text=msg)
+
+
+def sowing(top: bool, position: int, seeds: int) -> List[Cell]:
+    # cells in the order the seeds from position fall into, as in
+    # student.play(): the other bank is skipped
+    cells = []
+    cell = (top, position)
+    for _ in range(seeds):
+        side, index = cell
+        if index == SIZE - (side != top):
+            cell = (not side, 0)
+        else:
+            cell = (side, index + 1)
+        cells.append(cell)
+    return cells
+
+
+def animate(board: Board, game: Game, before: Tuple[List[int], List[int]],
+            top: bool, position: int, msg: str) -> None:
+    # shows the seeds from position falling one by one, or more of them
+    # in a frame when all would take longer than ANIMATION, and then
+    # draws the board after the move, captures included
+    counts = {(row_top, index): num
+              for row_top, row in zip((True, False), before)
+              for index, num in enumerate(row)}
+    seeds = counts[top, position]
+    cells = sowing(top, position, seeds)
+    step = -(-seeds * FRAME // ANIMATION)
+    counts[top, position] = 0
+    board.show((top, position), 0)
+    board.highlight((top, position))
+    board.canvas.itemconfigure(board.message, text="")
+
+    def frame(sown: int) -> None:
+        if sown >= len(cells):
+            board.animation = None
+            draw(board, game, msg)
+            return
+        for cell in cells[sown:sown + step]:
+            counts[cell] += 1
+            board.show(cell, counts[cell])
+        board.animation = board.canvas.after(FRAME, frame, sown + step)
+
+    board.msg = msg
+    board.animation = board.canvas.after(FRAME, frame, 0)
+
+
+def reset_and_draw(board: Board, game: Game) -> None:
+    game.reset()
+    draw(board, game)
 
 
-def reset_and_draw(canvas: tk.Canvas, game: Game) -> None:
-    game.reset()
-    draw(canvas, game)
+def toggle_animation(board: Board, game: Game) -> None:
+    game.animate = not game.animate
+    draw(board, game, "Sowing is animated." if game.animate
+         else "Sowing is not animated.")
 
 
-def click(event: tk.Event, canvas: tk.Canvas, game: Game) -> None:
+def click(event: tk.Event, board: Board, game: Game) -> None:
     lbound = LEFT + 2 * CELL_SIZE
     rbound = RIGHT - 2 * CELL_SIZE
     if not (TOP < event.y < BOTTOM and lbound < event.x < rbound) \
@@ -67,13 +161,19 @@ def click(event: tk.Event, canvas: tk.Canvas, game: Game) -> None:
             or event.y == TOP + CELL_SIZE:
         return  # ignore clicks outside and directly on boundary lines
 
+    # a click during an animation first finishes it
+    if board.animation is not None:
+        draw(board, game, board.msg)
+
     i = (event.x - lbound) // CELL_SIZE
     our, their = game.bottom, game.top
+    top = event.y < TOP + CELL_SIZE
 
-    if event.y < TOP + CELL_SIZE:
+    if top:
         i = SIZE - 1 - i
         our, their = their, our
 
+    before = game.top[:], game.bottom[:]
     result = student.play(our, their, i)
 
     assert result != student.INVALID_POSITION, \
@@ -86,30 +186,26 @@ def click(event: tk.Event, canvas: tk.Canvas, game: Game) -> None:
     else:
         msg = "Round over, switch to the next player."
 
-    draw(canvas, game, msg)
+    if game.animate and result != student.EMPTY_POSITION:
+        animate(board, game, before, top, i, msg)
+    else:
+        draw(board, game, msg)
 
 
-def highlight_random(event: tk.Event, canvas: tk.Canvas, game: Game) -> None:
+def highlight_random(event: tk.Event, board: Board, game: Game) -> None:
     top = event.y_root < BOTTOM // 2
-    row = game.top if top else game.bottom
+    row = game.row(top)
 
     result = student.random_choice(row)
     if result is None:
-        draw(canvas, game, "Found no possible moves.")
+        draw(board, game, "Found no possible moves.")
         return
 
     assert 0 <= result < SIZE and row[result] > 0, \
         f"Invalid move returned from random_choice: {result}."
 
-    if top:
-        y = TOP
-        x = LEFT + (1 + SIZE - result) * CELL_SIZE
-    else:
-        y = TOP + CELL_SIZE
-        x = LEFT + (2 + result) * CELL_SIZE
-
-    draw(canvas, game, "Random move selected.")
-    draw_cell(canvas, x, y, row[result], fill="red")
+    draw(board, game, "Random move selected.")
+    board.highlight((top, result))
 
 
 def main() -> None:
@@ -120,16 +216,18 @@ def main() -> None:
     )
 
     game = Game()
-    draw(canvas, game)
+    board = Board(canvas)
+    draw(board, game)
 
     for y in BORDER, BOTTOM + BORDER:
         button = tk.Button(canvas, text="Random")
         button.place(x=(LEFT + RIGHT) // 2, y=y, anchor=tk.CENTER)
         button.bind("<Button-1>",
-                    lambda ev: highlight_random(ev, canvas, game))
+                    lambda ev: highlight_random(ev, board, game))
 
-    canvas.bind("<Button-1>", lambda ev: click(ev, canvas, game))
-    canvas.bind_all("r", lambda _: reset_and_draw(canvas, game))
+    canvas.bind("<Button-1>", lambda ev: click(ev, board, game))
+    canvas.bind_all("r", lambda _: reset_and_draw(board, game))
+    canvas.bind_all("a", lambda _: toggle_animation(board, game))
     canvas.bind_all("q", lambda _: root.destroy())
 
     canvas.pack()
@@ -0,0 +1,272 @@
+import os
+import struct
+from collections import deque
+from concurrent.futures import (Executor, Future, ProcessPoolExecutor,
+                                ThreadPoolExecutor)
+from itertools import islice
+from random import Random
+from time import perf_counter
+from typing import (BinaryIO, Callable, Deque, Iterable, Iterator, List,
+                    Optional, Tuple, TypeVar)
+
+# change hw2 below if your file name is different
+import hw2 as student
+
+# A records file is MAGIC followed by games, each a RECORD header with
+# the size, the start and the number of plies, then one byte per ply:
+# the pit played by the side to move, as passed to student.play().
+MAGIC = b'MKGR'
+RECORD = struct.Struct('<BHH')
+# plies between two snapshots of a Replay
+SNAPSHOT_EVERY = 16
+
+# size, start and moves of one game
+Game = Tuple[int, int, bytes]
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+
+def random_game(size: int, start: int, rng: Random) -> bytes:
+    # the moves of one game of two random_choice() players
+    state = student.encode(*student.init(size, start))
+    moves = bytearray()
+    while True:
+        our = student.decode(state)[state & 1]
+        pit = student.random_choice(our, rng)
+        if pit is None:
+            return bytes(moves)
+        state, _ = student.apply_move(state, pit)
+        moves.append(pit)
+
+
+def write_records(path: str, games: Iterable[Game]) -> int:
+    count = 0
+    with open(path, 'wb') as file:
+        file.write(MAGIC)
+        for size, start, moves in games:
+            file.write(RECORD.pack(size, start, len(moves)))
+            file.write(moves)
+            count += 1
+    return count
+
+
+def read_records(path: str) -> Iterator[Game]:
+    # streams the games, the file is never read whole
+    with open(path, 'rb') as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a game records file")
+        yield from read_games(file, path)
+
+
+def read_games(file: BinaryIO, path: str) -> Iterator[Game]:
+    while True:
+        header = file.read(RECORD.size)
+        if not header:
+            return
+        if len(header) != RECORD.size:
+            raise ValueError(f"{path} ends inside a record")
+        size, start, plies = RECORD.unpack(header)
+        # a state holds sizes up to SIZE_MASK, and a cell has to hold
+        # every seed, which can all end up in one bank
+        if not 1 <= size <= student.SIZE_MASK:
+            raise ValueError(f"{path} has a game of size {size}")
+        if 2 * size * start > student.CELL_MASK:
+            raise ValueError(f"{path} has a game of size {size} "
+                             f"starting with {start} seeds per pit")
+        moves = file.read(plies)
+        if len(moves) != plies:
+            raise ValueError(f"{path} ends inside a record")
+        yield size, start, moves
+
+
+def check(size: int, start: int, moves: bytes) -> Optional[int]:
+    # None if the game follows the rules to its end, otherwise the ply
+    # of the first wrong move, or the number of plies if it is unfinished
+    state = student.encode(*student.init(size, start))
+    for ply, pit in enumerate(moves):
+        state, result = student.apply_move(state, pit)
+        if result in (student.INVALID_POSITION, student.EMPTY_POSITION):
+            return ply
+    our = student.decode(state)[state & 1]
+    if any(our[:-1]):
+        return len(moves)
+    return None
+
+
+def check_games(games: List[Game]) -> List[Optional[int]]:
+    return [check(*game) for game in games]
+
+
+def map_ahead(pool: Executor, function: Callable[[T], R],
+              items: Iterable[T], ahead: int) -> Iterator[R]:
+    # pool.map() in order, but an item is taken only as the oldest of
+    # the ahead ones in flight is done; pool.map() takes them all first
+    pending: Deque[Future] = deque()
+    for item in items:
+        pending.append(pool.submit(function, item))
+        if len(pending) >= ahead:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def verify(path: str, workers: Optional[int] = 1,
+           chunk: int = 10_000) -> Iterator[Tuple[int, int]]:
+    # yields the index and the ply of every game in the file that breaks
+    # the rules, checking chunks of games across workers with two chunks
+    # per worker read ahead
+    games = read_records(path)
+    chunks = iter(lambda: list(islice(games, chunk)), [])
+    if workers == 1:
+        results: Iterator[List[Optional[int]]] = map(check_games, chunks)
+        pool = None
+    else:
+        pool = ProcessPoolExecutor(workers)
+        ahead = 2 * (workers or os.cpu_count() or 1)
+        results = map_ahead(pool, check_games, chunks, ahead)
+
+    try:
+        index = 0
+        for plies in results:
+            for ply in plies:
+                if ply is not None:
+                    yield index, ply
+                index += 1
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+
+class Replay:
+    # Positions of a recorded game by ply. Every SNAPSHOT_EVERY plies the
+    # state is kept, so a seek replays less than SNAPSHOT_EVERY moves.
+    def __init__(self, size: int, start: int, moves: bytes) -> None:
+        self.moves = moves
+        self.snapshots: List[int] = []
+        self.results: List[int] = []
+        state = student.encode(*student.init(size, start))
+        for ply, pit in enumerate(moves):
+            if ply % SNAPSHOT_EVERY == 0:
+                self.snapshots.append(state)
+            state, result = student.apply_move(state, pit)
+            self.results.append(result)
+        self.last = state
+
+    def __len__(self) -> int:
+        return len(self.moves)
+
+    def state(self, ply: int) -> int:
+        # the state before the move of ply, len(self) for the end
+        if not 0 <= ply <= len(self.moves):
+            raise IndexError(ply)
+        if ply == len(self.moves):
+            return self.last
+        snapshot = ply // SNAPSHOT_EVERY
+        state = self.snapshots[snapshot]
+        for pit in self.moves[snapshot * SNAPSHOT_EVERY:ply]:
+            state, _ = student.apply_move(state, pit)
+        return state
+
+    def position(self, ply: int) -> Tuple[List[int], List[int], int]:
+        # rows of the first and the second player and who is to move
+        return student.decode(self.state(ply))
+
+
+def main() -> None:
+    path = "_hw2_record_test_"
+    rng = Random(1)
+
+    # --- records ---
+
+    games = [(size, start, random_game(size, start, rng))
+             for size, start in [(6, 3), (1, 1), (9, 7), (4, 2)] * 50]
+    assert write_records(path, games) == len(games)
+    assert os.path.getsize(path) == len(MAGIC) \
+        + sum(RECORD.size + len(moves) for _, _, moves in games)
+    assert list(read_records(path)) == games
+    assert list(verify(path)) == []
+    assert list(verify(path, workers=2, chunk=7)) == []
+
+    taken = []
+
+    def chunks() -> Iterator[List[int]]:
+        for i in range(100):
+            taken.append(i)
+            yield [i]
+
+    with ThreadPoolExecutor(2) as pool:
+        results = map_ahead(pool, sum, chunks(), 4)
+        assert next(results) == 0 and len(taken) == 4
+        assert list(results) == list(range(1, 100))
+
+    # --- replay ---
+
+    size, start, moves = games[0]
+    replay = Replay(size, start, moves)
+    our, their = student.init(size, start)
+    mover = 0
+    for ply, pit in enumerate(moves):
+        assert replay.position(ply) == (our, their, mover)
+        rows = (our, their) if mover == 0 else (their, our)
+        result = student.play(rows[0], rows[1], pit)
+        assert replay.results[ply] == result
+        if result == student.ROUND_OVER:
+            mover = 1 - mover
+    assert replay.position(len(replay)) == (our, their, mover)
+    assert not any(student.decode(replay.last)[mover][:-1])
+
+    # --- broken games ---
+
+    wrong = bytearray(moves)
+    wrong[5] = size
+    # the first ply where the side to move has an empty pit
+    for ply in range(len(replay)):
+        rows = replay.position(ply)
+        if 0 in rows[rows[2]][:-1]:
+            break
+    empty = bytearray(moves)
+    empty[ply] = rows[rows[2]].index(0)
+    broken = [(size, start, bytes(wrong)), (size, start, moves[:-1]),
+              (size, start, moves), (size, start, bytes(empty))]
+    write_records(path, broken)
+    assert list(verify(path)) == [(0, 5), (1, len(moves) - 1), (3, ply)]
+
+    with open(path, 'ab') as file:
+        file.write(RECORD.pack(6, 3, 10) + b'\0')
+    try:
+        list(read_records(path))
+        assert False, "a cut record has to be found"
+    except ValueError:
+        pass
+    for size, start in (0, 3), (128, 3), (200, 1), (6, 5462):
+        write_records(path, [(size, start, b'')])
+        try:
+            list(read_records(path))
+            assert False, f"size {size}, start {start} has to be refused"
+        except ValueError:
+            pass
+    write_records(path, [(127, 258, b''), (1, 0, b'')])
+    assert list(verify(path)) == [(0, 0)]
+    os.remove(path)
+
+    # --- speed ---
+
+    write_records(path, ((6, 3, random_game(6, 3, rng))
+                         for _ in range(20_000)))
+    begin = perf_counter()
+    assert list(verify(path)) == []
+    elapsed = perf_counter() - begin
+    replay = Replay(*next(read_records(path)))
+    begin = perf_counter()
+    for ply in range(len(replay)):
+        replay.position(ply)
+    seek = (perf_counter() - begin) / len(replay)
+    print(f"verified {20_000 / elapsed:.0f} games/s, "
+          f"{os.path.getsize(path) / 20_000:.1f} bytes/game, "
+          f"seek {seek * 1e6:.1f} us")
+    os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
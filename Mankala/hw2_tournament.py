@@ -0,0 +1,345 @@
+import argparse
+import inspect
+import json
+import math
+import os
+import random
+import struct
+import time
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# change hw2 below if your file name is different
+import hw2 as student
+import hw2_ai as ai
+
+# Round-robin tournaments of move-selection agents, without tkinter.
+# An agent is called either like student.random_choice(our) or, when
+# it takes two arguments, with (our, their), and returns a pit. An agent
+# with an rng parameter gets a random.Random seeded for the game, so a
+# game plays the same in any process. An agent that returns a wrong
+# move or runs over the time limit forfeits.
+
+Agent = Callable[..., Optional[int]]
+# indices of the first and the second agent, their scores and outcome
+Game = Tuple[int, int, int, int, int]
+
+FINISHED = 0
+FIRST_FORFEITED = 1
+SECOND_FORFEITED = 2
+
+# a results file is MAGIC, the length of a JSON header, the header with
+# names and ratings of the agents and a RECORD for every game
+MAGIC = b'MKTR'
+LENGTH = struct.Struct('<I')
+RECORD = struct.Struct('<HHHHB')
+
+# the search goes this deep whatever the time, so its moves do not
+# depend on the machine; it takes about 10 ms on the opening of size 6
+SEARCH_DEPTH = 6
+searcher = ai.Searcher()
+
+
+def greedy_choice(our: List[int], their: List[int]) -> Optional[int]:
+    # the move that banks most, counting an extra turn as one more seed
+    best, best_gain = None, -1
+    for pit in range(len(our) - 1):
+        our_after, their_after = our[:], their[:]
+        result = student.play(our_after, their_after, pit)
+        if result in (student.ROUND_OVER, student.PLAY_AGAIN):
+            gain = our_after[-1] - our[-1] + (result == student.PLAY_AGAIN)
+            if gain > best_gain:
+                best, best_gain = pit, gain
+    return best
+
+
+def search_choice(our: List[int], their: List[int]) -> Optional[int]:
+    return searcher.best_move(our, their, budget=math.inf,
+                              max_depth=SEARCH_DEPTH)
+
+
+def new_search() -> None:
+    # the transposition table of one game would steer the next
+    global searcher
+    searcher = ai.Searcher()
+
+
+AGENTS: Dict[str, Agent] = {
+    'random': student.random_choice,
+    'greedy': greedy_choice,
+    'search': search_choice,
+}
+
+# what to call before every game of an agent that keeps state between
+# its moves
+NEW_GAME: Dict[Agent, Callable[[], None]] = {
+    search_choice: new_search,
+}
+
+
+def wants_board(agent: Agent) -> bool:
+    try:
+        parameters = inspect.signature(agent).parameters.values()
+    except (TypeError, ValueError):
+        return False
+    required = [parameter for parameter in parameters
+                if parameter.kind in (parameter.POSITIONAL_ONLY,
+                                      parameter.POSITIONAL_OR_KEYWORD)
+                and parameter.default is parameter.empty]
+    return len(required) >= 2
+
+
+def wants_rng(agent: Agent) -> bool:
+    try:
+        return 'rng' in inspect.signature(agent).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+def play_game(first: Agent, second: Agent, size: int, start: int,
+              limit: float, seed: int) -> Tuple[int, int, int]:
+    # scores of both agents and the outcome of one game
+    rng = random.Random(seed)
+    agents = first, second
+    boards = wants_board(first), wants_board(second)
+    options = [{'rng': rng} if wants_rng(agent) else {} for agent in agents]
+    for agent in set(agents):
+        if agent in NEW_GAME:
+            NEW_GAME[agent]()
+    rows = student.init(size, start)
+    mover = 0
+    outcome = FINISHED
+
+    # the game ends when the side to move has no move
+    while any(rows[mover][:-1]):
+        our, their = rows[mover], rows[1 - mover]
+        began = perf_counter()
+        if boards[mover]:
+            move = agents[mover](our[:], their[:], **options[mover])
+        else:
+            move = agents[mover](our[:], **options[mover])
+        if perf_counter() - began > limit or not isinstance(move, int):
+            result = student.INVALID_POSITION
+        else:
+            result = student.play(our, their, move)
+        if result in (student.INVALID_POSITION, student.EMPTY_POSITION):
+            outcome = FIRST_FORFEITED if mover == 0 else SECOND_FORFEITED
+            break
+        if result == student.ROUND_OVER:
+            mover = 1 - mover
+
+    return(sum(rows[0]), sum(rows[1]), outcome)
+
+
+def tournament(agents: Sequence[Agent], games: int, size: int = 6,
+               start: int = 3, limit: float = 1.0, seed: int = 0,
+               workers: Optional[int] = None) -> List[Game]:
+    # every agent plays games games as the first and games games as the
+    # second player against each other agent
+    rng = random.Random(seed)
+    pairs = [(i, j) for i in range(len(agents)) for j in range(len(agents))
+             if i != j for _ in range(games)]
+    seeds = [rng.getrandbits(64) for _ in pairs]
+    firsts = [agents[i] for i, _ in pairs]
+    seconds = [agents[j] for _, j in pairs]
+    arguments = (firsts, seconds, [size] * len(pairs), [start] * len(pairs),
+                 [limit] * len(pairs), seeds)
+
+    if workers == 1:
+        results = list(map(play_game, *arguments))
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            results = list(pool.map(play_game, *arguments))
+
+    return [(i, j, first, second, outcome)
+            for (i, j), (first, second, outcome) in zip(pairs, results)]
+
+
+def points(game: Game) -> float:
+    # what the first agent scored: 1 for a win, 0.5 for a draw
+    _, _, first, second, outcome = game
+    if outcome != FINISHED:
+        return float(outcome == SECOND_FORFEITED)
+    return 1.0 if first > second else 0.5 if first == second else 0.0
+
+
+def elo(agents: int, games: Sequence[Game],
+        iterations: int = 200) -> List[float]:
+    # Bradley-Terry strengths fitted by minorization-maximization, as Elo
+    # ratings around 1500; every pair that met gets one more virtual draw
+    # so that agents without a win keep a finite rating
+    won = [[0.0] * agents for _ in range(agents)]
+    played = [[0] * agents for _ in range(agents)]
+    for game in games:
+        i, j = game[0], game[1]
+        score = points(game)
+        won[i][j] += score
+        won[j][i] += 1 - score
+        played[i][j] += 1
+        played[j][i] += 1
+    for i in range(agents):
+        for j in range(agents):
+            if played[i][j]:
+                won[i][j] += 0.5
+                played[i][j] += 1
+
+    strength = [1.0] * agents
+    for _ in range(iterations):
+        for i in range(agents):
+            expected = sum(played[i][j] / (strength[i] + strength[j])
+                           for j in range(agents) if played[i][j])
+            if expected:
+                strength[i] = sum(won[i]) / expected
+        mean = math.exp(sum(map(math.log, strength)) / agents)
+        strength = [value / mean for value in strength]
+
+    return [1500 + 400 * math.log10(value) for value in strength]
+
+
+def write_results(path: str, names: Sequence[str], ratings: Sequence[float],
+                  games: Sequence[Game], **settings: object) -> None:
+    header = json.dumps({'names': list(names), 'elo': list(ratings),
+                         **settings}).encode()
+    with open(path, 'wb') as file:
+        file.write(MAGIC + LENGTH.pack(len(header)) + header)
+        for game in games:
+            file.write(RECORD.pack(*game))
+
+
+def read_results(path: str) -> Tuple[dict, List[Game]]:
+    with open(path, 'rb') as file:
+        data = file.read()
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not a tournament results file")
+    length, = LENGTH.unpack_from(data, len(MAGIC))
+    start = len(MAGIC) + LENGTH.size
+    header = json.loads(data[start:start + length])
+    return header, list(RECORD.iter_unpack(data[start + length:]))
+
+
+def print_results(names: Sequence[str], ratings: Sequence[float],
+                  games: Sequence[Game]) -> None:
+    print("  agent        games   won  drew  lost  forfeits     elo")
+    for i, name in sorted(enumerate(names), key=lambda agent:
+                          -ratings[agent[0]]):
+        won = drew = lost = forfeits = 0
+        for game in games:
+            if i not in game[:2]:
+                continue
+            score = points(game) if game[0] == i else 1 - points(game)
+            won += score == 1
+            drew += score == 0.5
+            lost += score == 0
+            forfeits += game[4] == (FIRST_FORFEITED if game[0] == i
+                                    else SECOND_FORFEITED)
+        print(f"  {name:10}   {won + drew + lost:5d}   {won:3d}   {drew:3d}"
+              f"   {lost:3d}   {forfeits:7d}   {ratings[i]:5.0f}")
+
+
+def slow_choice(our: List[int],
+                rng: Optional[random.Random] = None) -> Optional[int]:
+    time.sleep(0.02)
+    return student.random_choice(our, rng)
+
+
+def test() -> None:
+    path = "_hw2_tournament_test_"
+
+    # --- agents ---
+
+    assert not wants_board(student.random_choice)
+    assert wants_board(greedy_choice)
+    assert greedy_choice([1, 2, 0, 0], [1, 1, 1, 0]) == 1
+    assert wants_rng(student.random_choice) and not wants_rng(greedy_choice)
+    assert play_game(student.random_choice, greedy_choice, 4, 2, 1.0, 7) \
+        == play_game(student.random_choice, greedy_choice, 4, 2, 1.0, 7)
+    # a game leaves the global generator alone
+    random.seed(5)
+    expected = random.random()
+    random.seed(5)
+    play_game(student.random_choice, search_choice, 4, 2, 1.0, 7)
+    assert random.random() == expected
+    first, second, outcome = \
+        play_game(slow_choice, greedy_choice, 4, 2, 0.01, 1)
+    assert outcome == FIRST_FORFEITED and first + second == 16
+
+    # --- tournament ---
+
+    agents = [student.random_choice, greedy_choice]
+    games = tournament(agents, 100, 4, 3, seed=3, workers=1)
+    assert len(games) == 200
+    assert games == tournament(agents, 100, 4, 3, seed=3, workers=2)
+    assert all(outcome == FINISHED and first + second == 24
+               for _, _, first, second, outcome in games)
+    ratings = elo(2, games)
+    assert ratings[1] > ratings[0] and abs(sum(ratings) - 3000) < 1e-6
+
+    # the searcher starts every game afresh, wherever it is played
+    agents = [student.random_choice, search_choice]
+    searched = tournament(agents, 10, 4, 3, seed=4, workers=1)
+    assert searched == tournament(agents, 10, 4, 3, seed=4, workers=2)
+    assert searched == tournament(agents, 10, 4, 3, seed=4, workers=1)
+
+    # --- elo ---
+
+    assert elo(2, [(0, 1, 3, 1, FINISHED), (1, 0, 3, 1, FINISHED)]) \
+        == [1500, 1500]
+    ratings = elo(3, [(0, 1, 3, 1, FINISHED), (1, 2, 3, 1, FINISHED),
+                      (2, 0, 0, 0, FIRST_FORFEITED)] * 5)
+    assert ratings[0] > ratings[1] > ratings[2]
+
+    # --- results file ---
+
+    write_results(path, ["random", "greedy"], ratings[:2], games, size=4)
+    header, stored = read_results(path)
+    assert header == {'names': ["random", "greedy"],
+                      'elo': ratings[:2], 'size': 4}
+    assert stored == games
+    assert os.path.getsize(path) - RECORD.size * len(games) < 200
+    os.remove(path)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Round-robin tournament of Mankala agents")
+    parser.add_argument('agents', nargs='*', metavar='AGENT',
+                        help="out of " + ", ".join(AGENTS)
+                             + "; all by default")
+    parser.add_argument('--games', type=int, default=10,
+                        help="games of every pair with each first player")
+    parser.add_argument('--size', type=int, default=6)
+    parser.add_argument('--start', type=int, default=3)
+    parser.add_argument('--time-limit', type=float, default=1.0,
+                        help="seconds per move")
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default="tournament.bin",
+                        help="results file")
+    parser.add_argument('--test', action='store_true',
+                        help="run the self-tests and exit")
+    args = parser.parse_args()
+
+    if args.test:
+        test()
+        return
+    names = args.agents or list(AGENTS)
+    for name in names:
+        if name not in AGENTS:
+            parser.error(f"unknown agent: {name}")
+
+    start = perf_counter()
+    games = tournament([AGENTS[name] for name in names], args.games,
+                       args.size, args.start, args.time_limit, args.seed,
+                       args.workers)
+    elapsed = perf_counter() - start
+    ratings = elo(len(names), games)
+    write_results(args.out, names, ratings, games, size=args.size,
+                  start=args.start, time_limit=args.time_limit,
+                  seed=args.seed)
+    print(f"{len(games)} games in {elapsed:.1f} s, results in {args.out}")
+    print_results(names, ratings, games)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,8 @@
-from typing import List, Tuple
-from random import choice as choose
+from typing import Dict, List, Optional, Sequence, Tuple
+from random import getrandbits
 
 
-Block = List[Tuple[int, int]]
+Block = Sequence[Tuple[int, int]]
 Pivot = Tuple[int, int]
 
 BLOCK_I, BLOCK_J, BLOCK_L, BLOCK_S, BLOCK_Z, BLOCK_T, BLOCK_O = range(7)
@@ -22,29 +22,56 @@ EMPTY = "  "
 
 Arena = List[List[str]]
 
+MASK64 = (1 << 64) - 1
+
 
 def coords(block_type: int) -> Block:
     return(BLOCKS[block_type])
 
 
-def rotate_cw(arena: Arena, coords: Block, pivot: Pivot) -> Block:
-    new_coords = []
-    for x, y in coords:
-        if not is_occupied(arena, pivot[1]-y, pivot[0]+x):
-            new_coords.append((-y, x))
-        else:
+def orientations(block: Block) -> List[Tuple[Tuple[int, int], ...]]:
+    # the block and its three clockwise turns around the pivot
+    turns = [tuple(block)]
+    for _ in range(3):
+        turns.append(tuple((-y, x) for x, y in turns[-1]))
+    return(turns)
+
+
+def turn_table(step: int) -> Dict[Tuple[Tuple[int, int], ...],
+                                  Tuple[Tuple[int, int], ...]]:
+    # every orientation of BLOCKS mapped to it turned step times clockwise
+    table = {}
+    for block in BLOCKS:
+        turns = orientations(block)
+        for i, turn in enumerate(turns):
+            table[turn] = turns[(i + step) % 4]
+    return(table)
+
+
+TURNED_CW = turn_table(1)
+TURNED_CCW = turn_table(-1)
+
+
+def rotate(arena: Arena, coords: Block, pivot: Pivot,
+           new_coords: Block) -> Block:
+    for x, y in new_coords:
+        if is_occupied(arena, pivot[1]+y, pivot[0]+x):
             return(coords)
     return(new_coords)
 
 
+def rotate_cw(arena: Arena, coords: Block, pivot: Pivot) -> Block:
+    new_coords = TURNED_CW.get(tuple(coords))
+    if new_coords is None:
+        new_coords = tuple((-y, x) for x, y in coords)
+    return(rotate(arena, coords, pivot, new_coords))
+
+
 def rotate_ccw(arena: Arena, coords: Block, pivot: Pivot) -> Block:
-    new_coords = []
-    for x, y in coords:
-        if not is_occupied(arena, pivot[1]+y, pivot[0]-x):
-            new_coords.append((y, -x))
-        else:
-            return(coords)
-    return(new_coords)
+    new_coords = TURNED_CCW.get(tuple(coords))
+    if new_coords is None:
+        new_coords = tuple((y, -x) for x, y in coords)
+    return(rotate(arena, coords, pivot, new_coords))
 
 
 def new_arena(cols: int, rows: int) -> Arena:
@@ -80,9 +107,33 @@ def draw(arena: Arena, score: int, pivot, block) -> None:
     print('   Score: ', score)
 
 
+def piece_at(seed: int, index: int, types: int = 6) -> int:
+    # the index-th block type of the sequence given by seed (splitmix64),
+    # so any piece of a game can be found without drawing the ones before
+    z = (seed + (index + 1) * 0x9E3779B97F4A7C15) & MASK64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK64
+    return((z ^ (z >> 31)) % types)
+
+
+class Pieces:
+    # block types drawn one by one from a seeded sequence
+    def __init__(self, seed: Optional[int] = None) -> None:
+        self.seed = getrandbits(64) if seed is None else seed
+        self.index = 0
+
+    def next(self) -> int:
+        piece = piece_at(self.seed, self.index)
+        self.index += 1
+        return(piece)
+
+
+pieces = Pieces()
+
+
 def next_block() -> Block:
     # change this function as you wish
-    return coords(choose(range(6)))
+    return coords(pieces.next())
 
 
 def left(pivot: Pivot):
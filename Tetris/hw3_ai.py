@@ -0,0 +1,339 @@
+import math
+from collections import deque
+from random import Random
+from time import perf_counter
+from typing import Deque, List, NamedTuple, Optional, Tuple
+
+# change hw3 below if your file name is different
+import hw3 as student
+import hw3_bitboard as bitboard
+import hw3_engine as engine
+
+# A player that tries every placement of the falling piece it can reach
+# by turning and moving it just below where it appears and dropping it,
+# and keeps the one whose arena scores best. The features of the arena
+# before the drop are found once per piece; a placement only changes the
+# heights of the columns under the piece and adds the cells it covers as
+# holes, so it is scored from the column heights. Only a placement that
+# clears lines or lands under an overhang is locked into a copy and
+# rescanned.
+
+
+class Weights(NamedTuple):
+    # the weights found by Yiyuan Lee's genetic search for this scoring
+    height: float = -0.510066
+    lines: float = 0.760666
+    holes: float = -0.35663
+    bumpiness: float = -0.184483
+
+
+# rotation, pivot column, landing row and the actions that get there
+Placement = Tuple[int, int, int, List[int]]
+# value of a placement and the placement
+Option = Tuple[float, Placement]
+
+
+def column_tops(shape: bitboard.Orientation) -> Tuple[int, ...]:
+    # the highest row of each column of the piece, from the pivot
+    columns = range(shape.left, shape.left + len(shape.bottoms))
+    return tuple(min(y for x, y in shape.cells if x == column)
+                 for column in columns)
+
+
+# TOPS[block type][rotation], as bitboard.PIECES
+TOPS = tuple(tuple(column_tops(shape) for shape in turns)
+             for turns in bitboard.PIECES)
+
+# rows a piece goes down before it is turned and moved, so that turns
+# sticking out above it fit
+DESCENT = 2
+
+MOVES = ((student.ROTATE_CW, 1, 0), (student.ROTATE_CCW, -1, 0),
+         (student.LEFT, 0, -1), (student.RIGHT, 0, 1))
+
+
+def count_holes(arena: bitboard.BitArena) -> int:
+    # empty cells with a taken cell somewhere above them
+    covered = holes = 0
+    for row in arena.rows:
+        holes += (covered & ~row).bit_count()
+        covered |= row
+    return holes
+
+
+def bumpiness(heights: List[int]) -> int:
+    return sum(abs(a - b) for a, b in zip(heights, heights[1:]))
+
+
+class Board:
+    # the features of an arena before a piece lands on it
+    __slots__ = ('arena', 'heights', 'holes')
+
+    def __init__(self, arena: bitboard.BitArena) -> None:
+        self.arena = arena
+        self.heights = [len(arena.rows) - top for top in arena.tops]
+        self.holes = count_holes(arena)
+
+
+def score(heights: List[int], lines: int, holes: int,
+          weights: Weights) -> float:
+    return weights.height * sum(heights) + weights.lines * lines \
+        + weights.holes * holes + weights.bumpiness * bumpiness(heights)
+
+
+def rescan(arena: bitboard.BitArena, piece: int, rotation: int, x: int,
+           y: int, weights: Weights) -> float:
+    after = arena.copy()
+    lines = bitboard.lock(after, piece, rotation, x, y)
+    heights = [len(after.rows) - top for top in after.tops]
+    return score(heights, lines, count_holes(after), weights)
+
+
+def evaluate(board: Board, piece: int, rotation: int, x: int, y: int,
+             weights: Weights) -> float:
+    # the value of the arena after the piece locks with its pivot at
+    # (x, y), where it has to fit and be unable to go down
+    arena = board.arena
+    shape = bitboard.PIECES[piece][rotation]
+    left, top = x + shape.left, y + shape.top
+    rows, tops = arena.rows, arena.tops
+    for i, mask in enumerate(shape.masks):
+        if rows[top + i] | mask << left == arena.full:
+            return rescan(arena, piece, rotation, x, y, weights)
+
+    heights = board.heights[:]
+    holes = board.holes
+    for column, (bottom, high) in enumerate(
+            zip(shape.bottoms, TOPS[piece][rotation]), left):
+        if y + bottom >= tops[column]:
+            return rescan(arena, piece, rotation, x, y, weights)
+        holes += tops[column] - 1 - (y + bottom)
+        heights[column] = len(rows) - (y + high)
+    return score(heights, 0, holes, weights)
+
+
+def placements(arena: bitboard.BitArena, piece: int, rotation: int, x: int,
+               y: int) -> List[Placement]:
+    # every distinct placement the piece can be turned and moved to a
+    # few rows down and dropped from, with the shortest way there
+    descent = []
+    while len(descent) < DESCENT \
+            and bitboard.fits(arena, piece, rotation, x, y + 1):
+        descent.append(student.DOWN)
+        y += 1
+    start = (rotation, x)
+    paths = {start: descent}
+    queue = deque([start])
+    while queue:
+        turned, column = queue.popleft()
+        for action, turns, dx in MOVES:
+            after = ((turned + turns) % 4, column + dx)
+            if after not in paths \
+                    and bitboard.fits(arena, piece, after[0], after[1], y):
+                paths[after] = paths[(turned, column)] + [action]
+                queue.append(after)
+
+    found = []
+    seen = set()
+    for (turned, column), path in paths.items():
+        landing = bitboard.drop(arena, piece, turned, column, y)
+        shape = bitboard.PIECES[piece][turned]
+        # turns of the O block, and some of I, S and Z, look the same
+        cells = (shape.masks, column + shape.left, landing + shape.top)
+        if cells not in seen:
+            seen.add(cells)
+            found.append((turned, column, landing, path))
+    return found
+
+
+def options(arena: bitboard.BitArena, piece: int, rotation: int, x: int,
+            y: int, weights: Weights,
+            deadline: float = math.inf) -> List[Option]:
+    # past the deadline, by perf_counter(), the placements not yet scored
+    # are left out; the first one always is scored
+    board = Board(arena)
+    found = []
+    for turned, column, landing, path \
+            in placements(arena, piece, rotation, x, y):
+        if found and perf_counter() > deadline:
+            break
+        found.append((evaluate(board, piece, turned, column, landing,
+                               weights),
+                      (turned, column, landing, path)))
+    return found
+
+
+class Player:
+    # Plays an engine.State one action at a time, as an engine.Policy or,
+    # after see() is given every drawn state, as student.poll_event().
+    # With lookahead, that many of the best placements are scored again
+    # by the best placement of the next piece after them. Once budget
+    # seconds have gone on a piece, the best placement scored so far is
+    # taken, and None lets every decision search to the end. The budget
+    # bounds the search, not the wall time: finding the placements comes
+    # before the first check, one placement and its rescan can run past
+    # it, and a garbage collection or a busy machine adds to any of them.
+    def __init__(self, weights: Weights = Weights(), lookahead: int = 0,
+                 budget: Optional[float] = 0.001) -> None:
+        self.weights = weights
+        self.lookahead = lookahead
+        self.budget = budget
+        self.plan: Deque[int] = deque()
+        self.piece: Optional[Tuple[int, int]] = None
+        self.state: Optional[engine.State] = None
+        # seconds spent to choose the last placement
+        self.elapsed = 0.0
+
+    def choose(self, state: engine.State,
+               deadline: float = math.inf) -> Optional[Placement]:
+        arena, piece, rotation, x, y = state[:5]
+        found = options(arena, piece, rotation, x, y, self.weights,
+                        deadline)
+        if not found:
+            return None
+        if not self.lookahead:
+            return max(found, key=lambda option: option[0])[1]
+
+        found.sort(key=lambda option: option[0], reverse=True)
+        best, best_value = found[0][1], float('-inf')
+        for _, placement in found[:self.lookahead]:
+            if perf_counter() > deadline:
+                break
+            turned, column, landing, _ = placement
+            after = arena.copy()
+            lines = bitboard.lock(after, piece, turned, column, landing)
+            spawned, over = engine.spawn(after, state.seed, state.index + 1,
+                                         0, 0)
+            if over:
+                continue
+            following = options(after, *spawned[1:5], self.weights,
+                                deadline)
+            if not following:
+                continue
+            value = self.weights.lines * lines \
+                + max(value for value, _ in following)
+            if value > best_value:
+                best, best_value = placement, value
+        return best
+
+    def policy(self, state: engine.State) -> int:
+        if (state.seed, state.index) != self.piece:
+            start = perf_counter()
+            self.piece = state.seed, state.index
+            placement = self.choose(
+                state, math.inf if self.budget is None
+                else start + self.budget)
+            self.plan = deque(placement[3] if placement else [])
+            self.elapsed = perf_counter() - start
+        return self.plan.popleft() if self.plan else student.DROP
+
+    def see(self, state: engine.State) -> None:
+        self.state = state
+
+    def poll_event(self) -> int:
+        assert self.state is not None, "see() has to get the state first"
+        return self.policy(self.state)
+
+
+def main() -> None:
+    rng = Random(1)
+    weights = Weights()
+
+    # --- features from column heights against rescanning ---
+
+    for _ in range(300):
+        arena = bitboard.new_arena(10, 22)
+        for y in range(rng.randrange(4, 22), 22):
+            for x in range(10):
+                if rng.random() < 0.7:
+                    arena.set_occupied(x, y, True)
+        arena.clear_lines()
+        piece = rng.randrange(7)
+        board = Board(arena)
+        for turned, column, landing, path \
+                in placements(arena, piece, 0, 5, 1):
+            assert evaluate(board, piece, turned, column, landing, weights) \
+                == rescan(arena, piece, turned, column, landing, weights)
+            state = engine.State(arena, piece, 0, 5, 1, 0, 0, 0, 0)
+            for action in path:
+                state, _, _ = engine.step(state, action)
+            assert (state.rotation, state.x) == (turned, column)
+            after = arena.copy()
+            bitboard.lock(after, piece, turned, column, landing)
+            assert engine.step(state, student.DROP)[0].arena.rows \
+                == after.rows
+
+    arena = bitboard.new_arena(4, 4)
+    arena.place((0b1110,), 0, 3)
+    assert count_holes(arena) == 0
+    arena.place((0b0011,), 0, 1)
+    assert count_holes(arena) == 3
+    assert bumpiness([3, 1, 1, 4]) == 5
+
+    # --- reachable placements ---
+
+    i = student.BLOCK_I
+    arena = bitboard.new_arena(10, 22)
+    found = placements(arena, i, 0, 5, 1)
+    # ten columns standing up, seven lying down
+    assert len(found) == 17
+    o = placements(arena, student.BLOCK_O, 0, 5, 0)
+    assert len(o) == 9
+    # walls on both sides of the start keep the piece in its column
+    arena.place((0b1,) * 6, 4, 0)
+    arena.place((0b1,) * 6, 6, 0)
+    assert [(turned, column) for turned, column, _, _
+            in placements(arena, i, 0, 5, 1)] == [(0, 5)]
+
+    # a ready well is filled
+    arena = bitboard.new_arena(10, 22)
+    arena.place((0b1111111110,) * 4, 0, 18)
+    state = engine.State(arena, i, 0, 5, 1, 0, 0, 0, 0)
+    player = Player()
+    while state.index == 0:
+        state, cleared, _ = engine.step(state, player.policy(state))
+    assert cleared == 4
+
+    # --- as poll_event ---
+
+    player = Player()
+    score = engine.play(player.poll_event, player.see, seed=3)
+    assert score > 0
+
+    # --- against random play ---
+
+    # play is measured without the budget, which a busy machine cuts into
+    results = engine.run_games(Player(budget=None).policy, 8, seed=2,
+                               workers=1, max_pieces=300)
+    assert sum(lines for _, lines, _ in results) > 8 * 100
+    assert all(pieces == 300 for pieces, _, _ in results)
+
+    results = engine.run_games(Player(lookahead=4, budget=None).policy, 2,
+                               seed=2, workers=1, max_pieces=300)
+    assert all(pieces == 300 for pieces, _, _ in results)
+
+    # with no time at all, the first placement found is taken
+    arena = bitboard.new_arena(10, 22)
+    assert len(options(arena, i, 0, 5, 1, weights, deadline=0)) == 1
+    results = engine.run_games(Player(budget=0).policy, 2, seed=2,
+                               workers=1, max_pieces=100)
+    assert all(pieces <= 100 for pieces, _, _ in results)
+
+    player = Player()
+    state = engine.new_game(10, 22, 5)
+    over = False
+    worst = total = 0.0
+    while state.index < 200:
+        index = state.index
+        while state.index == index:
+            state, _, over = engine.step(state, player.policy(state))
+            assert not over
+        worst = max(worst, player.elapsed)
+        total += player.elapsed
+    print(f"decisions: {total / state.index * 1e3:.2f} ms on average, "
+          f"{worst * 1e3:.2f} ms at worst, "
+          f"budget {player.budget * 1e3:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+import os
+from random import Random
+from time import perf_counter
+
+# change hw3 below if your file name is different
+import hw3 as student
+import hw3_ai as ai
+import hw3_bitboard as bitboard
+import hw3_engine as engine
+import hw3_record as record
+
+ROWS = 22
+COLS = 10
+CHECKS = 200_000
+
+
+def bench_collisions() -> None:
+    rng = Random(1)
+    arena = student.new_arena(COLS, ROWS)
+    bits = bitboard.new_arena(COLS, ROWS)
+    # the bottom half taken at random
+    for y in range(ROWS // 2, ROWS):
+        for x in range(COLS):
+            if rng.random() < 0.6:
+                student.set_occupied(arena, y, x, True)
+                bits.set_occupied(x, y, True)
+
+    blocks = [student.BLOCKS[rng.randrange(7)] for _ in range(1000)]
+    pivots = [(rng.randrange(1, COLS - 2), rng.randrange(1, ROWS - 2))
+              for _ in range(1000)]
+    masks = [bitboard.piece_masks(block) for block in blocks]
+    print(f"collision checks on a {COLS}x{ROWS} arena")
+    print("  arena        checks/s")
+
+    start = perf_counter()
+    for i in range(CHECKS):
+        block, (px, py) = blocks[i % 1000], pivots[i % 1000]
+        # student.is_occupied() takes the row first
+        any(student.is_occupied(arena, py + y, px + x) for x, y in block)
+    print(f"  lists    {CHECKS / (perf_counter() - start):12.0f}")
+
+    start = perf_counter()
+    for i in range(CHECKS):
+        (left, top, rows), (px, py) = masks[i % 1000], pivots[i % 1000]
+        bits.collides(rows, px + left, py + top)
+    print(f"  bits     {CHECKS / (perf_counter() - start):12.0f}")
+
+
+def bench_drop() -> None:
+    rng = Random(1)
+    arena = bitboard.new_arena(COLS, ROWS)
+    for y in range(ROWS // 2, ROWS):
+        for x in range(COLS):
+            if rng.random() < 0.6:
+                arena.set_occupied(x, y, True)
+    drops = []
+    while len(drops) < 1000:
+        piece, rotation = rng.randrange(7), rng.randrange(4)
+        x = rng.randrange(COLS)
+        if bitboard.fits(arena, piece, rotation, x, 2):
+            drops.append((piece, rotation, x))
+
+    print(f"hard drops from the top of a {COLS}x{ROWS} arena")
+    print("  method       drops/s")
+    start = perf_counter()
+    for i in range(CHECKS // 10):
+        piece, rotation, x = drops[i % 1000]
+        y = 2
+        while bitboard.fits(arena, piece, rotation, x, y + 1):
+            y += 1
+    print(f"  stepping  {CHECKS / 10 / (perf_counter() - start):10.0f}")
+    start = perf_counter()
+    for i in range(CHECKS // 10):
+        piece, rotation, x = drops[i % 1000]
+        bitboard.drop(arena, piece, rotation, x, 2)
+    print(f"  tops      {CHECKS / 10 / (perf_counter() - start):10.0f}")
+
+
+def bench_engine() -> None:
+    print(f"random_policy games on a {COLS}x{ROWS} arena")
+    print("  workers     pieces/s   lines/game")
+    for workers in 1, None:
+        start = perf_counter()
+        results = engine.run_games(engine.random_policy, 200, COLS, ROWS,
+                                   seed=1, workers=workers)
+        elapsed = perf_counter() - start
+        pieces = sum(pieces for pieces, _, _ in results)
+        lines = sum(lines for _, lines, _ in results)
+        print(f"  {str(workers or 'all'):7}  {pieces / elapsed:11.0f}"
+              f"   {lines / len(results):10.2f}")
+
+
+def bench_player() -> None:
+    print(f"Player decisions on a {COLS}x{ROWS} arena, 500 pieces")
+    print("  lookahead   ms/piece   worst ms   lines")
+    for lookahead in 0, 1, 4:
+        player = ai.Player(lookahead=lookahead)
+        state = engine.new_game(COLS, ROWS, 1)
+        over = False
+        total = worst = 0.0
+        while not over and state.index < 500:
+            index = state.index
+            while not over and state.index == index:
+                state, _, over = engine.step(state, player.policy(state))
+            total += player.elapsed
+            worst = max(worst, player.elapsed)
+        print(f"  {lookahead:9d}   {total / state.index * 1e3:8.2f}"
+              f"   {worst * 1e3:8.2f}   {state.lines:5d}")
+
+
+def bench_records() -> None:
+    path = "_hw3_bench_records_"
+    rng = Random(1)
+    record.write_records(path, (record.random_game(COLS, ROWS, rng)
+                                for _ in range(2000)))
+    print(f"verifying 2000 recorded games, "
+          f"{os.path.getsize(path) / 2000:.0f} bytes/game")
+    print("  workers    games/s")
+    for workers in 1, None:
+        start = perf_counter()
+        assert list(record.verify(path, workers, chunk=100)) == []
+        print(f"  {str(workers or 'all'):7}  "
+              f"{2000 / (perf_counter() - start):9.0f}")
+    os.remove(path)
+
+
+def main() -> None:
+    bench_collisions()
+    bench_drop()
+    bench_engine()
+    bench_player()
+    bench_records()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,321 @@
+from random import Random
+from typing import Iterable, List, NamedTuple, Sequence, Tuple
+
+# change hw3 below if your file name is different
+import hw3 as student
+
+# An arena kept as one int per row, top row first as in
+# student.new_arena(); bit x of a row is set when column x is taken.
+# A piece is given by the same kind of masks, one per row from its top
+# row down, with bit 0 for its leftmost column, so testing or placing it
+# at column x is a shift and an AND or OR per row. The arena also keeps
+# the top taken row of every column, so a drop needs no stepping.
+
+# leftmost column, top row and row masks of a piece
+Masks = Tuple[int, int, Tuple[int, ...]]
+
+
+class BitArena:
+    __slots__ = ('cols', 'rows', 'full', 'tops')
+
+    def __init__(self, cols: int, rows: int) -> None:
+        self.cols = cols
+        self.rows = [0] * rows
+        # a row with every column taken
+        self.full = (1 << cols) - 1
+        # the first taken row of each column, the number of rows if none
+        self.tops = [rows] * cols
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, BitArena):
+            return NotImplemented
+        return self.cols == other.cols and self.rows == other.rows
+
+    __hash__ = None  # type: ignore
+
+    def copy(self) -> 'BitArena':
+        arena = BitArena(self.cols, 0)
+        arena.rows = self.rows[:]
+        arena.tops = self.tops[:]
+        return arena
+
+    def find_tops(self) -> None:
+        self.tops = [len(self.rows)] * self.cols
+        seen = 0
+        for y, row in enumerate(self.rows):
+            new = row & ~seen
+            while new:
+                bit = new & -new
+                self.tops[bit.bit_length() - 1] = y
+                new ^= bit
+            seen |= row
+            if seen == self.full:
+                return
+
+    def is_occupied(self, x: int, y: int) -> bool:
+        if 0 <= x < self.cols and 0 <= y < len(self.rows):
+            return bool(self.rows[y] >> x & 1)
+        return False
+
+    def set_occupied(self, x: int, y: int, occupied: bool) -> None:
+        if occupied:
+            self.rows[y] |= 1 << x
+            self.tops[x] = min(self.tops[x], y)
+        else:
+            self.rows[y] &= ~(1 << x)
+            if self.tops[x] == y:
+                self.tops[x] = next((below for below in
+                                     range(y + 1, len(self.rows))
+                                     if self.rows[below] >> x & 1),
+                                    len(self.rows))
+
+    def collides(self, masks: Sequence[int], x: int, y: int) -> bool:
+        # whether the piece with its top left corner at (x, y) overlaps
+        # a taken cell or sticks out of the arena
+        if x < 0 or y < 0 or y + len(masks) > len(self.rows):
+            return True
+        rows = self.rows
+        for i, mask in enumerate(masks):
+            mask <<= x
+            if mask & rows[y + i] or mask > self.full:
+                return True
+        return False
+
+    def place(self, masks: Sequence[int], x: int, y: int) -> None:
+        tops = self.tops
+        for i, mask in enumerate(masks):
+            self.rows[y + i] |= mask << x
+            column = x
+            while mask:
+                if mask & 1 and tops[column] > y + i:
+                    tops[column] = y + i
+                mask >>= 1
+                column += 1
+
+    def full_rows(self) -> List[int]:
+        return [y for y, row in enumerate(self.rows) if row == self.full]
+
+    def clear_lines(self) -> int:
+        # removes full rows, moves the rest down, returns how many went
+        kept = [row for row in self.rows if row != self.full]
+        cleared = len(self.rows) - len(kept)
+        if cleared:
+            self.rows[:] = [0] * cleared + kept
+            self.find_tops()
+        return cleared
+
+
+def piece_masks(cells: Iterable[Tuple[int, int]]) -> Masks:
+    # cells are (column, row) pairs, as a student.Block around its pivot
+    cells = list(cells)
+    left = min(x for x, _ in cells)
+    top = min(y for _, y in cells)
+    masks = [0] * (max(y for _, y in cells) - top + 1)
+    for x, y in cells:
+        masks[y - top] |= 1 << (x - left)
+    return left, top, tuple(masks)
+
+
+def block_collides(arena: BitArena, block: student.Block,
+                   pivot: student.Pivot) -> bool:
+    left, top, masks = piece_masks(block)
+    return arena.collides(masks, pivot[0] + left, pivot[1] + top)
+
+
+class Orientation(NamedTuple):
+    cells: Tuple[Tuple[int, int], ...]
+    # column and row of the masks' top left corner from the pivot
+    left: int
+    top: int
+    masks: Tuple[int, ...]
+    # the lowest row of each column of the piece, from the pivot
+    bottoms: Tuple[int, ...]
+
+
+def orientation(cells: Tuple[Tuple[int, int], ...]) -> Orientation:
+    left, top, masks = piece_masks(cells)
+    columns = range(left, max(x for x, _ in cells) + 1)
+    bottoms = tuple(max(y for x, y in cells if x == column)
+                    for column in columns)
+    return Orientation(cells, left, top, masks, bottoms)
+
+
+# PIECES[block type][rotation], each rotation is the one before turned
+# clockwise, as student.rotate_cw() turns it
+PIECES = tuple(tuple(orientation(turn) for turn in student.orientations(block))
+               for block in student.BLOCKS)
+
+
+def fits(arena: BitArena, piece: int, rotation: int, x: int, y: int) -> bool:
+    # whether the piece with its pivot at (x, y) is free to be there
+    shape = PIECES[piece][rotation]
+    return not arena.collides(shape.masks, x + shape.left, y + shape.top)
+
+
+def rotate(arena: BitArena, piece: int, rotation: int, x: int, y: int,
+           turns: int) -> int:
+    # the rotation after turns clockwise turns, the old one if blocked
+    turned = (rotation + turns) % 4
+    return turned if fits(arena, piece, turned, x, y) else rotation
+
+
+def shift(arena: BitArena, piece: int, rotation: int, x: int, y: int,
+          dx: int, dy: int) -> Tuple[int, int]:
+    if fits(arena, piece, rotation, x + dx, y + dy):
+        return x + dx, y + dy
+    return x, y
+
+
+def drop(arena: BitArena, piece: int, rotation: int, x: int, y: int) -> int:
+    # the row the pivot lands on, from the column tops when the piece is
+    # above them, by stepping down when it is tucked under an overhang
+    shape = PIECES[piece][rotation]
+    tops = arena.tops
+    left = x + shape.left
+    landing = len(arena.rows)
+    for column, bottom in enumerate(shape.bottoms, left):
+        if y + bottom >= tops[column]:
+            break
+        landing = min(landing, tops[column] - 1 - bottom)
+    else:
+        return landing
+    while fits(arena, piece, rotation, x, y + 1):
+        y += 1
+    return y
+
+
+def lock(arena: BitArena, piece: int, rotation: int, x: int, y: int) -> int:
+    # places the piece and returns how many lines it cleared
+    shape = PIECES[piece][rotation]
+    arena.place(shape.masks, x + shape.left, y + shape.top)
+    return arena.clear_lines()
+
+
+# The facade below has the signatures of student.new_arena(),
+# student.is_occupied() and student.set_occupied() as hw3_game.py calls
+# them: x is the column and y the row. Outside the arena nothing is
+# occupied, as in student.is_occupied().
+
+def new_arena(cols: int, rows: int) -> BitArena:
+    return BitArena(cols, rows)
+
+
+def is_occupied(arena: BitArena, x: int, y: int) -> bool:
+    return arena.is_occupied(x, y)
+
+
+def set_occupied(arena: BitArena, x: int, y: int, occupied: bool) -> None:
+    arena.set_occupied(x, y, occupied)
+
+
+def main() -> None:
+    # --- facade ---
+
+    arena = new_arena(4, 3)
+    assert len(arena) == 3 and arena.rows == [0, 0, 0]
+    set_occupied(arena, 3, 1, True)
+    set_occupied(arena, 0, 2, True)
+    assert is_occupied(arena, 3, 1) and is_occupied(arena, 0, 2)
+    assert not is_occupied(arena, 1, 3) and not is_occupied(arena, -1, 2)
+    assert arena.rows == [0, 0b1000, 0b0001]
+    set_occupied(arena, 3, 1, False)
+    assert not is_occupied(arena, 3, 1)
+
+    # --- pieces ---
+
+    assert piece_masks(student.BLOCKS[student.BLOCK_I]) \
+        == (0, -1, (1, 1, 1, 1))
+    assert piece_masks(student.BLOCKS[student.BLOCK_J]) \
+        == (-1, -1, (0b10, 0b10, 0b11))
+    assert piece_masks([(-1, 0), (0, 0), (1, 0), (2, 0)]) \
+        == (-1, 0, (0b1111,))
+
+    # --- collisions ---
+
+    arena = new_arena(4, 4)
+    set_occupied(arena, 1, 3, True)
+    o = student.BLOCKS[student.BLOCK_O]
+    assert not block_collides(arena, o, (0, 0))
+    assert not block_collides(arena, o, (2, 2))
+    assert block_collides(arena, o, (0, 2))
+    assert block_collides(arena, o, (3, 0))
+    assert block_collides(arena, o, (-1, 0))
+    assert block_collides(arena, o, (0, 3))
+    assert block_collides(arena, student.BLOCKS[student.BLOCK_I], (0, 0))
+
+    # --- lines ---
+
+    arena.place((0b11, 0b11), 2, 2)
+    arena.place((0b1, 0b1), 0, 2)
+    assert arena.full_rows() == [3]
+    copy = arena.copy()
+    assert copy == arena and copy is not arena
+    assert arena.clear_lines() == 1
+    assert arena.rows == [0, 0, 0, 0b1101]
+    assert copy.rows == [0, 0, 0b1101, 0b1111]
+    assert arena.clear_lines() == 0
+
+    # --- tables ---
+
+    assert len(PIECES) == 7 and all(len(turns) == 4 for turns in PIECES)
+    arena = student.new_arena(5, 5)
+    for piece, turns in enumerate(PIECES):
+        for rotation, shape in enumerate(turns):
+            assert shape.cells == student.orientations(
+                student.BLOCKS[piece])[rotation]
+            assert (shape.left, shape.top, shape.masks) \
+                == piece_masks(shape.cells)
+            assert list(student.rotate_cw(arena, shape.cells, (2, 2))) \
+                == list(turns[(rotation + 1) % 4].cells)
+            assert list(student.rotate_ccw(arena, shape.cells, (2, 2))) \
+                == list(turns[rotation - 1].cells)
+    # student.set_occupied() takes the row first
+    student.set_occupied(arena, 2, 0, True)
+    i = student.BLOCKS[student.BLOCK_I]
+    assert student.rotate_cw(arena, i, (2, 2)) == i
+    assert student.rotate_ccw(arena, i, (2, 2)) != i
+
+    # --- moves and drops against stepping ---
+
+    rng = Random(1)
+    for _ in range(300):
+        arena = new_arena(10, 22)
+        for y in range(8, 22):
+            for x in range(10):
+                if rng.random() < 0.4 + y / 50:
+                    arena.set_occupied(x, y, True)
+        tops = arena.tops[:]
+        arena.find_tops()
+        assert arena.tops == tops
+
+        piece, rotation = rng.randrange(7), rng.randrange(4)
+        x, y = rng.randrange(10), rng.randrange(22)
+        if not fits(arena, piece, rotation, x, y):
+            continue
+        assert shift(arena, piece, rotation, x, y, -1, 0) \
+            == ((x - 1, y) if fits(arena, piece, rotation, x - 1, y)
+                else (x, y))
+        turned = rotate(arena, piece, rotation, x, y, 1)
+        assert turned == (rotation + 1) % 4 or turned == rotation
+        landing = y
+        while fits(arena, piece, rotation, x, landing + 1):
+            landing += 1
+        assert drop(arena, piece, rotation, x, y) == landing
+
+        shape = PIECES[piece][rotation]
+        placed = arena.copy()
+        placed.place(shape.masks, x + shape.left, landing + shape.top)
+        full = placed.full_rows()
+        assert lock(arena, piece, rotation, x, landing) == len(full)
+        assert arena.rows == [0] * len(full) \
+            + [row for row in placed.rows if row != placed.full]
+        tops = arena.tops[:]
+        arena.find_tops()
+        assert arena.tops == tops
+
+
+if __name__ == '__main__':
+    main()
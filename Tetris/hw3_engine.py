@@ -0,0 +1,232 @@
+from concurrent.futures import ProcessPoolExecutor
+from random import Random, getrandbits
+from time import perf_counter
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+# change hw3 below if your file name is different
+import hw3 as student
+import hw3_bitboard as bitboard
+
+# points for clearing 0, 1, 2, 3 or 4 lines with one piece
+SCORES = (0, 1, 3, 5, 8)
+# mixed into the seed of a game for the choices of random_policy()
+POLICY_SALT = 0x5DEECE66D
+
+
+class State(NamedTuple):
+    # the arena without the falling piece; step() never changes it, a
+    # locked piece goes into a copy
+    arena: bitboard.BitArena
+    # the falling piece: its block type, rotation and pivot
+    piece: int
+    rotation: int
+    x: int
+    y: int
+    # pieces come from student.piece_at(seed, index)
+    seed: int
+    index: int
+    score: int
+    lines: int
+
+
+Policy = Callable[[State], int]
+Draw = Callable[[State], None]
+# pieces, lines and score of a finished game
+Result = Tuple[int, int, int]
+
+
+def spawn(arena: bitboard.BitArena, seed: int, index: int, score: int,
+          lines: int) -> Tuple[State, bool]:
+    # the next piece at the top in the middle, as student.play() puts it,
+    # and whether it does not fit there any more
+    piece = student.piece_at(seed, index)
+    x, y = arena.cols // 2, -bitboard.PIECES[piece][0].top
+    state = State(arena, piece, 0, x, y, seed, index, score, lines)
+    return state, not bitboard.fits(arena, piece, 0, x, y)
+
+
+def room_for_pieces(cols: int, rows: int) -> bool:
+    # whether every piece appears in an empty arena of that size
+    arena = bitboard.new_arena(cols, rows)
+    return all(bitboard.fits(arena, piece, 0, cols // 2, -turns[0].top)
+               for piece, turns in enumerate(bitboard.PIECES))
+
+
+def new_game(cols: int, rows: int, seed: int) -> State:
+    # an arena some piece does not even appear in is refused, so that
+    # every game starts with its first piece in the arena
+    if not room_for_pieces(cols, rows):
+        raise ValueError(f"a {cols}x{rows} arena is too small")
+    state, _ = spawn(bitboard.new_arena(cols, rows), seed, 0, 0, 0)
+    return state
+
+
+def lock(state: State, y: int) -> Tuple[State, int, bool]:
+    arena = state.arena.copy()
+    cleared = bitboard.lock(arena, state.piece, state.rotation, state.x, y)
+    new, over = spawn(arena, state.seed, state.index + 1,
+                      state.score + SCORES[cleared], state.lines + cleared)
+    return new, cleared, over
+
+
+def step(state: State, action: int) -> Tuple[State, int, bool]:
+    # the state after an action, the lines it cleared and whether the
+    # game is over; DOWN locks a piece that cannot go down any more
+    arena, piece, rotation, x, y = state[:5]
+    if action in (student.LEFT, student.RIGHT):
+        dx = -1 if action == student.LEFT else 1
+        x, _ = bitboard.shift(arena, piece, rotation, x, y, dx, 0)
+        return state._replace(x=x), 0, False
+    if action in (student.ROTATE_CW, student.ROTATE_CCW):
+        turns = 1 if action == student.ROTATE_CW else -1
+        rotation = bitboard.rotate(arena, piece, rotation, x, y, turns)
+        return state._replace(rotation=rotation), 0, False
+    if action == student.DOWN:
+        if bitboard.fits(arena, piece, rotation, x, y + 1):
+            return state._replace(y=y + 1), 0, False
+        return lock(state, y)
+    if action == student.DROP:
+        return lock(state, bitboard.drop(arena, piece, rotation, x, y))
+    if action == student.QUIT:
+        return state, 0, True
+    raise ValueError(f"unknown action {action}")
+
+
+def play(poll_event: Callable[[], int], draw: Draw, cols: int = 10,
+         rows: int = 22, seed: Optional[int] = None) -> int:
+    # a game in the manner of student.play(): the state is drawn before
+    # every event and once more at the end; returns the score
+    state = new_game(cols, rows, getrandbits(64) if seed is None else seed)
+    over = False
+    while not over:
+        draw(state)
+        state, _, over = step(state, poll_event())
+    draw(state)
+    return state.score
+
+
+def random_policy(state: State) -> int:
+    # turns and moves every piece to a random rotation and column drawn
+    # from the seed, then drops it
+    arena, piece, rotation, x, y = state[:5]
+    target = student.piece_at(state.seed ^ POLICY_SALT, state.index,
+                              4 * arena.cols)
+    turned, column = divmod(target, arena.cols)
+    if rotation != turned \
+            and bitboard.fits(arena, piece, (rotation + 1) % 4, x, y):
+        return student.ROTATE_CW
+    if x < column and bitboard.fits(arena, piece, rotation, x + 1, y):
+        return student.RIGHT
+    if x > column and bitboard.fits(arena, piece, rotation, x - 1, y):
+        return student.LEFT
+    return student.DROP
+
+
+def run_game(policy: Policy, cols: int, rows: int, seed: int,
+             max_pieces: int = 10_000) -> Result:
+    state = new_game(cols, rows, seed)
+    over = False
+    while not over and state.index < max_pieces:
+        state, _, over = step(state, policy(state))
+    return state.index, state.lines, state.score
+
+
+def run_games(policy: Policy, games: int, cols: int = 10, rows: int = 22,
+              seed: int = 0, workers: Optional[int] = None,
+              max_pieces: int = 10_000) -> List[Result]:
+    # every game gets its own seed drawn from seed, so the results do not
+    # depend on the number of workers
+    rng = Random(seed)
+    seeds = [rng.getrandbits(64) for _ in range(games)]
+    arguments = ([policy] * games, [cols] * games, [rows] * games, seeds,
+                 [max_pieces] * games)
+    if workers == 1:
+        return list(map(run_game, *arguments))
+    with ProcessPoolExecutor(workers) as pool:
+        return list(pool.map(run_game, *arguments, chunksize=16))
+
+
+def main() -> None:
+    # --- pieces ---
+
+    assert [student.piece_at(7, i) for i in range(100)] \
+        == [student.piece_at(7, i) for i in range(100)]
+    assert set(student.piece_at(7, i) for i in range(100)) == set(range(6))
+    pieces = student.Pieces(7)
+    assert [pieces.next() for _ in range(5)] \
+        == [student.piece_at(7, i) for i in range(5)]
+
+    # --- step ---
+
+    state = new_game(6, 8, 1)
+    assert (state.x, state.index, state.score) == (3, 0, 0)
+    assert bitboard.fits(state.arena, state.piece, 0, state.x, state.y)
+    moved, cleared, over = step(state, student.LEFT)
+    assert (moved.x, cleared, over) == (2, 0, False)
+    assert state.x == 3
+    for _ in range(6):
+        moved, _, _ = step(moved, student.LEFT)
+    assert bitboard.fits(moved.arena, moved.piece, 0, moved.x, moved.y)
+    assert not bitboard.fits(moved.arena, moved.piece, 0, moved.x - 1,
+                             moved.y)
+    dropped, _, over = step(moved, student.DROP)
+    assert dropped.index == 1 and not over
+    assert state.arena.rows == [0] * 8 and dropped.arena.rows != [0] * 8
+    stepped = moved
+    while stepped.index == 0:
+        stepped, _, _ = step(stepped, student.DOWN)
+    assert stepped.arena.rows == dropped.arena.rows
+    assert step(state, student.QUIT)[2]
+
+    # --- lines and game over ---
+
+    state = new_game(4, 4, 3)
+    arena = state.arena.copy()
+    arena.place((0b1111, 0b1111, 0b0111), 0, 1)
+    state = state._replace(arena=arena, piece=student.BLOCK_I, rotation=0,
+                           x=3, y=1)
+    state, cleared, over = step(state, student.DROP)
+    assert cleared == 3 and state.lines == 3 and state.score == 5
+    assert state.arena.rows == [0, 0, 0, 0b1000] and not over
+
+    # every block has a square at its pivot, where the next one starts
+    state = new_game(5, 4, 3)
+    arena = state.arena.copy()
+    arena.place((0b111,) * 4, 0, 0)
+    state = state._replace(arena=arena, piece=student.BLOCK_I, rotation=0,
+                           x=4, y=1)
+    state, cleared, over = step(state, student.DROP)
+    assert cleared == 0 and over
+
+    for cols, rows in (1, 22), (2, 22), (10, 1), (0, 0):
+        try:
+            new_game(cols, rows, 1)
+            assert False, "a game needs room for every piece"
+        except ValueError:
+            pass
+
+    # --- play ---
+
+    drawn: List[State] = []
+    events = iter([student.LEFT, student.DROP, student.QUIT])
+    assert play(lambda: next(events), drawn.append, 6, 8, seed=1) == 0
+    assert [state.index for state in drawn] == [0, 0, 1, 1]
+    assert drawn[1].x == 2
+
+    # --- batches ---
+
+    results = run_games(random_policy, 20, 10, 22, seed=5, workers=1)
+    assert results == run_games(random_policy, 20, 10, 22, seed=5,
+                                workers=2)
+    assert all(pieces > 0 for pieces, _, _ in results)
+    start = perf_counter()
+    results = run_games(random_policy, 100, 10, 22, seed=6, workers=1)
+    elapsed = perf_counter() - start
+    pieces = sum(pieces for pieces, _, _ in results)
+    lines = sum(lines for _, lines, _ in results)
+    print(f"random_policy: {pieces / elapsed:.0f} pieces/s, "
+          f"{lines / len(results):.2f} lines/game")
+
+
+if __name__ == '__main__':
+    main()
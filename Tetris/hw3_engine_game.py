@@ -0,0 +1,94 @@
+from random import getrandbits
+from time import perf_counter
+from typing import Optional
+import tkinter as tk
+
+# change hw3 below if your file name is different
+import hw3 as student
+import hw3_ai as ai
+import hw3_bitboard as bitboard
+import hw3_engine as engine
+import hw3_game as game
+import hw3_record as record
+
+# game parameters; feel free to change them, and those in hw3_game.py
+AUTOPLAY = False  # let hw3_ai.Player play
+AUTOPLAY_DELAY = 50  # how often the player acts; in milliseconds
+RECORDS: Optional[str] = None  # append every game to this records file
+
+# The window of hw3_game.py, but the game is hw3_engine instead of
+# student.play(): everything runs from tkinter callbacks, a key is
+# applied with engine.step() and drawn as soon as it arrives, and the
+# computer player has an after() timer of its own.
+
+
+class EngineTetris(game.Tetris):
+    def __init__(self) -> None:
+        super().__init__()
+        self.state: Optional[engine.State] = None
+        self.player = ai.Player() if AUTOPLAY else None
+        self.turn: Optional[str] = None
+        self.recorder: Optional[record.Recorder] = None
+        self.started = 0.0
+
+    def run(self) -> None:
+        self.running = True
+        seed = getrandbits(64)
+        self.state = engine.new_game(game.COLS, game.ROWS, seed)
+        if RECORDS is not None:
+            self.recorder = record.Recorder(seed, game.COLS, game.ROWS)
+        self.started = perf_counter()
+        self.latencies.clear()
+        self.due = perf_counter()
+        self.schedule_fall()
+        if self.player is not None:
+            self.turn = self.root.after(AUTOPLAY_DELAY, self.autoplay)
+        self.draw_state()
+
+    def autoplay(self) -> None:
+        self.turn = None
+        self.act(self.player.policy(self.state))
+        if self.running:
+            self.turn = self.root.after(AUTOPLAY_DELAY, self.autoplay)
+
+    def act(self, action: int) -> None:
+        if self.recorder is not None:
+            self.recorder.add(
+                round((perf_counter() - self.started) * 1000), action)
+        self.state, _, over = engine.step(self.state, action)
+        if over:
+            self.game_over()
+        else:
+            self.draw_state()
+
+    def game_over(self) -> None:
+        if self.turn is not None:
+            self.root.after_cancel(self.turn)
+            self.turn = None
+        self.pressed = None
+        self.stop()
+        self.draw(self.state.arena, self.state.score)
+        self.show_game_over(self.state.score)
+        if self.recorder is not None:
+            record.write_records(RECORDS, [self.recorder.record(self.state)],
+                                 append=True)
+            self.recorder = None
+
+    def key_event(self, ev: tk.Event) -> None:
+        if self.running and self.player is not None \
+                and game.EVENTS.get(ev.keysym) != student.QUIT:
+            return
+        super().key_event(ev)
+
+    def draw_state(self) -> None:
+        arena, piece, rotation, x, y = self.state[:5]
+        self.draw(arena, self.state.score, (x, y),
+                  bitboard.PIECES[piece][rotation].cells)
+
+
+def main() -> None:
+    EngineTetris().start()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,18 @@
 from collections import deque
-from typing import Deque
+from time import perf_counter
+from typing import Deque, List, Optional, Tuple
 import tkinter as tk
-import time
 
 # change hw3 below if your file name is different
 import hw3 as student
+import hw3_bitboard as bitboard
 
 # game parameters; feel free to change them
 ROWS = 22
 COLS = 10
 DELAY = 1000  # how often shall DOWN happen automatically; in milliseconds
+BITBOARD = False  # keep the arena as row bitmasks from hw3_bitboard
+LATENCY = False  # print how long keys take to show, after every game
 
 BORDER = 32
 CELL_SIZE = 32
@@ -33,13 +36,37 @@ EVENTS = {
 
 GO_MSG = 'Game over. Final score: {}.\nPress r to restart or x to quit.'
 
+# student.play() asks poll_event() for every event. poll_event() waits
+# in tkinter's own event loop on a variable that a key or a gravity tick
+# sets, so between events the process sleeps, and a key is returned as
+# soon as tkinter gets it. hw3_engine_game.py plays without the student
+# code, on hw3_engine, with an optional computer player and recording.
+
+
+def occupied_rows(arena: student.Arena) -> List[int]:
+    # the arena as one mask per row, bit x set when column x is taken
+    if isinstance(arena, bitboard.BitArena):
+        return arena.rows[:]
+    return [sum(1 << x for x in range(COLS)
+                if student.is_occupied(arena, x, y))
+            for y in range(ROWS)]
+
 
 class Tetris:
     def __init__(self) -> None:
         self.running = False
         self.events: Deque[int] = deque()
+        # the pending after() of gravity and when it is due
+        self.gravity: Optional[str] = None
+        self.due = 0.0
+        # when the key not yet drawn came, and seconds from a key to its
+        # frame, with LATENCY
+        self.pressed: Optional[float] = None
+        self.latencies: List[float] = []
 
         self.root = tk.Tk()
+        # written whenever an event is queued, to wake poll_event()
+        self.ready = tk.BooleanVar(self.root)
         self.canvas = tk.Canvas(
             width=2 * BORDER + (COLS + 2) * CELL_SIZE,
             height=4 * BORDER + (ROWS + 1) * CELL_SIZE,
@@ -47,6 +74,21 @@ class Tetris:
         self.draw_border()
         self.canvas.pack()
 
+        # The items are created once and hidden; draw() shows or hides
+        # only the cells that changed since the last frame and moves the
+        # four squares of the falling piece.
+        self.cells = [[self.create_cell(x, y) for x in range(COLS)]
+                      for y in range(ROWS)]
+        self.shown = [0] * ROWS
+        self.piece = [self.create_cell(0, 0) for _ in range(4)]
+        self.piece_shown: Optional[Tuple[Tuple[int, int], ...]] = None
+        self.score = self.canvas.create_text(
+            BORDER + (COLS + 2) * CELL_SIZE // 2,
+            5 * BORDER // 2 + (ROWS + 1) * CELL_SIZE,
+            font=FONT, justify=tk.CENTER
+        )
+        self.score_shown: Optional[int] = None
+
         self.root.bind_all('<Key>', self.key_event)
 
     def draw_border(self) -> None:
@@ -63,6 +105,13 @@ class Tetris:
             fill='black'
         )
 
+    def create_cell(self, x: int, y: int) -> int:
+        cx, cy = (BORDER + c * CELL_SIZE for c in (x + 1, y))
+        return self.canvas.create_rectangle(
+            cx, cy, cx + CELL_SIZE, cy + CELL_SIZE,
+            fill=TILE_COLOUR, state=tk.HIDDEN
+        )
+
     def start(self) -> None:
         self.root.update()
         self.root.event_generate('<Key>', keysym='r')
@@ -70,56 +119,116 @@ class Tetris:
 
     def run(self) -> None:
         self.running = True
-        self.root.after(DELAY, self.fall)
+        self.events.clear()
+        self.latencies.clear()
+        self.due = perf_counter()
+        self.schedule_fall()
         score = student.play(student.new_arena(COLS, ROWS))
-        self.canvas.delete('score')
-        self.canvas.create_text(
-            BORDER + (COLS + 2) * CELL_SIZE // 2,
-            5 * BORDER // 2 + (ROWS + 1) * CELL_SIZE,
-            text=GO_MSG.format(score), font=FONT,
-            justify=tk.CENTER, tags=('content', 'score')
-        )
+        self.stop()
+        self.show_game_over(score)
+
+    def stop(self) -> None:
         self.running = False
+        if self.gravity is not None:
+            self.root.after_cancel(self.gravity)
+            self.gravity = None
+        if LATENCY and self.latencies:
+            print_latencies(self.latencies)
+
+    def show_game_over(self, score: int) -> None:
+        self.canvas.itemconfigure(self.score, text=GO_MSG.format(score))
+        self.score_shown = None
+
+    def schedule_fall(self) -> None:
+        # the ticks are kept DELAY apart from the start of the game, so a
+        # late callback does not delay the ones after it
+        self.due += DELAY / 1000
+        delay = max(0, round((self.due - perf_counter()) * 1000))
+        self.gravity = self.root.after(delay, self.fall)
 
     def fall(self) -> None:
+        self.gravity = None
+        self.act(student.DOWN)
         if self.running:
-            self.events.append(student.DOWN)
-            self.root.after(DELAY, self.fall)
+            self.schedule_fall()
+
+    def act(self, action: int) -> None:
+        self.events.append(action)
+        self.ready.set(True)
 
     def key_event(self, ev: tk.Event) -> None:
         if self.running:
-            event = EVENTS.get(ev.keysym)
-            if event is not None:
-                self.events.append(event)
+            action = EVENTS.get(ev.keysym)
+            if action is None:
+                return
+            if LATENCY and self.pressed is None:
+                self.pressed = perf_counter()
+            self.act(action)
         elif ev.keysym == 'r':
             self.run()
         elif ev.keysym == 'x':
             self.root.destroy()
 
-    def draw(self, arena: student.Arena, score: int) -> None:
-        self.canvas.delete('content')
-
-        for y in range(ROWS):
-            for x in range(COLS):
-                if student.is_occupied(arena, x, y):
-                    cx, cy = (BORDER + c * CELL_SIZE for c in (x + 1, y))
-                    self.canvas.create_rectangle(
-                        cx, cy, cx + CELL_SIZE, cy + CELL_SIZE,
-                        fill=TILE_COLOUR, tags='content'
-                    )
-
-        self.canvas.create_text(
-            BORDER + (COLS + 2) * CELL_SIZE // 2,
-            5 * BORDER // 2 + (ROWS + 1) * CELL_SIZE,
-            text=f"Score: {score}", font=FONT, tags=('content', 'score')
-        )
-
     def poll_event(self) -> int:
         while not self.events:
-            time.sleep(0.01)
-            self.root.update()
+            self.root.wait_variable(self.ready)
         return self.events.popleft()
 
+    def draw(self, arena: student.Arena, score: int,
+             pivot: Optional[student.Pivot] = None,
+             block: Optional[student.Block] = None) -> None:
+        rows = occupied_rows(arena)
+        for y, (row, shown) in enumerate(zip(rows, self.shown)):
+            changed = row ^ shown
+            while changed:
+                bit = changed & -changed
+                self.canvas.itemconfigure(
+                    self.cells[y][bit.bit_length() - 1],
+                    state=tk.NORMAL if row & bit else tk.HIDDEN
+                )
+                changed ^= bit
+        self.shown = rows
+
+        self.draw_piece(pivot, block)
+        if score != self.score_shown:
+            self.canvas.itemconfigure(self.score, text=f"Score: {score}")
+            self.score_shown = score
+        if self.pressed is not None:
+            # until the canvas is redrawn
+            self.canvas.update_idletasks()
+            self.latencies.append(perf_counter() - self.pressed)
+            self.pressed = None
+
+    def draw_piece(self, pivot: Optional[student.Pivot],
+                   block: Optional[student.Block]) -> None:
+        if pivot is None or block is None:
+            cells = None
+        else:
+            cells = tuple((pivot[0] + x, pivot[1] + y) for x, y in block)
+        if cells == self.piece_shown:
+            return
+        self.piece_shown = cells
+        if cells is None:
+            for item in self.piece:
+                self.canvas.itemconfigure(item, state=tk.HIDDEN)
+            return
+        for item, (x, y) in zip(self.piece, cells):
+            cx, cy = (BORDER + c * CELL_SIZE for c in (x + 1, y))
+            self.canvas.coords(item, cx, cy, cx + CELL_SIZE, cy + CELL_SIZE)
+            # squares above the arena are not shown
+            self.canvas.itemconfigure(
+                item, state=tk.NORMAL if y >= 0 else tk.HIDDEN)
+
+
+def print_latencies(latencies: List[float]) -> None:
+    ordered = sorted(latencies)
+
+    def percentile(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1e3
+
+    print(f"{len(ordered)} keys to frame: median {percentile(0.5):.3f} ms,"
+          f" 99% {percentile(0.99):.3f} ms, max {ordered[-1] * 1e3:.3f} ms")
+
 
 def main() -> None:
     tetris = Tetris()
@@ -127,6 +236,10 @@ def main() -> None:
     # monkey-patch the student's interface functions
     student.draw = tetris.draw
     student.poll_event = tetris.poll_event
+    if BITBOARD:
+        student.new_arena = bitboard.new_arena
+        student.is_occupied = bitboard.is_occupied
+        student.set_occupied = bitboard.set_occupied
 
     tetris.start()
 
@@ -0,0 +1,358 @@
+import os
+import struct
+import zlib
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import (Executor, Future, ProcessPoolExecutor,
+                                ThreadPoolExecutor)
+from itertools import islice
+from random import Random
+from time import perf_counter
+from typing import (BinaryIO, Deque, Iterable, Iterator, List, NamedTuple,
+                    Optional, Tuple)
+
+# change hw3 below if your file name is different
+import hw3 as student
+import hw3_bitboard as bitboard
+import hw3_engine as engine
+
+# A records file is MAGIC followed by games, each a HEADER with the seed
+# of the pieces, the arena size, the final score, a CRC-32 of the final
+# arena and the length of the actions, then the actions. Each action is
+# a varint of the milliseconds since the one before shifted left by
+# three bits and the action, as engine.step() takes it, in the low bits;
+# an action within 16 ms of the last one is a single byte.
+MAGIC = b'TTGR'
+HEADER = struct.Struct('<QBBIII')
+ACTION_BITS = 3
+# actions between two snapshots of a Replay
+SNAPSHOT_EVERY = 64
+
+
+class Record(NamedTuple):
+    seed: int
+    cols: int
+    rows: int
+    score: int
+    crc: int
+    actions: bytes
+
+
+def arena_crc(arena: bitboard.BitArena) -> int:
+    width = (arena.cols + 7) // 8
+    return zlib.crc32(b''.join(row.to_bytes(width, 'little')
+                               for row in arena.rows))
+
+
+def encode_action(out: bytearray, delay: int, action: int) -> None:
+    value = delay << ACTION_BITS | action
+    while value > 0x7F:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def decode_actions(data: bytes) -> Iterator[Tuple[int, int]]:
+    # the time in milliseconds from the start and the action
+    time = value = shift = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if byte < 0x80:
+            time += value >> ACTION_BITS
+            yield time, value & ((1 << ACTION_BITS) - 1)
+            value = shift = 0
+    if shift:
+        raise ValueError("the actions end inside an action")
+
+
+class Recorder:
+    # Collects the actions of a game as they are applied; record() makes
+    # the Record once the game has ended in state.
+    def __init__(self, seed: int, cols: int, rows: int) -> None:
+        self.seed, self.cols, self.rows = seed, cols, rows
+        self.actions = bytearray()
+        self.time = 0
+
+    def add(self, time: int, action: int) -> None:
+        # time in milliseconds from the start of the game, never earlier
+        # than that of the action before
+        encode_action(self.actions, max(0, time - self.time), action)
+        self.time = max(self.time, time)
+
+    def record(self, state: engine.State) -> Record:
+        return Record(self.seed, self.cols, self.rows, state.score,
+                      arena_crc(state.arena), bytes(self.actions))
+
+
+def simulate(seed: int, cols: int, rows: int,
+             actions: bytes) -> engine.State:
+    # the state after the actions, as fast as the engine goes
+    state = engine.new_game(cols, rows, seed)
+    for _, action in decode_actions(actions):
+        state, _, over = engine.step(state, action)
+        if over:
+            break
+    return state
+
+
+def random_game(cols: int, rows: int, rng: Random,
+                max_pieces: int = 1000) -> Record:
+    # engine.random_policy() at random times, with gravity now and then
+    recorder = Recorder(rng.getrandbits(64), cols, rows)
+    state = engine.new_game(cols, rows, recorder.seed)
+    time = 0
+    over = False
+    while not over and state.index < max_pieces:
+        time += rng.randrange(300)
+        if rng.random() < 0.2:
+            action = student.DOWN
+        else:
+            action = engine.random_policy(state)
+        recorder.add(time, action)
+        state, _, over = engine.step(state, action)
+    return recorder.record(state)
+
+
+def write_records(path: str, games: Iterable[Record],
+                  append: bool = False) -> int:
+    count = 0
+    new = not append or not os.path.exists(path) \
+        or os.path.getsize(path) == 0
+    with open(path, 'wb' if new else 'ab') as file:
+        if new:
+            file.write(MAGIC)
+        for game in games:
+            file.write(HEADER.pack(*game[:5], len(game.actions)))
+            file.write(game.actions)
+            count += 1
+    return count
+
+
+def read_records(path: str) -> Iterator[Record]:
+    # streams the games, the file is never read whole
+    with open(path, 'rb') as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a Tetris records file")
+        yield from read_games(file, path)
+
+
+def read_games(file: BinaryIO, path: str) -> Iterator[Record]:
+    while True:
+        header = file.read(HEADER.size)
+        if not header:
+            return
+        if len(header) != HEADER.size:
+            raise ValueError(f"{path} ends inside a record")
+        *fields, length = HEADER.unpack(header)
+        actions = file.read(length)
+        if len(actions) != length:
+            raise ValueError(f"{path} ends inside a record")
+        yield Record(*fields, actions)
+
+
+def check(game: Record) -> bool:
+    # whether replaying the game ends with its score and arena; a game in
+    # an arena too small for the pieces is broken, not the whole file
+    if not engine.room_for_pieces(game.cols, game.rows):
+        return False
+    try:
+        state = simulate(game.seed, game.cols, game.rows, game.actions)
+    except (ValueError, IndexError):
+        return False
+    return state.score == game.score and arena_crc(state.arena) == game.crc
+
+
+def check_games(games: List[Record]) -> List[bool]:
+    return [check(game) for game in games]
+
+
+def check_ahead(pool: Executor, chunks: Iterator[List[Record]],
+                ahead: int) -> Iterator[List[bool]]:
+    # check_games() of every chunk, in order, with no more than ahead
+    # chunks in the pool; the next chunk goes in before a result is
+    # handed out, so the workers keep busy while the caller looks at it
+    pending: Deque[Future] = deque(pool.submit(check_games, games)
+                                   for games in islice(chunks, ahead))
+    while pending:
+        done = pending.popleft()
+        for games in islice(chunks, 1):
+            pending.append(pool.submit(check_games, games))
+        yield done.result()
+
+
+def verify(path: str, workers: Optional[int] = 1,
+           chunk: int = 1000) -> Iterator[int]:
+    # yields the index of every game in the file that does not replay to
+    # its recorded end, checking chunks of games across workers with two
+    # chunks per worker read ahead
+    games = read_records(path)
+    chunks = iter(lambda: list(islice(games, chunk)), [])
+    if workers == 1:
+        results: Iterator[List[bool]] = map(check_games, chunks)
+        pool = None
+    else:
+        pool = ProcessPoolExecutor(workers)
+        ahead = 2 * (workers or os.cpu_count() or 1)
+        results = check_ahead(pool, chunks, ahead)
+
+    try:
+        index = 0
+        for checks in results:
+            for good in checks:
+                if not good:
+                    yield index
+                index += 1
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+
+class Replay:
+    # States of a recorded game by action. Every SNAPSHOT_EVERY actions
+    # the state is kept, so a seek replays less than SNAPSHOT_EVERY of
+    # them; states share nothing but arenas, which steps never change.
+    def __init__(self, game: Record) -> None:
+        decoded = list(decode_actions(game.actions))
+        self.times = [time for time, _ in decoded]
+        self.actions = [action for _, action in decoded]
+        self.snapshots: List[engine.State] = []
+        state = engine.new_game(game.cols, game.rows, game.seed)
+        for index, action in enumerate(self.actions):
+            if index % SNAPSHOT_EVERY == 0:
+                self.snapshots.append(state)
+            state, _, over = engine.step(state, action)
+            if over:
+                del self.actions[index + 1:], self.times[index + 1:]
+                break
+        self.last = state
+
+    def __len__(self) -> int:
+        return len(self.actions)
+
+    def state(self, index: int) -> engine.State:
+        # the state before action index, len(self) for the end
+        if not 0 <= index <= len(self.actions):
+            raise IndexError(index)
+        if index == len(self.actions):
+            return self.last
+        snapshot = index // SNAPSHOT_EVERY
+        state = self.snapshots[snapshot]
+        for action in self.actions[snapshot * SNAPSHOT_EVERY:index]:
+            state, _, _ = engine.step(state, action)
+        return state
+
+    def at(self, time: int) -> engine.State:
+        # the state shown time milliseconds into the game
+        return self.state(bisect_right(self.times, time))
+
+
+def main() -> None:
+    path = "_hw3_record_test_"
+    rng = Random(1)
+
+    # --- actions ---
+
+    out = bytearray()
+    for delay, action in (0, 3), (15, 6), (16, 0), (100_000, 5):
+        encode_action(out, delay, action)
+    assert len(out) == 1 + 1 + 2 + 3
+    assert list(decode_actions(bytes(out))) \
+        == [(0, 3), (15, 6), (31, 0), (100_031, 5)]
+    try:
+        list(decode_actions(bytes(out[:-1])))
+        assert False, "a cut action has to be found"
+    except ValueError:
+        pass
+
+    # --- records ---
+
+    games = [random_game(cols, rows, rng, 200)
+             for cols, rows in [(10, 22), (6, 8), (4, 30)] * 20]
+    assert write_records(path, games[:30]) == 30
+    assert write_records(path, games[30:], append=True) == 30
+    assert os.path.getsize(path) == len(MAGIC) \
+        + sum(HEADER.size + len(game.actions) for game in games)
+    assert list(read_records(path)) == games
+    assert list(verify(path)) == []
+    assert list(verify(path, workers=2, chunk=7)) == []
+
+    taken = []
+
+    def one_by_one() -> Iterator[List[Record]]:
+        for game in games:
+            taken.append(game)
+            yield [game]
+
+    with ThreadPoolExecutor(2) as pool:
+        results = check_ahead(pool, one_by_one(), 4)
+        assert next(results) == [True] and len(taken) == 5
+        assert list(results) == [[True]] * (len(games) - 1)
+
+    recorder = Recorder(5, 10, 22)
+    state = engine.new_game(10, 22, 5)
+    for time, action in (0, student.LEFT), (40, student.DROP), \
+            (30, student.QUIT):
+        recorder.add(time, action)
+        state, _, _ = engine.step(state, action)
+    game = recorder.record(state)
+    assert [action for _, action in decode_actions(game.actions)] \
+        == [student.LEFT, student.DROP, student.QUIT]
+    assert [time for time, _ in decode_actions(game.actions)] == [0, 40, 40]
+    assert check(game)
+
+    # --- replay ---
+
+    game = max(games, key=lambda game: len(game.actions))
+    replay = Replay(game)
+    assert len(replay) > 2 * SNAPSHOT_EVERY
+    state = engine.new_game(game.cols, game.rows, game.seed)
+    for index, action in enumerate(replay.actions):
+        assert replay.state(index) == state
+        state, _, _ = engine.step(state, action)
+    assert replay.state(len(replay)) == state == replay.last
+    assert replay.at(-1) == replay.state(0)
+    assert replay.at(replay.times[100]) == replay.state(101)
+    assert replay.at(replay.times[-1]) == replay.last
+
+    # --- broken games ---
+
+    broken = [games[0]._replace(score=games[0].score + 1),
+              games[1],
+              games[2]._replace(actions=games[2].actions[:-1]),
+              games[3]._replace(seed=games[3].seed ^ 1),
+              games[4]._replace(cols=2),
+              games[5]._replace(rows=1),
+              games[6]]
+    write_records(path, broken)
+    assert list(verify(path)) == [0, 2, 3, 4, 5]
+    assert list(verify(path, workers=2, chunk=2)) == [0, 2, 3, 4, 5]
+    with open(path, 'ab') as file:
+        file.write(HEADER.pack(1, 10, 22, 0, 0, 10) + b'\0')
+    try:
+        list(read_records(path))
+        assert False, "a cut record has to be found"
+    except ValueError:
+        pass
+    os.remove(path)
+
+    # --- speed ---
+
+    write_records(path, (random_game(10, 22, rng, 100)
+                         for _ in range(1000)))
+    begin = perf_counter()
+    assert list(verify(path)) == []
+    elapsed = perf_counter() - begin
+    replay = Replay(next(read_records(path)))
+    begin = perf_counter()
+    for index in range(len(replay)):
+        replay.state(index)
+    seek = (perf_counter() - begin) / len(replay)
+    print(f"verified {1000 / elapsed:.0f} games/s, "
+          f"{os.path.getsize(path) / 1000:.0f} bytes/game, "
+          f"seek {seek * 1e6:.1f} us")
+    os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
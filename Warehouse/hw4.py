@@ -1,107 +1,840 @@
+import csv
+import json
 import math
-from typing import Dict, List, Set, Tuple
+import mmap
+import os
+import pickle
+import struct
+import sys
+import weakref
+from array import array
+from contextlib import ExitStack, contextmanager
+from bisect import bisect_right, insort_left
+from heapq import heapify, heappop, heappush, merge
+from itertools import accumulate, islice
+from random import Random
+from threading import Lock, RLock, Thread
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, \
+    Set, SupportsIndex, Tuple, Union
 Set_of_incon = Set[Tuple[str, int, int]]
 Movements = List['Movement']
+History = Union['MovementList', 'ColumnarHistory']
+MovementTuple = Tuple[str, int, int, str]
 Inventory = Dict[str, List['Package']]
+Ledger = Dict[str, Dict[int, int]]
+ExpiryQueue = List[Tuple[int, str]]
+Supplied = Dict[str, Dict[str, int]]
+TopSuppliers = Dict[str, Tuple[int, Set[str]]]
+Row = Tuple[str, int, int, str, str]
+# sold, total_price, the movements with their journal expiry and lot,
+# and the number of lots the sale emptied
+Sale = Tuple[int, int, List[MovementTuple], List[int], List[int], int]
 
 
 class Package:
+    # An edit counts in the revision of the inventory holding the lot
+    # (see TrackedDict), so the running stock totals know they have to
+    # be recounted; owner is None until an inventory takes it.
+    __slots__ = ('_amount', '_price', '_expiry', '_expires', 'owner')
+
     def __init__(self, amount: int, price: int, expiry: str):
-        self.amount = amount
-        self.price = price
-        self.expiry = expiry
+        self._amount = amount
+        self._price = price
+        self._expiry = expiry
+        self._expires = int(expiry)
+        self.owner: Any = None
+
+    @property
+    def amount(self) -> int:
+        return self._amount
+
+    @amount.setter
+    def amount(self, value: int) -> None:
+        self._amount = value
+        touch(self.owner)
+
+    @property
+    def price(self) -> int:
+        return self._price
+
+    @price.setter
+    def price(self, value: int) -> None:
+        self._price = value
+        touch(self.owner)
+
+    @property
+    def expiry(self) -> str:
+        return self._expiry
+
+    @expiry.setter
+    def expiry(self, value: str) -> None:
+        self._expires = int(value)
+        self._expiry = value
+        touch(self.owner)
+
+    @property
+    def expires(self) -> int:
+        # the expiry as a number, for comparing
+        return self._expires
 
 
 class Movement:
+    # An edit counts in the revision of the lists holding the movement
+    # (see TrackedList), so a ledger folded from the old values knows it
+    # has to be rebuilt; owner is None until a list takes it.
+    __slots__ = ('_item', '_amount', '_price', '_tag', 'owner')
+
     def __init__(self, item: str, amount: int, price: int, tag: str):
-        self.item = item
-        self.amount = amount
-        self.price = price
-        self.tag = tag
+        self._item = item
+        self._amount = amount
+        self._price = price
+        self._tag = tag
+        self.owner: Any = None
 
+    @property
+    def item(self) -> str:
+        return self._item
 
-class Warehouse:
+    @item.setter
+    def item(self, value: str) -> None:
+        self._item = value
+        touch(self.owner)
+
+    @property
+    def amount(self) -> int:
+        return self._amount
+
+    @amount.setter
+    def amount(self, value: int) -> None:
+        self._amount = value
+        touch(self.owner)
+
+    @property
+    def price(self) -> int:
+        return self._price
+
+    @price.setter
+    def price(self, value: int) -> None:
+        self._price = value
+        touch(self.owner)
+
+    @property
+    def tag(self) -> str:
+        return self._tag
+
+    @tag.setter
+    def tag(self, value: str) -> None:
+        self._tag = value
+        touch(self.owner)
+
+
+def touch(owner: Any) -> None:
+    # counts an edit of an element owned by owner, see adopt()
+    if type(owner) is tuple:
+        for ref in owner:
+            tracker = ref()
+            if tracker is not None:
+                tracker.revision += 1
+    elif owner is not None:
+        owner.revision += 1
+
+
+def adopt(element: Any, tracker: Any) -> None:
+    # makes the tracker count the edits of element; an element shared by
+    # several trackers holds weak references to them all, so it does not
+    # keep a list that was dropped alive
+    owner = element.owner
+    if owner is None:
+        element.owner = tracker
+    elif owner is not tracker:
+        refs = owner if type(owner) is tuple else (weakref.ref(owner),)
+        if all(ref() is not tracker for ref in refs):
+            element.owner = tuple(ref for ref in refs
+                                  if ref() is not None) \
+                + (weakref.ref(tracker),)
+
+
+class TrackedList(list):
+    # A list that counts in the revision of its tracker, itself unless
+    # given, every change to it but appending, and every edit of an
+    # element in it. Whoever folds the list keeps the revision and the
+    # length it folded: a different revision means a refold, a longer
+    # list only folding the tail.
+    def __init__(self, elements: Iterable[Any] = (),
+                 tracker: Any = None) -> None:
+        super().__init__()
+        self.revision = 0
+        self.tracker = self if tracker is None else tracker
+        self.extend(elements)
+
+    def append(self, element: Any) -> None:
+        adopt(element, self.tracker)
+        super().append(element)
+
+    def extend(self, elements: Iterable[Any]) -> None:
+        start = len(self)
+        super().extend(elements)
+        for element in self[start:]:
+            adopt(element, self.tracker)
+
+    def __iadd__(self, elements: Iterable[Any]) -> 'TrackedList':
+        self.extend(elements)
+        return self
+
+    def __setitem__(self, index: Any, value: Any) -> None:
+        super().__setitem__(index, value)
+        for element in (value if isinstance(index, slice) else [value]):
+            adopt(element, self.tracker)
+        self.tracker.revision += 1
+
+    def __delitem__(self, index: Any) -> None:
+        super().__delitem__(index)
+        self.tracker.revision += 1
+
+    def __imul__(self, times: SupportsIndex) -> 'TrackedList':
+        self.tracker.revision += 1
+        return super().__imul__(times)
+
+    def insert(self, index: SupportsIndex, element: Any) -> None:
+        adopt(element, self.tracker)
+        super().insert(index, element)
+        self.tracker.revision += 1
+
+    def pop(self, index: SupportsIndex = -1) -> Any:
+        self.tracker.revision += 1
+        return super().pop(index)
+
+    def remove(self, element: Any) -> None:
+        super().remove(element)
+        self.tracker.revision += 1
+
+    def clear(self) -> None:
+        super().clear()
+        self.tracker.revision += 1
+
+    def sort(self, **kwargs: Any) -> None:
+        super().sort(**kwargs)
+        self.tracker.revision += 1
+
+    def reverse(self) -> None:
+        super().reverse()
+        self.tracker.revision += 1
+
+
+class MovementList(TrackedList):
+    # the history as Movement objects, filled like a ColumnarHistory
+    def add(self, item: str, amount: int, price: int, tag: str) -> None:
+        self.append(Movement(item, amount, price, tag))
+
+    def add_many(self, rows: Iterable[MovementTuple]) -> None:
+        self.extend(Movement(*row) for row in rows)
+
+
+class LotList(TrackedList):
+    # the lots of one item, whose appends count too: the stock totals
+    # they add up to have no length to go by
+    def append(self, element: Any) -> None:
+        super().append(element)
+        self.tracker.revision += 1
+
+    def extend(self, elements: Iterable[Any]) -> None:
+        super().extend(elements)
+        self.tracker.revision += 1
+
+
+class TrackedDict(dict):
+    # Lots by item, which counts in revision every change to it, to its
+    # lot lists and to the lots in them. A list stored under an item is
+    # copied into a LotList, unless it already is one of this inventory.
+    def __init__(self, lots: Mapping[str, List['Package']] = {}) -> None:
+        super().__init__()
+        self.revision = 0
+        self.update(lots)
+
+    def lots(self, packages: List['Package']) -> LotList:
+        if isinstance(packages, LotList) and packages.tracker is self:
+            return packages
+        return LotList(packages, self)
+
+    def __setitem__(self, item: str, packages: List['Package']) -> None:
+        super().__setitem__(item, self.lots(packages))
+        self.revision += 1
+
+    def __delitem__(self, item: str) -> None:
+        super().__delitem__(item)
+        self.revision += 1
+
+    def __ior__(self, lots: Any) -> 'TrackedDict':
+        self.update(lots)
+        return self
+
+    def setdefault(self, item: str,
+                   packages: Optional[List['Package']] = None) -> LotList:
+        if item not in self:
+            self[item] = [] if packages is None else packages
+        return self[item]
+
+    def update(self, *lots: Any, **named: List['Package']) -> None:
+        for item, packages in dict(*lots, **named).items():
+            self[item] = packages
+
+    def pop(self, item: str, *default: Any) -> Any:
+        self.revision += 1
+        return super().pop(item, *default)
+
+    def popitem(self) -> Tuple[str, LotList]:
+        self.revision += 1
+        return super().popitem()
+
+    def clear(self) -> None:
+        super().clear()
+        self.revision += 1
+
+
+class ColumnarHistory:
+    # movements kept as columns: item and tag as codes into a table of
+    # interned names, amount and price as 64-bit integers; edits through
+    # a MovementRow count in revision, as in a TrackedList
     def __init__(self) -> None:
-        self.inventory: Inventory = {}
-        self.history: Movements = []
+        self.revision = 0
+        self.names: List[str] = []
+        self.codes: Dict[str, int] = {}
+        self.items = array('i')
+        self.tags = array('i')
+        self.amounts = array('q')
+        self.prices = array('q')
+
+    def code(self, name: str) -> int:
+        code = self.codes.get(name)
+        if code is None:
+            code = self.codes[name] = len(self.names)
+            self.names.append(name)
+        return code
+
+    def add(self, item: str, amount: int, price: int, tag: str) -> None:
+        self.items.append(self.code(item))
+        self.amounts.append(amount)
+        self.prices.append(price)
+        self.tags.append(self.code(tag))
+
+    def add_many(self, rows: Iterable[MovementTuple]) -> None:
+        columns = tuple(zip(*rows))
+        if columns:
+            items, amounts, prices, tags = columns
+            self.items.extend(map(self.code, items))
+            self.amounts.extend(amounts)
+            self.prices.extend(prices)
+            self.tags.extend(map(self.code, tags))
+
+    def append(self, move: Union['Movement', 'MovementRow']) -> None:
+        self.add(move.item, move.amount, move.price, move.tag)
+
+    def extend(self,
+               moves: Iterable[Union['Movement', 'MovementRow']]) -> None:
+        for move in moves:
+            self.append(move)
+
+    def rows(self, start: int = 0, stop: Optional[int] = None) \
+            -> Iterator[MovementTuple]:
+        names = self.names
+        for item, amount, price, tag in zip(self.items[start:stop],
+                                            self.amounts[start:stop],
+                                            self.prices[start:stop],
+                                            self.tags[start:stop]):
+            yield names[item], amount, price, names[tag]
+
+    def __len__(self) -> int:
+        return len(self.amounts)
+
+    def __getitem__(self, index: Union[int, slice]) \
+            -> Union['MovementRow', List['MovementRow']]:
+        if isinstance(index, slice):
+            return [MovementRow(self, i)
+                    for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("history index out of range")
+        return MovementRow(self, index)
+
+    def __iter__(self) -> Iterator['MovementRow']:
+        return (MovementRow(self, i) for i in range(len(self)))
+
+
+class MovementRow:
+    # a Movement-like view of one row of a ColumnarHistory
+    __slots__ = ('history', 'index')
+
+    def __init__(self, history: ColumnarHistory, index: int):
+        self.history = history
+        self.index = index
+
+    @property
+    def item(self) -> str:
+        return self.history.names[self.history.items[self.index]]
+
+    @item.setter
+    def item(self, value: str) -> None:
+        self.history.revision += 1
+        self.history.items[self.index] = self.history.code(value)
+
+    @property
+    def amount(self) -> int:
+        return self.history.amounts[self.index]
+
+    @amount.setter
+    def amount(self, value: int) -> None:
+        self.history.revision += 1
+        self.history.amounts[self.index] = value
+
+    @property
+    def price(self) -> int:
+        return self.history.prices[self.index]
+
+    @price.setter
+    def price(self, value: int) -> None:
+        self.history.revision += 1
+        self.history.prices[self.index] = value
+
+    @property
+    def tag(self) -> str:
+        return self.history.names[self.history.tags[self.index]]
+
+    @tag.setter
+    def tag(self, value: str) -> None:
+        self.history.revision += 1
+        self.history.tags[self.index] = self.history.code(value)
+
+
+class Journal:
+    # Append-only file of fixed-size movement records. Item and tag names
+    # are interned into a sidecar file of JSON lines, which is flushed
+    # before any record that refers to a new name. A record also carries
+    # the lot it touched: its expiry for receipts (lot -1), and its
+    # position from the end of the item's list for removals, so replaying
+    # the records rebuilds the inventory exactly. Every record, or batch
+    # of them, is handed to the operating system as it is written, so a
+    # crash of the process loses none; flush() also syncs them to disk.
+    RECORD = struct.Struct('<qqiiii')
+
+    def __init__(self, path: str, snapshot_every: int = 0):
+        self.path = path
+        self.snapshot_every = snapshot_every
+        self.names: List[str] = []
+        self.codes: Dict[str, int] = {}
+
+        names_path = path + '.names'
+        with open(names_path, 'a+b') as names_file:
+            names_file.seek(0)
+            data = names_file.read()
+            # a torn last line was never referred to by a record
+            complete = data[:data.rfind(b'\n') + 1]
+            names_file.truncate(len(complete))
+        for line in complete.decode().splitlines():
+            self.codes[json.loads(line)] = len(self.names)
+            self.names.append(json.loads(line))
+        self.names_file = open(names_path, 'a')
+
+        self.file = open(path, 'ab')
+        # drop a record torn by a crash in the middle of a write
+        self.size = self.file.tell() // self.RECORD.size
+        self.file.truncate(self.size * self.RECORD.size)
+        self.snapshot_at = 0
+
+    def code(self, name: str) -> int:
+        code = self.codes.get(name)
+        if code is None:
+            code = self.codes[name] = len(self.names)
+            self.names.append(name)
+            self.names_file.write(json.dumps(name) + '\n')
+            self.names_file.flush()
+        return code
+
+    def append(self, item: str, amount: int, price: int, tag: str,
+               expires: int, lot: int) -> None:
+        self.file.write(self.RECORD.pack(amount, price, self.code(item),
+                                         self.code(tag), expires, lot))
+        self.file.flush()
+        self.size += 1
+
+    def append_many(self, moves: Iterable[MovementTuple],
+                    expires: Iterable[int], lots: Iterable[int]) -> None:
+        data = b''.join(self.RECORD.pack(amount, price, self.code(item),
+                                         self.code(tag), lot_expires, lot)
+                        for (item, amount, price, tag), lot_expires, lot
+                        in zip(moves, expires, lots))
+        self.file.write(data)
+        self.file.flush()
+        self.size += len(data) // self.RECORD.size
+
+    def flush(self) -> None:
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self) -> None:
+        self.flush()
+        self.file.close()
+        self.names_file.close()
+
+    def __len__(self) -> int:
+        return self.size
+
+    def columns(self, start: int = 0) \
+            -> Tuple[List[int], List[int], List[int], List[int],
+                     List[int], List[int]]:
+        # amounts, prices, items, tags, expires and lots of the flushed
+        # records from start on, read straight out of the mapped file
+        self.file.flush()
+        offset = start * self.RECORD.size
+        end = self.size * self.RECORD.size
+        if end <= offset:
+            return [], [], [], [], [], []
+        with open(self.path, 'rb') as file, \
+                mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if sys.byteorder != 'little':
+                records = list(self.RECORD.iter_unpack(mm[offset:end]))
+                return tuple(list(column)  # type: ignore
+                             for column in zip(*records))
+            view = memoryview(mm)[offset:end]
+            wide, narrow = view.cast('q'), view.cast('i')
+            try:
+                return (wide[0::4].tolist(), wide[1::4].tolist(),
+                        narrow[4::8].tolist(), narrow[5::8].tolist(),
+                        narrow[6::8].tolist(), narrow[7::8].tolist())
+            finally:
+                wide.release()
+                narrow.release()
+                view.release()
+
+
+class Warehouse:
+    def __init__(self, columnar: bool = False,
+                 journal: Optional[Journal] = None) -> None:
+        self.inventory = TrackedDict()
+        self.history = ColumnarHistory() if columnar else MovementList()
+        # item -> price -> amount, folded from history[:self.ledger_size]
+        self.ledger: Ledger = {}
+        self.ledger_size = 0
+        self.ledger_source: History = self.history
+        self.ledger_revision = self.history.revision
+        # (seq, copy of the ledger after the first seq movements), taken
+        # every checkpoint_every movements while folding
+        self.checkpoint_every = 16384
+        self.checkpoints: List[Tuple[int, Ledger]] = [(0, {})]
+        # item -> tag -> amount received from that supplier, and per item
+        # the largest such amount with the tags that reached it; folded
+        # along with the ledger
+        self.supplied: Supplied = {}
+        self.top_suppliers: TopSuppliers = {}
+        # item -> [amount, amount * price] summed over the lots in stock
+        self.stock: Dict[str, List[int]] = {}
+        self.stock_source: Inventory = self.inventory
+        self.stock_revision = self.inventory.revision
+        # (expires, item) for every stored lot, across all items; entries of
+        # lots that were sold in the meantime are skipped when popped, and
+        # the queue is rebuilt once they outnumber the expiry_lots in stock
+        self.expiry_queue: ExpiryQueue = []
+        self.expiry_lots = 0
+        self.expiry_source: Inventory = self.inventory
+        self.expiry_revision = self.inventory.revision
+        self.journal = journal
+
+    @property
+    def inventory(self) -> TrackedDict:
+        return self._inventory
+
+    @inventory.setter
+    def inventory(self, inventory: Inventory) -> None:
+        # a plain dict is copied into a TrackedDict
+        if not isinstance(inventory, TrackedDict):
+            inventory = TrackedDict(inventory)
+        self._inventory = inventory
+
+    @property
+    def history(self) -> History:
+        return self._history
+
+    @history.setter
+    def history(self, history: Union[Movements, History]) -> None:
+        # a plain list is copied into a MovementList
+        if not isinstance(history, (MovementList, ColumnarHistory)):
+            history = MovementList(history)
+        self._history = history
+
+    def record(self, item: str, amount: int, price: int, tag: str,
+               expires: int = 0, lot: int = -1) -> None:
+        in_sync = self.ledger_is_current()
+        self.history.add(item, amount, price, tag)
+        if in_sync:
+            self.fold(item, amount, price, tag)
+        if self.journal is not None:
+            self.journal.append(item, amount, price, tag, expires, lot)
+            self.snapshot_if_due()
+
+    def snapshot_due(self) -> bool:
+        journal = self.journal
+        assert journal is not None
+        return (journal.snapshot_every != 0
+                and len(journal) - journal.snapshot_at
+                >= journal.snapshot_every)
+
+    def snapshot_if_due(self) -> None:
+        if self.snapshot_due():
+            self.save_snapshot()
+
+    def save_snapshot(self) -> None:
+        # inventory and ledger as of the journal's current length; written
+        # aside and renamed, so a crash leaves the previous one in place
+        journal = self.journal
+        assert journal is not None
+        journal.flush()
+        snapshot = {
+            'records': len(journal),
+            'inventory': {item: [(p.amount, p.price, p.expiry)
+                                 for p in packages]
+                          for item, packages in self.inventory.items()},
+            'ledger': self.sync_ledger(),
+            'supplied': self.supplied,
+        }
+        with open(journal.path + '.snapshot.tmp', 'wb') as file:
+            pickle.dump(snapshot, file, pickle.HIGHEST_PROTOCOL)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(journal.path + '.snapshot.tmp',
+                   journal.path + '.snapshot')
+        journal.snapshot_at = len(journal)
+
+    def record_many(self, moves: List[MovementTuple], expires: List[int],
+                    lots: List[int]) -> None:
+        in_sync = self.ledger_is_current()
+        self.history.add_many(moves)
+        if in_sync:
+            for item, amount, price, tag in moves:
+                self.fold(item, amount, price, tag)
+        if self.journal is not None:
+            self.journal.append_many(moves, expires, lots)
+            self.snapshot_if_due()
+
+    def ledger_is_current(self) -> bool:
+        return (self.history is self.ledger_source
+                and self.ledger_size == len(self.history)
+                and self.ledger_revision == self.history.revision)
+
+    def sync_ledger(self) -> Ledger:
+        # history may have been replaced or edited by hand; refold it then
+        if self.history is not self.ledger_source \
+                or self.ledger_size > len(self.history) \
+                or self.ledger_revision != self.history.revision:
+            self.ledger = {}
+            self.supplied = {}
+            self.top_suppliers = {}
+            self.checkpoints = [(0, {})]
+            self.ledger_size = 0
+            self.ledger_source = self.history
+            self.ledger_revision = self.history.revision
+        if isinstance(self.history, ColumnarHistory):
+            self.fold_columns(self.history)
+        for item, amount, price, tag in history_rows(self.history,
+                                                     self.ledger_size):
+            self.fold(item, amount, price, tag)
+        return self.ledger
+
+    def fold_columns(self, history: ColumnarHistory) -> None:
+        # fold() over the rest of the columns, up to one checkpoint at a
+        # time: the ledger goes by item code, in order, as a price that
+        # drops to nothing leaves it; the supplied amounts are grouped by
+        # item and tag code first
+        names = history.names
+        by_code = [self.ledger.get(name) for name in names]
+        every = self.checkpoint_every
+        while self.ledger_size < len(history):
+            start = self.ledger_size
+            stop = min(len(history), (start // every + 1) * every)
+            items = history.items[start:stop]
+            amounts = history.amounts[start:stop]
+            for code, amount, price in zip(items, amounts,
+                                           history.prices[start:stop]):
+                prices = by_code[code]
+                if prices is None:
+                    prices = by_code[code] = self.ledger[names[code]] = {}
+                total = prices.get(price, 0) + amount
+                if total == 0:
+                    prices.pop(price, None)
+                else:
+                    prices[price] = total
+            received: Dict[Tuple[int, int], int] = {}
+            for key, amount in zip(zip(items, history.tags[start:stop]),
+                                   amounts):
+                if amount > 0:
+                    received[key] = received.get(key, 0) + amount
+            for (item, tag), amount in received.items():
+                add_supply(self.supplied, self.top_suppliers, names[item],
+                           names[tag], amount)
+            self.ledger_size = stop
+            if stop % every == 0:
+                self.checkpoints.append((stop, copy_ledger(self.ledger)))
+
+    def fold(self, item: str, amount: int, price: int, tag: str) -> None:
+        add_to_ledger(self.ledger, item, price, amount)
+        if amount > 0:
+            add_supply(self.supplied, self.top_suppliers, item, tag, amount)
+        self.ledger_size += 1
+        if self.ledger_size % self.checkpoint_every == 0:
+            self.checkpoints.append((self.ledger_size,
+                                     copy_ledger(self.ledger)))
+
+    def inventory_at(self, seq: int) -> Ledger:
+        # item -> price -> amount after the first seq movements: the
+        # nearest checkpoint before seq and a replay of the rest
+        ledger = self.sync_ledger()
+        seq = max(0, min(seq, self.ledger_size))
+        if seq == self.ledger_size:
+            return copy_ledger(ledger)
+        index = bisect_right(self.checkpoints, seq,
+                             key=lambda checkpoint: checkpoint[0]) - 1
+        start, checkpoint = self.checkpoints[index]
+        ledger = copy_ledger(checkpoint)
+        for item, amount, price, _ in history_rows(self.history, start, seq):
+            add_to_ledger(ledger, item, price, amount)
+        return ledger
+
+    def stock_is_current(self) -> bool:
+        return (self.stock_source is self.inventory
+                and self.stock_revision == self.inventory.revision)
+
+    def sync_stock(self) -> Dict[str, List[int]]:
+        if not self.stock_is_current():
+            self.stock = {item: [sum(p.amount for p in packages),
+                                 sum(p.amount * p.price for p in packages)]
+                          for item, packages in self.inventory.items()}
+            self.stock_source = self.inventory
+            self.stock_revision = self.inventory.revision
+        return self.stock
+
+    def stock_kept(self, in_stock: bool) -> None:
+        # the totals followed an operation that changed the inventory
+        if in_stock:
+            self.stock_revision = self.inventory.revision
+
+    def add_stock(self, item: str, amount: int, value: int) -> None:
+        totals = self.stock.get(item)
+        if totals is None:
+            self.stock[item] = [amount, value]
+        else:
+            totals[0] += amount
+            totals[1] += value
 
     def store(self, item: str, amount: int, price: int, expiry: str, tag: str)\
             -> None:
-        if item in self.inventory.keys():
-            packages = self.inventory.get(item)
-            assert packages is not None
-            packages.insert(0, Package(amount, price, expiry))
-            packages.sort(key=by_expiry)
+        in_stock = self.stock_is_current()
+        in_queue = self.expiry_is_current()
+        package = Package(amount, price, expiry)
+        packages = self.inventory.get(item)
+        if packages is not None:
+            # in front of lots with the same expiry, as the newest one
+            insort_left(packages, package, key=by_expiry)
         else:
-            self.inventory[item] = [Package(amount, price, expiry)]
-        self.history.append(Movement(item, amount, price, tag))
-
-    def sum_of_history(self) -> Dict[str, List[Tuple[int, int]]]:
-        result: Dict[str, List[Tuple[int, int]]] = dict()
-        for i in self.history:
-            item = i.item
-            amount = i.amount
-            price = i.price
-            if item in result.keys():
-                pakages = result.get(item)
-                assert pakages is not None
-                for j, pakage in enumerate(pakages):
-                    is_here = False
-                    price_p, amount_p = pakage
-                    if price == price_p:
-                        pakages[j] = (price, amount + amount_p)
-                        if pakages[j][1] == 0:
-                            pakages.pop(j)
-                        is_here = True
-                        break
-                if not is_here:
-                    pakages.append((price, amount))
+            self.inventory[item] = [package]
+        if in_queue:
+            heappush(self.expiry_queue, (package.expires, item))
+        if in_stock:
+            self.add_stock(item, amount, amount * price)
+        self.stock_kept(in_stock)
+        self.expiry_kept(in_queue, 1)
+        self.record(item, amount, price, tag, package.expires)
+
+    def store_many(self, rows: Iterable[Row]) -> None:
+        # same end state as calling store for every row, in order
+        in_stock = self.stock_is_current()
+        in_queue = self.expiry_is_current()
+        groups: Inventory = {}
+        moves: List[MovementTuple] = []
+        lots: List[Package] = []
+        for item, amount, price, expiry, tag in rows:
+            package = Package(amount, price, expiry)
+            groups.setdefault(item, []).append(package)
+            moves.append((item, amount, price, tag))
+            lots.append(package)
+        queue_entries = []
+        for item, new in groups.items():
+            # later rows go in front of earlier ones with the same expiry
+            new.reverse()
+            new.sort(key=by_expiry)
+            packages = self.inventory.get(item)
+            if packages is not None:
+                packages[:] = merge(new, packages, key=by_expiry)
             else:
-                result[item] = [(price, amount)]
-        return result
+                self.inventory[item] = new
+            queue_entries.extend((package.expires, item) for package in new)
+            if in_stock:
+                self.add_stock(item, sum(p.amount for p in new),
+                               sum(p.amount * p.price for p in new))
+        self.stock_kept(in_stock)
+        if in_queue:
+            if len(queue_entries) > len(self.expiry_queue) // 8:
+                self.expiry_queue.extend(queue_entries)
+                heapify(self.expiry_queue)
+            else:
+                for entry in queue_entries:
+                    heappush(self.expiry_queue, entry)
+        self.expiry_kept(in_queue, len(lots))
+        self.record_many(moves, [package.expires for package in lots],
+                         [-1] * len(lots))
+
+    def expiry_is_current(self) -> bool:
+        return (self.expiry_source is self.inventory
+                and self.expiry_revision == self.inventory.revision)
+
+    def sync_expiry_queue(self) -> ExpiryQueue:
+        # lots may have been added or edited by hand; requeue them all then
+        if not self.expiry_is_current():
+            self.requeue_lots()
+        return self.expiry_queue
+
+    def requeue_lots(self) -> None:
+        self.expiry_queue = [(package.expires, item)
+                             for item, packages in self.inventory.items()
+                             for package in packages]
+        heapify(self.expiry_queue)
+        self.expiry_lots = len(self.expiry_queue)
+        self.expiry_source = self.inventory
+        self.expiry_revision = self.inventory.revision
+
+    def expiry_kept(self, in_queue: bool, lots: int) -> None:
+        # the queue followed an operation that changed the number of lots
+        # in stock by lots
+        if in_queue:
+            self.expiry_revision = self.inventory.revision
+            self.expiry_lots += lots
+            self.requeue_if_due()
+
+    def requeue_due(self) -> bool:
+        return (self.expiry_source is self.inventory
+                and len(self.expiry_queue) > 2 * self.expiry_lots)
+
+    def requeue_if_due(self) -> None:
+        if self.requeue_due():
+            self.requeue_lots()
+
+    def sum_of_history(self, until: Optional[int] = None) \
+            -> Dict[str, List[Tuple[int, int]]]:
+        ledger = self.sync_ledger() if until is None \
+            else self.inventory_at(until)
+        return {item: list(prices.items()) for item, prices in ledger.items()}
 
     def best_suppliers(self) -> Set[str]:
-        suppliers: Dict[str, List[Tuple[str, int]]] = dict()
+        # the tags that received the most of some item; only receipts
+        # count, so a sale does not take from the tag it goes to, and a
+        # store of nothing makes no supplier
+        self.sync_ledger()
         best_suppliers = set()
-        for move in self.history:
-            item = move.item
-            amount = move.amount
-            tag = move.tag
-            if item in suppliers.keys():
-                packages = suppliers.get(item)
-                assert packages is not None
-                for i, package in enumerate(packages):
-                    is_here = False
-                    name, count = package
-                    if name == tag and count > 0:
-                        packages[i] = (name, count + amount)
-                        is_here = True
-                if not is_here:
-                    packages.append((tag, amount))
-                packages.sort(key=by_amount)
-            else:
-                suppliers[item] = [(tag, amount)]
-        for item in suppliers.keys():
-            packages = (suppliers.get(item))
-            assert packages is not None
-            max = packages[0][1]
-            for package in packages:
-                p_supplier = package[0]
-                p_amount = package[1]
-                if p_amount == max:
-                    best_suppliers.add(p_supplier)
+        for _, tags in self.top_suppliers.values():
+            best_suppliers.update(tags)
         return(best_suppliers)
 
     def average_prices(self) -> Dict[str, float]:
         average = dict()
-        for item in self.inventory.keys():
-            total_amount = 0
-            total_price = 0
-            packages = self.inventory.get(item)
-            assert packages is not None
-            for package in packages:
-                total_amount += package.amount
-                total_price += package.amount * package.price
+        for item, (total_amount, total_price) in self.sync_stock().items():
             if total_amount > 0:
                 average[item] = total_price / total_amount
             else:
@@ -110,91 +843,342 @@ class Warehouse:
 
     def find_inconsistencies(self) -> Set_of_incon:
         incon: Set_of_incon = set()
-        sumed_history = self.sum_of_history()
-        for item in self.inventory.keys():
-            packages = self.inventory.get(item)
-            histories = sumed_history.get(item)
-            assert packages is not None
-            assert histories is not None
-            packages = list(packages)
-            for h_price, h_amount in histories:
-                is_here = False
-                for i, package in enumerate(packages):
-                    p_amount = package.amount
-                    p_price = package.price
-                    if h_price == p_price:
-                        is_here = True
-                        diff = p_amount - h_amount
-                        if diff != 0:
-                            incon.add((item, h_price, diff))
-                        packages.pop(i)
-                        break
-                if not is_here:
-                    incon.add((item, h_price, -h_amount))
-            for package in (packages):
-                p_amount = package.amount
-                p_price = package.price
-                incon.add((item, p_price, p_amount))
+        ledger = self.sync_ledger()
+        for item, packages in self.inventory.items():
+            on_hand: Dict[int, int] = {}
+            for package in packages:
+                on_hand[package.price] = \
+                    on_hand.get(package.price, 0) + package.amount
+            recorded = ledger.get(item, {})
+            for price, amount in on_hand.items():
+                diff = amount - recorded.get(price, 0)
+                if diff != 0:
+                    incon.add((item, price, diff))
+            for price, amount in recorded.items():
+                if price not in on_hand:
+                    incon.add((item, price, -amount))
         return incon
 
     def remove_expired(self, today_str: str) -> List[Package]:
         today = int(today_str)
-        expired = []
-        for item in self.inventory.keys():
+        in_stock = self.stock_is_current()
+        expired: List[Package] = []
+        queue = self.sync_expiry_queue()
+        while queue and queue[0][0] < today:
+            _, item = heappop(queue)
+            # lots are ordered by expiry, so the expired ones are at the end
             packages = self.inventory.get(item)
-            assert packages is not None
-            for package in packages:
-                p_amount = package.amount
-                p_price = package.price
-                p_expire = int(package.expiry)
-                if p_expire < today:
-                    expired.append(packages.pop())
-                    self.history.append(
-                        Movement(item, -p_amount, p_price, 'EXPIRED'))
-                    break
+            while packages and packages[-1].expires < today:
+                package = packages.pop()
+                expired.append(package)
+                if in_stock:
+                    self.add_stock(item, -package.amount,
+                                   -package.amount * package.price)
+                self.record(item, -package.amount, package.price, 'EXPIRED',
+                            package.expires, 0)
+        self.stock_kept(in_stock)
+        self.expiry_kept(True, -len(expired))
         return expired
 
     def try_sell(self, item: str, amount: int, target_price: int, tag: str)\
             -> Tuple[int, int]:
-        sold = 0
-        total_price = 0
+        in_stock = self.stock_is_current()
+        in_queue = self.expiry_is_current()
+        sale = self.take_lots(item, amount, target_price, tag)
+        self.book_sale(item, sale, in_stock, in_queue)
+        return(sale[0], sale[1])
+
+    def take_lots(self, item: str, amount: int, target_price: int, tag: str)\
+            -> Sale:
+        # the part of try_sell that touches only this item's lots
         packages = self.inventory.get(item)
         assert packages is not None
-        packages_temp = list(packages)
-        for package in reversed(packages_temp):
-            to_sell = 0
-            p_amount = package.amount
-            p_price = package.price
-            if sold == 0:
-                if p_price > target_price:
-                    return(sold, total_price)
-                to_sell = min(amount, p_amount)
-            elif target_price > p_price:
-                to_sell = min(p_amount, amount)
-            elif total_price/sold <= target_price:
-                to_sell = (((target_price*sold)-(total_price))
-                           // max(abs(target_price - p_price), 1))
-                to_sell = min(p_amount, to_sell, amount)
-            else:
-                break
+        sold, total_price, steps = plan_sale(packages, amount, target_price)
+        moves: List[MovementTuple] = []
+        expires: List[int] = []
+        lots: List[int] = []
+        # lots left behind between the sold ones keep their place; an
+        # empty lot the sale stops at goes too, with a movement of nothing
+        # so that the journal drops it as well
+        kept = 0
+        for index, to_sell in steps:
+            package = packages[index]
             package.amount -= to_sell
-            amount -= to_sell
-            if package.amount == 0:
-                packages.pop()
-            if to_sell == 0:
-                break
-            self.history.append(Movement(item, -to_sell, p_price, tag))
-            sold += to_sell
-            total_price += to_sell * p_price
+            if to_sell != 0 or package.amount == 0:
+                moves.append((item, -to_sell, package.price, tag))
+                expires.append(package.expires)
+                lots.append(kept)
+            if package.amount != 0:
+                kept += 1
+        emptied = 0
+        if steps:
+            first = steps[-1][0]
+            left = [package for package in packages[first:]
+                    if package.amount != 0]
+            emptied = len(packages) - first - len(left)
+            packages[first:] = left
+        return(sold, total_price, moves, expires, lots, emptied)
+
+    def book_sale(self, item: str, sale: Sale, in_stock: bool,
+                  in_queue: bool) -> None:
+        sold, total_price, moves, expires, lots, emptied = sale
+        if in_stock:
+            self.add_stock(item, -sold, -total_price)
+        self.stock_kept(in_stock)
+        self.expiry_kept(in_queue, -emptied)
+        self.record_many(moves, expires, lots)
+
+    def quote(self, item: str, amount: int, target_price: int) \
+            -> Tuple[int, int]:
+        packages = self.inventory.get(item)
+        assert packages is not None
+        sold, total_price, _ = plan_sale(packages, amount, target_price)
         return(sold, total_price)
 
 
-def by_amount(element: Tuple[str, int]) -> int:
-    return(-element[1])
+class ConcurrentWarehouse(Warehouse):
+    # Items are spread over shards, each with its own lock; sales of items
+    # in different shards plan and take their lots concurrently. History,
+    # ledger, running totals, expiry queue and journal sit behind one
+    # shared lock, always taken after the shard lock, so the movements of
+    # a sale stay together and every item's movements keep their order.
+    # Lots must not be edited by hand here: only replacing the inventory
+    # makes the running stock totals recount, as sales in different shards
+    # count their changes in the inventory's revision without a common
+    # lock.
+    def __init__(self, shards: int = 64, columnar: bool = False,
+                 journal: Optional[Journal] = None) -> None:
+        super().__init__(columnar, journal)
+        self.shards = [Lock() for _ in range(shards)]
+        # reentrant, as sum_of_history goes through inventory_at
+        self.lock = RLock()
+
+    def shard(self, item: str) -> Lock:
+        return self.shards[hash(item) % len(self.shards)]
+
+    @contextmanager
+    def all_locks(self) -> Iterator[None]:
+        with ExitStack() as stack:
+            for lock in self.shards:
+                stack.enter_context(lock)
+            stack.enter_context(self.lock)
+            yield
+
+    def stock_is_current(self) -> bool:
+        return self.stock_source is self.inventory
+
+    def expiry_is_current(self) -> bool:
+        return self.expiry_source is self.inventory
+
+    def store(self, item: str, amount: int, price: int, expiry: str, tag: str)\
+            -> None:
+        with self.shard(item), self.lock:
+            super().store(item, amount, price, expiry, tag)
+        self.after_write()
+
+    def store_many(self, rows: Iterable[Row]) -> None:
+        rows = list(rows)
+        with self.all_locks():
+            super().store_many(rows)
+        self.after_write()
+
+    def try_sell(self, item: str, amount: int, target_price: int, tag: str)\
+            -> Tuple[int, int]:
+        with self.shard(item):
+            in_stock = self.stock_is_current()
+            in_queue = self.expiry_is_current()
+            sale = self.take_lots(item, amount, target_price, tag)
+            with self.lock:
+                self.book_sale(item, sale, in_stock, in_queue)
+        self.after_write()
+        return(sale[0], sale[1])
+
+    def quote(self, item: str, amount: int, target_price: int) \
+            -> Tuple[int, int]:
+        with self.shard(item):
+            return super().quote(item, amount, target_price)
+
+    def remove_expired(self, today_str: str) -> List[Package]:
+        with self.all_locks():
+            expired = super().remove_expired(today_str)
+        self.after_write()
+        return expired
+
+    def find_inconsistencies(self) -> Set_of_incon:
+        with self.all_locks():
+            return super().find_inconsistencies()
+
+    def average_prices(self) -> Dict[str, float]:
+        with self.all_locks():
+            return super().average_prices()
+
+    def best_suppliers(self) -> Set[str]:
+        with self.lock:
+            return super().best_suppliers()
+
+    def sum_of_history(self, until: Optional[int] = None) \
+            -> Dict[str, List[Tuple[int, int]]]:
+        with self.lock:
+            return super().sum_of_history(until)
+
+    def inventory_at(self, seq: int) -> Ledger:
+        with self.lock:
+            return super().inventory_at(seq)
+
+    def save_snapshot(self) -> None:
+        with self.all_locks():
+            super().save_snapshot()
+
+    def snapshot_if_due(self) -> None:
+        # record runs under the shared lock, but a snapshot needs all of
+        # them; after_write takes it once the operation has let go
+        pass
+
+    def requeue_if_due(self) -> None:
+        # requeueing reads the lots of every shard, so it waits for
+        # after_write too
+        pass
+
+    def after_write(self) -> None:
+        if self.journal is not None and self.snapshot_due():
+            with self.all_locks():
+                if self.snapshot_due():
+                    Warehouse.save_snapshot(self)
+        if self.requeue_due():
+            with self.all_locks():
+                if self.requeue_due():
+                    self.requeue_lots()
+
+
+def add_to_ledger(ledger: Ledger, item: str, price: int, amount: int) -> None:
+    prices = ledger.get(item)
+    if prices is None:
+        prices = ledger[item] = {}
+    total = prices.get(price, 0) + amount
+    if total == 0:
+        prices.pop(price, None)
+    else:
+        prices[price] = total
+
+
+def plan_sale(packages: List[Package], amount: int, target_price: int) \
+        -> Tuple[int, int, List[Tuple[int, int]]]:
+    # What try_sell takes, lot by lot from the end of the list: sold,
+    # total_price and (index, to_sell) per lot visited. Lots below the
+    # target price are taken whole while the amount lasts, dearer ones
+    # only as far as the average stays at or under the target. Runs of
+    # lots taken whole are found by bisecting prefix sums in sell order;
+    # the lot ending a run goes through the per-lot rules. The sums are
+    # read a doubling chunk of lots at a time, so a sale only reads about
+    # twice the lots it reaches.
+    count = len(packages)
+    amounts: List[int] = []
+    prices: List[int] = []
+    sum_amount = [0]
+    # how much the first k lots cost above the target price, in total
+    excess = [0]
+    # empty lots and lots exactly at the target price, in sell order;
+    # they may only take as much as the current slack, so they end runs
+    stops: List[int] = []
+
+    def read_more() -> None:
+        start = len(amounts)
+        chunk = packages[count - min(count, 2 * start + 8):count - start]
+        chunk.reverse()
+        chunk_amounts = [package.amount for package in chunk]
+        chunk_prices = [package.price for package in chunk]
+        amounts.extend(chunk_amounts)
+        prices.extend(chunk_prices)
+        # accumulate() starts at the sums so far, which are there already
+        sum_amount.extend(islice(accumulate(chunk_amounts,
+                                            initial=sum_amount[-1]), 1, None))
+        excess.extend(islice(accumulate((a * (p - target_price) for a, p
+                                         in zip(chunk_amounts, chunk_prices)),
+                                        initial=excess[-1]), 1, None))
+        stops.extend(i for i, (a, p)
+                     in enumerate(zip(chunk_amounts, chunk_prices), start)
+                     if a == 0 or p == target_price)
+
+    sold = 0
+    total_price = 0
+    steps: List[Tuple[int, int]] = []
+    next_stop = 0
+    i = 0
+    while i < count:
+        while next_stop < len(stops) and stops[next_stop] < i:
+            next_stop += 1
+        # a run of one lot is quicker through the rules below
+        if sold != 0 and (next_stop == len(stops)
+                          or stops[next_stop] > i + 1):
+            # lots that fit into the amount, stopping short of the next
+            # stop ...
+            fits = amount - sold + sum_amount[i]
+            while len(amounts) < count and sum_amount[-1] <= fits:
+                read_more()
+            end = bisect_right(sum_amount, fits, i) - 1
+            if next_stop < len(stops):
+                end = min(end, stops[next_stop])
+            # ... and that keep the average at or under the target
+            most = excess[i] + target_price * sold - total_price
+            run = i
+            while run < end and excess[run + 1] <= most:
+                run += 1
+            steps.extend(zip(range(count - 1 - i, count - 1 - run, -1),
+                             amounts[i:run]))
+            sold += sum_amount[run] - sum_amount[i]
+            total_price += excess[run] - excess[i] \
+                + target_price * (sum_amount[run] - sum_amount[i])
+            i = run
+            if i == count:
+                break
+        if i == len(amounts):
+            read_more()
+        p_amount = amounts[i]
+        p_price = prices[i]
+        if sold == 0:
+            if p_price > target_price:
+                break
+            to_sell = min(amount, p_amount)
+        elif target_price > p_price:
+            to_sell = min(p_amount, amount - sold)
+        else:
+            to_sell = (((target_price*sold)-(total_price))
+                       // max(p_price - target_price, 1))
+            to_sell = min(p_amount, to_sell, amount - sold)
+        steps.append((count - 1 - i, to_sell))
+        if to_sell == 0:
+            break
+        sold += to_sell
+        total_price += to_sell * p_price
+        i += 1
+    return(sold, total_price, steps)
+
+
+def history_rows(history: History, start: int = 0,
+                 stop: Optional[int] = None) -> Iterator[MovementTuple]:
+    if isinstance(history, ColumnarHistory):
+        return history.rows(start, stop)
+    return ((move.item, move.amount, move.price, move.tag)
+            for move in history[start:stop])
+
+
+def copy_ledger(ledger: Ledger) -> Ledger:
+    return {item: dict(prices) for item, prices in ledger.items()}
+
+
+def add_supply(supplied: Supplied, top: TopSuppliers, item: str, tag: str,
+               amount: int) -> None:
+    tags = supplied.setdefault(item, {})
+    total = tags[tag] = tags.get(tag, 0) + amount
+    most = top.get(item)
+    if most is None or total > most[0]:
+        top[item] = (total, {tag})
+    elif total == most[0]:
+        most[1].add(tag)
 
 
 def by_expiry(package: Package) -> int:
-    return(-int(package.expiry))
+    return(-package.expires)
 
 
 def print_warehouse(warehouse: Warehouse) -> None:
@@ -208,13 +1192,100 @@ def print_warehouse(warehouse: Warehouse) -> None:
     print("\n===== HISTORY ======")
     print("    item     amount  price   tag")
     print("-------------------------------------------")
-    for mov in warehouse.history:
-        print(f" {mov.item:^11}   {mov.amount:4d}   "
-              f"{mov.price:4d}   {mov.tag}")
+    for item, amount, price, tag in history_rows(warehouse.history):
+        print(f" {item:^11}   {amount:4d}   {price:4d}   {tag}")
 
 
-def example_warehouse() -> Warehouse:
-    wh = Warehouse()
+def apply_record(inventory: Inventory, item: str, amount: int, price: int,
+                 expires: int, lot: int) -> None:
+    packages = inventory.setdefault(item, [])
+    if lot < 0:
+        insort_left(packages, Package(amount, price, str(expires)),
+                    key=by_expiry)
+        return
+    index = len(packages) - 1 - lot
+    packages[index].amount += amount
+    if packages[index].amount == 0:
+        del packages[index]
+
+
+def open_warehouse(path: str, columnar: bool = True,
+                   snapshot_every: int = 0) -> Warehouse:
+    # the last snapshot plus a replay of the journal tail behind it
+    journal = Journal(path, snapshot_every)
+    wh = Warehouse(columnar)
+    inventory: Inventory = {}
+    start = 0
+    if os.path.exists(path + '.snapshot'):
+        with open(path + '.snapshot', 'rb') as file:
+            snapshot = pickle.load(file)
+        if snapshot['records'] <= len(journal):
+            start = snapshot['records']
+            inventory = {item: [Package(*lot) for lot in lots]
+                         for item, lots in snapshot['inventory'].items()}
+
+    amounts, prices, items, tags, expires, lots = journal.columns()
+    names = journal.names
+    for i in range(start, len(amounts)):
+        apply_record(inventory, names[items[i]], amounts[i], prices[i],
+                     expires[i], lots[i])
+    wh.inventory = inventory
+
+    if isinstance(wh.history, ColumnarHistory):
+        wh.history.names = list(names)
+        wh.history.codes = dict(journal.codes)
+        wh.history.items = array('i', items)
+        wh.history.tags = array('i', tags)
+        wh.history.amounts = array('q', amounts)
+        wh.history.prices = array('q', prices)
+    else:
+        wh.history.extend(Movement(names[item], amount, price, names[tag])
+                          for amount, price, item, tag
+                          in zip(amounts, prices, items, tags))
+    wh.ledger_source = wh.history
+    if start:
+        wh.ledger = snapshot['ledger']
+        wh.supplied = snapshot['supplied']
+        for item, tags in wh.supplied.items():
+            most = max(tags.values())
+            wh.top_suppliers[item] = \
+                (most, {tag for tag, amount in tags.items() if amount == most})
+        wh.ledger_size = start
+        wh.checkpoints.append((start, copy_ledger(wh.ledger)))
+    journal.snapshot_at = start
+    wh.journal = journal
+    return wh
+
+
+def read_manifest(path: str) -> Iterator[Row]:
+    # CSV with an item,amount,price,expiry,tag header, or JSON lines with
+    # the same keys
+    with open(path, newline='') as manifest:
+        if path.endswith('.jsonl'):
+            records: Iterable[Dict[str, str]] = \
+                (json.loads(line) for line in manifest if line.strip())
+        else:
+            records = csv.DictReader(manifest)
+        for record in records:
+            yield (record['item'], int(record['amount']),
+                   int(record['price']), str(record['expiry']),
+                   record['tag'])
+
+
+def load_manifest(warehouse: Warehouse, path: str,
+                  batch: int = 100_000) -> int:
+    rows = read_manifest(path)
+    loaded = 0
+    while True:
+        chunk = list(islice(rows, batch))
+        if not chunk:
+            return loaded
+        warehouse.store_many(chunk)
+        loaded += len(chunk)
+
+
+def example_warehouse(columnar: bool = False) -> Warehouse:
+    wh = Warehouse(columnar)
 
     wh.store("rice", 100, 17, "20220202", "ACME Rice Ltd.")
     wh.store("corn", 70, 15, "20220315", "UniCORN & co.")
@@ -327,6 +1398,22 @@ def test5() -> None:
     assert wh.best_suppliers() \
         == {'UniCORN & co.', 'G. P. a C.', 'RICE Unlimited'}
 
+    for columnar in False, True:
+        wh = Warehouse(columnar)
+        wh.store('rice', 10, 1, '20220101', 'ACME Rice Ltd.')
+        wh.store('rice', 8, 1, '20220101', 'RICE Unlimited')
+        wh.store('rice', 1, 1, '20220101', 'ACME Rice Ltd.')
+        wh.try_sell('rice', 5, 1, 'ACME Rice Ltd.')
+        assert wh.best_suppliers() == {'ACME Rice Ltd.'}
+        wh.store('rice', 3, 1, '20220101', 'RICE Unlimited')
+        assert wh.best_suppliers() == {'ACME Rice Ltd.', 'RICE Unlimited'}
+        # storing nothing receives nothing, so it makes no supplier
+        wh.store('corn', 0, 1, '20220101', 'Empty Promises')
+        assert wh.best_suppliers() == {'ACME Rice Ltd.', 'RICE Unlimited'}
+        wh.store('corn', 1, 1, '20220101', 'UniCORN & co.')
+        assert wh.best_suppliers() \
+            == {'ACME Rice Ltd.', 'RICE Unlimited', 'UniCORN & co.'}
+
 
 def test6() -> None:
     wh = Warehouse()
@@ -355,7 +1442,7 @@ def test9() -> None:
     wh.inventory = {
       'rice': [Package(1, 1, '20000101'), Package(1, 1, '20000101')],
           }
-    # assert wh.find_inconsistencies() == set()
+    assert wh.find_inconsistencies() == set()
 
 
 def test10() -> None:
@@ -370,6 +1457,440 @@ def test10() -> None:
     print(wh.try_sell('soy', 1, 100, 'Soy Shop'))
 
 
+def test11() -> None:
+    wh = Warehouse()
+    wh.store('rice', 10, 1, '20220103', 'ACME Rice Ltd.')
+    wh.store('rice', 10, 20, '20220102', 'RICE Unlimited')
+    wh.store('rice', 5, 10, '20220101', "Theorem's Rice")
+    assert wh.try_sell('rice', 100, 12, 'Pear Shop') \
+        == (5 + 1 + 10, 5 * 10 + 1 * 20 + 10 * 1)
+    assert [(p.amount, p.price) for p in wh.inventory['rice']] == [(9, 20)]
+    assert wh.find_inconsistencies() == set()
+
+    wh.history.append(Movement('rice', 5, 15, 'UniCORN & co.'))
+    assert wh.find_inconsistencies() == {('rice', 15, -5)}
+    assert wh.sum_of_history()['rice'] == [(20, 9), (15, 5)]
+
+    wh = example_warehouse()
+    other = example_warehouse()
+    assert wh.find_inconsistencies() == other.find_inconsistencies() == set()
+    ledger = other.ledger
+    wh.history[4] = Movement('rice', 90, 12, 'X')
+    assert wh.find_inconsistencies() == {('rice', 14, 90), ('rice', 12, -90)}
+    del wh.history[0]
+    wh.store('rice', 1, 5, '20220101', 'X')
+    assert ('rice', 17, 100) in wh.find_inconsistencies()
+    assert other.ledger is ledger
+
+    # a movement in two histories counts its edits in both, and only there
+    wh = example_warehouse()
+    wh.history = other.history[:]
+    other.history[1].amount -= 1
+    assert wh.find_inconsistencies() == other.find_inconsistencies() \
+        == {('corn', 15, 1)}
+    ledger = other.ledger
+    wh.store('corn', 1, 15, '20220315', 'X')
+    wh.history[-1].amount = 2
+    assert wh.find_inconsistencies() == set()
+    assert other.find_inconsistencies() == {('corn', 15, 1)}
+    assert other.ledger is ledger
+
+
+def test12() -> None:
+    wh = example_warehouse()
+    expired = wh.remove_expired('20220203')
+    assert [(p.amount, p.price) for p in expired] \
+        == [(64, 7), (42, 9), (100, 17), (90, 14)]
+    assert [len(wh.inventory[item]) for item in ('rice', 'peas', 'corn')] \
+        == [1, 1, 1]
+    assert wh.remove_expired('20220203') == []
+    assert wh.find_inconsistencies() == set()
+
+    wh.inventory = {'rice': [Package(1, 1, '20000102'),
+                             Package(1, 1, '20000101')]}
+    assert len(wh.remove_expired('20000102')) == 1
+
+    # lots added or edited by hand are queued again
+    wh = example_warehouse()
+    wh.remove_expired('20000101')
+    wh.inventory['corn'].append(Package(5, 15, '20000101'))
+    wh.inventory['peas'][-1].expiry = '20000101'
+    assert [(p.amount, p.price) for p in wh.remove_expired('20200101')] \
+        == [(5, 15), (64, 7)]
+
+    # entries of lots sold off do not pile up
+    rng = Random(12)
+    wh = Warehouse()
+    for day in range(20220101, 20220401):
+        for _ in range(5):
+            wh.store('rice', rng.randrange(1, 10), rng.randrange(1, 5),
+                     str(day + rng.randrange(30)), 'ACME Rice Ltd.')
+        wh.try_sell('rice', rng.randrange(1, 60), 4, 'Pear Shop')
+        before = [p for p in wh.inventory['rice'] if p.expires < day]
+        assert wh.remove_expired(str(day)) == before[::-1]
+        lots = len(wh.inventory['rice'])
+        assert wh.expiry_lots == lots
+        assert len(wh.expiry_queue) <= 2 * lots
+
+
+def test13() -> None:
+    rows = [("rice", 100, 17, "20220202", "ACME Rice Ltd."),
+            ("corn", 70, 15, "20220315", "UniCORN & co."),
+            ("rice", 200, 158, "20771023", "RICE Unlimited"),
+            ("peas", 9774, 1, "20220921", "G. P. a C."),
+            ("rice", 90, 14, "20220202", "Theorem's Rice"),
+            ("peas", 64, 7, "20211101", "Discount Peas"),
+            ("rice", 42, 9, "20211111", "ACME Rice Ltd.")]
+    expected = example_warehouse()
+    expected.store_many(rows)
+    for row in rows:
+        expected.store(*row)
+
+    wh = Warehouse()
+    wh.store_many(rows[:3])
+    wh.store_many(rows[3:])
+    wh.store_many(rows)
+    for row in rows:
+        wh.store(*row)
+
+    def lots(wh: Warehouse) -> List[Tuple[int, int, str]]:
+        return [(p.amount, p.price, p.expiry)
+                for pkgs in wh.inventory.values() for p in pkgs]
+
+    assert wh.inventory.keys() == expected.inventory.keys()
+    assert lots(wh) == lots(expected)
+    assert [(m.item, m.amount, m.price, m.tag) for m in wh.history] \
+        == [(m.item, m.amount, m.price, m.tag) for m in expected.history]
+    assert wh.find_inconsistencies() == set()
+    assert len(wh.remove_expired('20220203')) == 12
+
+
+def test15() -> None:
+    def run(wh: Warehouse) -> Tuple[object, ...]:
+        return (wh.try_sell('rice', 500, 16, 'Pear Shop'),
+                len(wh.remove_expired('20220203')),
+                wh.best_suppliers(), wh.sum_of_history(),
+                wh.find_inconsistencies(), list(history_rows(wh.history)))
+
+    wh = example_warehouse(columnar=True)
+    assert isinstance(wh.history, ColumnarHistory)
+    assert run(wh) == run(example_warehouse())
+
+    runs = []
+    for columnar in True, False:
+        wh = example_warehouse(columnar)
+        wh.store('rice', 0, 4, '20211111', 'Zero Rice')
+        runs.append(run(wh))
+    assert runs[0] == runs[1]
+    assert ('rice', 0, 4, 'Pear Shop') in runs[0][-1]
+
+    wh = Warehouse(columnar=True)
+    wh.store_many([("rice", 100, 17, "20220202", "ACME Rice Ltd."),
+                   ("rice", 90, 14, "20220202", "Theorem's Rice")])
+    assert wh.history[-1].tag == "Theorem's Rice"
+    assert wh.history.names == ['rice', 'ACME Rice Ltd.', "Theorem's Rice"]
+    wh.history[1].price = 12
+    assert wh.find_inconsistencies() == {('rice', 14, 90), ('rice', 12, -90)}
+
+    # folding the columns in bulk matches folding movement by movement
+    rng = Random(15)
+    rows = [(rng.choice(['rice', 'corn']), rng.randrange(-5, 6),
+             rng.randrange(1, 4), rng.choice('ABC')) for _ in range(200)]
+    for edit in False, True:
+        wh = Warehouse(columnar=True)
+        wh.checkpoint_every = 7
+        wh.history.add_many(rows)
+        expected = Warehouse()
+        expected.checkpoint_every = 7
+        for row in rows:
+            expected.record(*row)
+        if edit:
+            wh.sum_of_history()
+            wh.history[5].amount = 3
+            expected.history[5].amount = 3
+        assert wh.sum_of_history() == expected.sum_of_history()
+        assert (wh.supplied, wh.top_suppliers, wh.checkpoints) \
+            == (expected.supplied, expected.top_suppliers,
+                expected.checkpoints)
+
+
+def test17() -> None:
+    def reference_sell(packages: List[Package], amount: int,
+                       target_price: int) -> Tuple[int, int]:
+        # try_sell as it used to walk the lots one by one
+        sold = 0
+        total_price = 0
+        for index in reversed(range(len(packages))):
+            package = packages[index]
+            p_amount = package.amount
+            p_price = package.price
+            if sold == 0:
+                if p_price > target_price:
+                    return(sold, total_price)
+                to_sell = min(amount, p_amount)
+            elif target_price > p_price:
+                to_sell = min(p_amount, amount)
+            elif total_price/sold <= target_price:
+                to_sell = (((target_price*sold)-(total_price))
+                           // max(abs(target_price - p_price), 1))
+                to_sell = min(p_amount, to_sell, amount)
+            else:
+                break
+            package.amount -= to_sell
+            amount -= to_sell
+            if package.amount == 0:
+                del packages[index]
+            if to_sell == 0:
+                break
+            sold += to_sell
+            total_price += to_sell * p_price
+        return(sold, total_price)
+
+    rng = Random(17)
+    for _ in range(3000):
+        wh = Warehouse()
+        for _ in range(rng.randrange(12)):
+            wh.store('rice', rng.choice([0, *range(1, 30)]),
+                     rng.randrange(1, 12), str(20220101 + rng.randrange(9)),
+                     'ACME Rice Ltd.')
+        packages = [Package(p.amount, p.price, p.expiry)
+                    for p in wh.inventory.get('rice', [])]
+        amount = rng.randrange(1, 200)
+        target_price = rng.randrange(1, 14)
+        expected = reference_sell(packages, amount, target_price)
+        if 'rice' in wh.inventory:
+            assert wh.quote('rice', amount, target_price) == expected
+        else:
+            wh.inventory['rice'] = []
+        assert wh.try_sell('rice', amount, target_price, 'Pear Shop') \
+            == expected
+        assert [(p.amount, p.price, p.expiry) for p in packages] \
+            == [(p.amount, p.price, p.expiry) for p in wh.inventory['rice']]
+        assert wh.find_inconsistencies() == set()
+
+    # long runs ended by lots at the target price, and by empty lots
+    for amounts in [1] * 2000, [rng.choice([0, 1, 2, 3]) for _ in range(2000)]:
+        wh = Warehouse()
+        wh.store_many(('rice', lot_amount, 5 if i % 2 else 10, '20220101',
+                       'ACME Rice Ltd.')
+                      for i, lot_amount in enumerate(amounts))
+        packages = [Package(p.amount, p.price, p.expiry)
+                    for p in wh.inventory['rice']]
+        expected = reference_sell(packages, 10**6, 10)
+        assert wh.try_sell('rice', 10**6, 10, 'Pear Shop') == expected
+        assert [(p.amount, p.price) for p in packages] \
+            == [(p.amount, p.price) for p in wh.inventory['rice']]
+        assert wh.find_inconsistencies() == set()
+
+
+def test18() -> None:
+    def recounted(wh: Warehouse) -> Tuple[Dict[str, float], Set[str]]:
+        average: Dict[str, float] = {}
+        for item, packages in wh.inventory.items():
+            amount = sum(p.amount for p in packages)
+            value = sum(p.amount * p.price for p in packages)
+            average[item] = value / amount if amount > 0 else 0
+        suppliers: Supplied = {}
+        for item, amount, _, tag in history_rows(wh.history):
+            if amount > 0:
+                tags = suppliers.setdefault(item, {})
+                tags[tag] = tags.get(tag, 0) + amount
+        best = {tag for tags in suppliers.values() for tag, amount
+                in tags.items() if amount == max(tags.values())}
+        return average, best
+
+    rng = Random(18)
+    wh = example_warehouse()
+    for day in range(20211101, 20211131):
+        for _ in range(10):
+            item = rng.choice(['rice', 'peas', 'corn', 'soy'])
+            if item in wh.inventory and rng.random() < 0.5:
+                wh.try_sell(item, rng.randrange(1, 100), rng.randrange(1, 20),
+                            'Pear Shop')
+            else:
+                wh.store(item, rng.randrange(1, 100), rng.randrange(1, 20),
+                         str(day + rng.randrange(30)),
+                         rng.choice(['ACME', 'UniCORN', 'G. P. a C.']))
+        wh.remove_expired(str(day))
+        assert (wh.average_prices(), wh.best_suppliers()) == recounted(wh)
+
+    wh.inventory['rice'][0].amount += 1
+    wh.history[0].amount += 1000
+    assert (wh.average_prices(), wh.best_suppliers()) == recounted(wh)
+
+    wh = example_warehouse()
+    other = example_warehouse()
+    assert wh.average_prices() == other.average_prices()
+    del wh.inventory['corn']
+    assert 'corn' not in wh.average_prices()
+    wh.inventory['rice'].append(Package(1000, 1, '20000101'))
+    assert math.isclose(wh.average_prices()['rice'],
+                        (80.875 * 432 + 1000) / 1432)
+    wh.inventory['peas'][0] = Package(1, 3, '20220921')
+    assert wh.average_prices() == recounted(wh)[0]
+    # a lot in two inventories counts its edits in both, and only there
+    wh.inventory = {'rice': other.inventory['rice'][:]}
+    other.inventory['rice'][0].price += 1
+    assert wh.average_prices() == recounted(wh)[0]
+    assert other.average_prices() == recounted(other)[0]
+    stock = other.stock
+    wh.store('rice', 1, 1, '20211101', 'X')
+    wh.inventory['rice'][-1].amount = 2
+    assert wh.average_prices() == recounted(wh)[0]
+    other.average_prices()
+    assert other.stock is stock
+
+
+def test19() -> None:
+    wh = ConcurrentWarehouse(shards=4)
+    items = [f'item{i}' for i in range(10)]
+    for item in items:
+        wh.store(item, 1000, 10, '20220101', 'ACME')
+    sold: List[Dict[str, int]] = [{} for _ in range(8)]
+
+    def seller(seed: int) -> None:
+        rng = Random(seed)
+        for _ in range(500):
+            item = rng.choice(items)
+            if rng.random() < 0.3:
+                wh.store(item, rng.randrange(1, 20), rng.randrange(5, 15),
+                         str(20220101 + rng.randrange(30)), 'ACME')
+            else:
+                got, _ = wh.try_sell(item, rng.randrange(1, 30), 12, 'Shop')
+                sold[seed][item] = sold[seed].get(item, 0) + got
+
+    threads = [Thread(target=seller, args=(seed,)) for seed in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert wh.find_inconsistencies() == set()
+    lots = sum(map(len, wh.inventory.values()))
+    assert wh.expiry_lots == lots and len(wh.expiry_queue) <= 2 * lots
+    for item in items:
+        assert -sum(amount for it, amount, _, tag in history_rows(wh.history)
+                    if it == item and tag == 'Shop') \
+            == sum(counts.get(item, 0) for counts in sold)
+    wh.remove_expired('20220115')
+    expected = Warehouse()
+    expected.inventory = wh.inventory
+    expected.history = wh.history
+    assert wh.average_prices() == expected.average_prices()
+    assert wh.best_suppliers() == expected.best_suppliers() == {'ACME'}
+    assert wh.sum_of_history() == expected.sum_of_history()
+    for seq in 0, 1, len(wh.history) // 2:
+        assert wh.sum_of_history(until=seq) \
+            == expected.sum_of_history(until=seq)
+
+
+def test20() -> None:
+    wh = example_warehouse()
+    wh.checkpoint_every = 3
+    # a replaced history is refolded, with checkpoints from the start
+    wh.history = list(wh.history)
+    wh.try_sell('rice', 500, 16, 'Pear Shop')
+    wh.remove_expired('20220203')
+    assert wh.find_inconsistencies() == set()
+    assert [seq for seq, _ in wh.checkpoints] \
+        == list(range(0, len(wh.history) + 1, 3))
+
+    for seq in range(len(wh.history) + 1):
+        replayed = Warehouse()
+        replayed.history = wh.history[:seq]
+        assert wh.sum_of_history(until=seq) == replayed.sum_of_history()
+    assert wh.inventory_at(4) == {'rice': {17: 100, 158: 200},
+                                  'corn': {15: 70}, 'peas': {1: 9774}}
+    assert wh.inventory_at(len(wh.history)) == wh.ledger
+
+    wh.history[1].price = 16
+    assert wh.inventory_at(2) == {'rice': {17: 100}, 'corn': {16: 70}}
+
+
+# Note: running test14 overwrites and removes files with these names in the
+# current working directory!
+
+TEST_FILENAME = "_ib111_tmp_file_"
+
+
+def test14() -> None:
+    with open(TEST_FILENAME, "w") as file:
+        file.write("item,amount,price,expiry,tag\n"
+                   "rice,100,17,20220202,ACME Rice Ltd.\n"
+                   "corn,70,15,20220315,\"UniCORN & co.\"\n")
+    with open(TEST_FILENAME + ".jsonl", "w") as file:
+        file.write('{"item": "rice", "amount": 42, "price": 9, '
+                   '"expiry": "20211111", "tag": "ACME Rice Ltd."}\n')
+
+    wh = Warehouse()
+    assert load_manifest(wh, TEST_FILENAME, batch=1) == 2
+    assert load_manifest(wh, TEST_FILENAME + ".jsonl") == 1
+    os.remove(TEST_FILENAME)
+    os.remove(TEST_FILENAME + ".jsonl")
+
+    assert [(p.amount, p.price) for p in wh.inventory['rice']] \
+        == [(100, 17), (42, 9)]
+    assert wh.history[1].tag == 'UniCORN & co.'
+    assert wh.find_inconsistencies() == set()
+
+
+def test16() -> None:
+    def lots(wh: Warehouse) -> List[Tuple[str, int, int, str]]:
+        return [(item, p.amount, p.price, p.expiry)
+                for item, pkgs in wh.inventory.items() for p in pkgs]
+
+    paths = [TEST_FILENAME + suffix
+             for suffix in ('', '.names', '.snapshot')]
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+    wh = open_warehouse(TEST_FILENAME, snapshot_every=8)
+    wh.store('rice', 10, 1, '20220103', 'ACME Rice Ltd.')
+    wh.store('rice', 10, 20, '20220102', 'RICE Unlimited')
+    wh.store_many([("rice", 5, 10, "20220101", "Theorem's Rice"),
+                   ("corn", 70, 15, "20220315", "UniCORN & co.")])
+    wh.try_sell('rice', 100, 12, 'Pear Shop')
+    wh.store('peas', 64, 7, '20211101', 'Discount Peas')
+    wh.remove_expired('20211111')
+    wh.store('peas', 9774, 1, '20220921', 'G. P. a C.')
+    assert wh.journal is not None and wh.journal.snapshot_at == 8
+    wh.try_sell('corn', 20, 15, 'Pear Shop')
+    # an empty lot a sale stops at is journalled as it goes
+    wh.store('soy', 5, 3, '20230103', 'ACME Rice Ltd.')
+    wh.store('soy', 0, 4, '20230102', 'ACME Rice Ltd.')
+    wh.store('soy', 7, 2, '20230101', 'ACME Rice Ltd.')
+    assert wh.try_sell('soy', 100, 10, 'Pear Shop') == (7, 14)
+    assert list(history_rows(wh.history))[-2:] \
+        == [('soy', -7, 2, 'Pear Shop'), ('soy', 0, 4, 'Pear Shop')]
+    wh.store('soy', 9, 1, '20230105', 'ACME Rice Ltd.')
+    wh.store('soy', 0, 4, '20230104', 'ACME Rice Ltd.')
+    wh.store('soy', 1, 1, '20230103', 'ACME Rice Ltd.')
+    assert wh.try_sell('soy', 100, 10, 'Pear Shop') == (6, 16)
+    assert [(p.amount, p.price) for p in wh.inventory['soy']] == [(9, 1)]
+    # every record is in the file before the journal is closed
+    assert os.path.getsize(TEST_FILENAME) \
+        == len(wh.journal) * Journal.RECORD.size
+    wh.journal.close()
+    with open(TEST_FILENAME, 'ab') as file:
+        file.write(b'torn')
+
+    for with_snapshot in True, False:
+        if not with_snapshot:
+            os.remove(TEST_FILENAME + '.snapshot')
+        for columnar in True, False:
+            recovered = open_warehouse(TEST_FILENAME, columnar)
+            assert recovered.journal is not None
+            recovered.journal.close()
+            assert lots(recovered) == lots(wh)
+            assert list(history_rows(recovered.history)) \
+                == list(history_rows(wh.history))
+            assert recovered.find_inconsistencies() == set()
+            assert recovered.best_suppliers() == wh.best_suppliers()
+    for path in paths[:2]:
+        os.remove(path)
+
+
 if __name__ == '__main__':
     test1()
     test2()
@@ -380,4 +1901,15 @@ if __name__ == '__main__':
     test7()
     test8()
     test9()
-    test10()
\ No newline at end of file
+    test11()
+    test12()
+    test13()
+    test14()
+    test15()
+    test16()
+    test17()
+    test18()
+    test19()
+    test20()
+    # last, as selling an item that was never stored fails its assertion
+    test10()
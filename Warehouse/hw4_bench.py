@@ -0,0 +1,422 @@
+import argparse
+import cProfile
+import os
+import pstats
+import resource
+import tracemalloc
+from random import Random
+from threading import Lock, Thread
+from time import perf_counter
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# change hw4 below if your file name is different
+import hw4 as student
+
+ITEMS = 100
+PRICES = 20
+BATCH = 10_000
+
+# relative weights of the operations in a synthetic workload
+DEFAULT_MIX = {
+    'store': 45,
+    'try_sell': 45,
+    'remove_expired': 1,
+    'find_inconsistencies': 3,
+    'best_suppliers': 3,
+    'average_prices': 3,
+}
+
+Operation = Tuple[str, tuple]
+
+
+def grow(wh: student.Warehouse, rng: Random, movements: int) -> None:
+    target = len(wh.history) + movements
+    while len(wh.history) < target:
+        item = f"item{rng.randrange(ITEMS)}"
+        # sales outweigh receipts, so the stock stays bounded while the
+        # history keeps growing
+        if wh.inventory.get(item) and rng.random() < 0.5:
+            wh.try_sell(item, rng.randrange(1, 150), PRICES, "shop")
+        else:
+            wh.store(item, rng.randrange(1, 100), rng.randrange(1, PRICES + 1),
+                     str(20220101 + rng.randrange(365)), "supplier")
+
+
+def bench_inconsistencies(sizes=(10_000, 100_000, 1_000_000)) -> None:
+    rng = Random(1)
+    wh = student.Warehouse()
+    print("  history   audit [ms]   suppliers [ms]   averages [ms]")
+    for size in sizes:
+        while len(wh.history) < size:
+            grow(wh, rng, min(BATCH, size - len(wh.history)))
+            timings = []
+            for report in (wh.find_inconsistencies, wh.best_suppliers,
+                           wh.average_prices):
+                start = perf_counter()
+                report()
+                timings.append((perf_counter() - start) * 1000)
+        assert wh.find_inconsistencies() == set()
+        audit, suppliers, averages = timings
+        print(f"  {len(wh.history):7d}   {audit:10.3f}   {suppliers:14.3f}"
+              f"   {averages:13.3f}")
+
+
+def bench_expiry(skus: int = 100_000, lots: int = 5) -> None:
+    rng = Random(2)
+    wh = student.Warehouse()
+    for _ in range(lots):
+        for i in range(skus):
+            wh.store(f"sku{i}", 10, rng.randrange(1, PRICES + 1),
+                     str(20220101 + rng.randrange(28)), "supplier")
+    print("  day        expired   sweep [ms]")
+    for day in range(20220105, 20220130, 5):
+        start = perf_counter()
+        expired = wh.remove_expired(str(day))
+        elapsed = perf_counter() - start
+        print(f"  {day}   {len(expired):7d}   {elapsed * 1000:9.3f}")
+    assert wh.find_inconsistencies() == set()
+
+
+def manifest(rng: Random, rows: int, items: int = 1000) -> List[student.Row]:
+    return [(f"item{rng.randrange(items)}", rng.randrange(1, 100),
+             rng.randrange(1, PRICES + 1), str(20220101 + rng.randrange(365)),
+             "supplier")
+            for _ in range(rows)]
+
+
+def bench_store_many(sizes=(100_000, 1_000_000)) -> None:
+    print("     rows   store [s]   store_many [s]")
+    for size in sizes:
+        rows = manifest(Random(3), size)
+
+        wh = student.Warehouse()
+        start = perf_counter()
+        for row in rows:
+            wh.store(*row)
+        sequential = perf_counter() - start
+
+        bulk_wh = student.Warehouse()
+        start = perf_counter()
+        bulk_wh.store_many(rows)
+        bulk = perf_counter() - start
+
+        assert len(bulk_wh.history) == len(wh.history)
+        print(f"  {size:7d}   {sequential:9.3f}   {bulk:14.3f}")
+
+
+def bench_columnar(size: int = 1_000_000) -> None:
+    rows = manifest(Random(4), size)
+    print("  history    memory [MB]   best_suppliers [s]")
+    for columnar in False, True:
+        wh = student.Warehouse(columnar)
+        tracemalloc.start()
+        wh.history.add_many((item, amount, price, tag)
+                            for item, amount, price, _, tag in rows)
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        start = perf_counter()
+        wh.best_suppliers()
+        elapsed = perf_counter() - start
+        name = "columnar" if columnar else "list"
+        print(f"  {name:8}   {memory / 2**20:11.1f}   {elapsed:18.3f}")
+
+
+def bench_cold_start(size: int = 10_000_000, tail: int = 100_000,
+                     path: str = "_bench_journal_") -> None:
+    for suffix in "", ".names", ".snapshot":
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    # every item gets a lot that the next movement sells off again, so the
+    # journal replays consistently without driving the Python API
+    journal = student.Journal(path)
+    for start in range(0, size // 2, BATCH):
+        moves = []
+        for i in range(start, min(start + BATCH, size // 2)):
+            item = f"item{i % ITEMS}"
+            moves += [(item, 10, 5, "supplier"), (item, -10, 5, "shop")]
+        journal.append_many(moves, [20220101] * len(moves),
+                            [-1, 0] * (len(moves) // 2))
+    journal.close()
+
+    print("  journal      start from         open [s]")
+    start = perf_counter()
+    wh = student.open_warehouse(path)
+    elapsed = perf_counter() - start
+    print(f"  {size:9d}    full replay   {elapsed:12.3f}")
+
+    wh.save_snapshot()
+    for _ in range(tail // 2):
+        wh.store("item0", 10, 5, "20220101", "supplier")
+        wh.try_sell("item0", 10, 5, "shop")
+    assert wh.journal is not None
+    wh.journal.close()
+    start = perf_counter()
+    wh = student.open_warehouse(path)
+    elapsed = perf_counter() - start
+    assert wh.find_inconsistencies() == set()
+    print(f"  {size + tail:9d}    snapshot      {elapsed:12.3f}")
+    for suffix in "", ".names", ".snapshot":
+        os.remove(path + suffix)
+
+
+def bench_try_sell(lots: int = 500, orders: int = 2000) -> None:
+    rng = Random(5)
+    print("  lots   order    quote [us]   try_sell [us]")
+    for order in 100, 1000, 10_000:
+        wh = student.Warehouse()
+        wh.store_many(("rice", rng.randrange(1, 50), rng.randrange(1, 30),
+                       str(20220101 + rng.randrange(365)), "supplier")
+                      for _ in range(lots))
+        start = perf_counter()
+        for _ in range(orders):
+            wh.quote("rice", order, 20)
+        quote = (perf_counter() - start) / orders
+        start = perf_counter()
+        for _ in range(orders):
+            wh.try_sell("rice", order, 20, "shop")
+            wh.store_many(("rice", rng.randrange(1, 50), rng.randrange(1, 30),
+                           str(20220101 + rng.randrange(365)), "supplier")
+                          for _ in range(lots - len(wh.inventory["rice"])))
+        sell = (perf_counter() - start) / orders
+        print(f"  {lots:4d}   {order:5d}   {quote * 1e6:11.1f}   "
+              f"{sell * 1e6:13.1f}")
+
+
+def bench_sale_lots(sizes=(1000, 16_000, 32_000), orders: int = 1000) \
+        -> None:
+    # a 1-unit sale only reads the last lot, however many there are; lots
+    # at 5 and 10 in turn sold out at 10 end a run at every other lot
+    rng = Random(6)
+    print("   lots   1-unit quote [us]   1-unit try_sell [us]   "
+          "sell-out [ms]")
+    for lots in sizes:
+        wh = student.Warehouse()
+        wh.store_many(("rice", 10**6, rng.randrange(1, 30),
+                       str(20220101 + rng.randrange(365)), "supplier")
+                      for _ in range(lots))
+        start = perf_counter()
+        for _ in range(orders):
+            wh.quote("rice", 1, 30)
+        quote = (perf_counter() - start) / orders
+        start = perf_counter()
+        for _ in range(orders):
+            wh.try_sell("rice", 1, 30, "shop")
+        sell = (perf_counter() - start) / orders
+        wh = student.Warehouse()
+        wh.store_many(("rice", 1, 5 if i % 2 else 10, "20220101", "supplier")
+                      for i in range(lots))
+        start = perf_counter()
+        assert wh.try_sell("rice", lots, 10, "shop")[0] == lots
+        sell_out = perf_counter() - start
+        print(f"  {lots:5d}   {quote * 1e6:17.1f}   {sell * 1e6:20.1f}   "
+              f"{sell_out * 1e3:13.1f}")
+
+
+def bench_threads(orders: int = 40_000, items: int = 1000) -> None:
+    print("  threads   global lock [orders/s]   sharded [orders/s]")
+    for threads in 1, 4, 16:
+        rates = []
+        for sharded in False, True:
+            wh = (student.ConcurrentWarehouse() if sharded
+                  else student.Warehouse())
+            lock = Lock()
+            for i in range(items):
+                wh.store(f"item{i}", 10**6, 10, "20220101", "supplier")
+
+            def handler(seed: int) -> None:
+                rng = Random(seed)
+                for _ in range(orders // threads):
+                    item = f"item{rng.randrange(items)}"
+                    if sharded:
+                        wh.try_sell(item, rng.randrange(1, 10), 12, "shop")
+                    else:
+                        with lock:
+                            wh.try_sell(item, rng.randrange(1, 10), 12,
+                                        "shop")
+
+            workers = [Thread(target=handler, args=(seed,))
+                       for seed in range(threads)]
+            start = perf_counter()
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            rates.append(orders / (perf_counter() - start))
+            assert wh.find_inconsistencies() == set()
+        print(f"  {threads:7d}   {rates[0]:22.0f}   {rates[1]:18.0f}")
+
+
+def bench_inventory_at(size: int = 1_000_000, queries: int = 200) -> None:
+    rng = Random(6)
+    wh = student.Warehouse()
+    grow(wh, rng, size)
+    wh.find_inconsistencies()
+    start = perf_counter()
+    for _ in range(queries):
+        wh.inventory_at(rng.randrange(len(wh.history)))
+    elapsed = (perf_counter() - start) / queries
+    print(f"  inventory_at over {len(wh.history)} movements, "
+          f"checkpoint every {wh.checkpoint_every}: {elapsed * 1000:.3f} ms")
+
+
+def workload(operations: int, items: int = 1000, lots: int = 5,
+             suppliers: int = 20, mix: Dict[str, int] = DEFAULT_MIX,
+             seed: int = 0) -> Iterator[Operation]:
+    # Warehouse method names with their arguments; the same seed always
+    # gives the same stream. It opens with lots receipts per item, and
+    # every remove_expired moves the date on by a day.
+    rng = Random(seed)
+    day = 20220101
+
+    def store() -> Operation:
+        return ('store', (f"item{rng.randrange(items)}",
+                          rng.randrange(1, 100), rng.randrange(1, PRICES + 1),
+                          str(day + rng.randrange(1, 60)),
+                          f"supplier{rng.randrange(suppliers)}"))
+
+    for _ in range(items * lots):
+        yield store()
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    for _ in range(operations):
+        name = rng.choices(names, weights)[0]
+        if name == 'store':
+            yield store()
+        elif name == 'try_sell':
+            yield ('try_sell', (f"item{rng.randrange(items)}",
+                                rng.randrange(1, 150),
+                                rng.randrange(1, PRICES + 1), "shop"))
+        elif name == 'remove_expired':
+            day += 1
+            yield ('remove_expired', (str(day),))
+        else:
+            yield (name, ())
+
+
+def run_workload(wh: student.Warehouse, operations: Iterator[Operation],
+                 profile: Optional[cProfile.Profile] = None) \
+        -> Tuple[Dict[str, List[float]], float]:
+    latencies: Dict[str, List[float]] = {}
+    total = 0.0
+    for name, args in operations:
+        method = getattr(wh, name)
+        if name == 'try_sell' and args[0] not in wh.inventory:
+            continue
+        if profile is not None:
+            profile.enable()
+        start = perf_counter()
+        method(*args)
+        elapsed = perf_counter() - start
+        if profile is not None:
+            profile.disable()
+        latencies.setdefault(name, []).append(elapsed)
+        total += elapsed
+    return latencies, total
+
+
+def percentile(ordered: List[float], fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def report(latencies: Dict[str, List[float]], total: float,
+           peak: int) -> None:
+    print("  operation               count    p50 [us]    p90 [us]"
+          "    p99 [us]    max [us]")
+    for name, times in latencies.items():
+        times.sort()
+        print(f"  {name:20}   {len(times):7d}"
+              + "".join(f"   {percentile(times, q) * 1e6:9.1f}"
+                        for q in (0.5, 0.9, 0.99, 1.0)))
+    count = sum(len(times) for times in latencies.values())
+    print(f"  throughput: {count / total:.0f} operations/s")
+    print(f"  peak memory: {peak / 2**20:.1f} MB")
+
+
+def bench_workload(args: argparse.Namespace) -> None:
+    mix = dict(DEFAULT_MIX)
+    for weight in args.mix or []:
+        name, value = weight.split('=')
+        if name not in mix:
+            raise SystemExit(f"unknown operation in --mix: {name}")
+        mix[name] = int(value)
+    operations = workload(args.operations, args.items, args.lots,
+                          args.suppliers, mix, args.seed)
+    wh = student.Warehouse(args.columnar)
+    # the opening receipts are not measured
+    run_workload(wh, (next(operations) for _ in range(args.items * args.lots)))
+
+    profile = cProfile.Profile() if args.profile else None
+    if args.memory:
+        tracemalloc.start()
+    latencies, total = run_workload(wh, operations, profile)
+    if args.memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.take_snapshot().dump(args.memory)
+        tracemalloc.stop()
+    else:
+        # in kilobytes on Linux
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    report(latencies, total, peak)
+
+    if profile is not None:
+        profile.dump_stats(args.profile)
+        pstats.Stats(profile).sort_stats('cumulative').print_stats(15)
+    if args.memory:
+        snapshot = tracemalloc.Snapshot.load(args.memory)
+        for stat in snapshot.statistics('lineno')[:10]:
+            print(" ", stat)
+
+
+SUITE = {
+    'inconsistencies': bench_inconsistencies,
+    'expiry': bench_expiry,
+    'store_many': bench_store_many,
+    'columnar': bench_columnar,
+    'cold_start': bench_cold_start,
+    'try_sell': bench_try_sell,
+    'sale_lots': bench_sale_lots,
+    'threads': bench_threads,
+    'inventory_at': bench_inventory_at,
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Warehouse benchmarks")
+    commands = parser.add_subparsers(dest='command')
+
+    suite = commands.add_parser('suite', help="fixed benchmarks (default)")
+    suite.add_argument('names', nargs='*', metavar='NAME',
+                       help="benchmarks to run, out of "
+                            + ", ".join(SUITE) + "; all by default")
+
+    load = commands.add_parser('workload', help="synthetic workload")
+    load.add_argument('--operations', type=int, default=100_000)
+    load.add_argument('--items', type=int, default=1000)
+    load.add_argument('--lots', type=int, default=5,
+                      help="opening lots per item")
+    load.add_argument('--suppliers', type=int, default=20)
+    load.add_argument('--mix', nargs='*', metavar='OPERATION=WEIGHT',
+                      help="override weights of " + ", ".join(DEFAULT_MIX))
+    load.add_argument('--seed', type=int, default=0)
+    load.add_argument('--columnar', action='store_true',
+                      help="use the columnar history")
+    load.add_argument('--profile', metavar='FILE',
+                      help="write cProfile stats of the operations to FILE")
+    load.add_argument('--memory', metavar='FILE',
+                      help="trace allocations, dump a tracemalloc "
+                           "snapshot to FILE")
+
+    args = parser.parse_args()
+    if args.command == 'workload':
+        bench_workload(args)
+        return
+    names = getattr(args, 'names', None) or list(SUITE)
+    for name in names:
+        if name not in SUITE:
+            parser.error(f"unknown benchmark: {name}")
+    for name in names:
+        SUITE[name]()
+
+
+if __name__ == '__main__':
+    main()